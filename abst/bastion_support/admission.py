@@ -0,0 +1,110 @@
+import asyncio
+from threading import Condition
+from time import monotonic
+from typing import Callable, Optional
+
+from abst.config import default_admission_max_creations, default_admission_max_sessions, \
+    default_admission_stagger, default_admission_check_interval
+
+
+class AdmissionController:
+    """
+    Limits session creation of parallel run
+
+    Context is admitted once there is free slot for creation in flight, its bastion has
+    less sessions than per bastion cap and stagger since last admitted creation passed.
+    Creation slot is returned when session is ACTIVE or creation failed, session slot
+    when context stops using its session
+    """
+
+    def __init__(self, max_creations: int = default_admission_max_creations,
+                 max_sessions: int = default_admission_max_sessions,
+                 stagger: float = default_admission_stagger):
+        """
+        @param max_creations: Creations in flight at once, 0 is unlimited
+        @param max_sessions: Sessions held at once on single bastion, 0 is unlimited
+        @param stagger: Seconds between starts of two creations
+        """
+        self.max_creations = max_creations
+        self.max_sessions = max_sessions
+        self.stagger = stagger
+        self.creating = 0
+        self.sessions: dict = dict()
+        self._next_start = 0.0
+        self._condition = Condition()
+
+    @classmethod
+    def from_config(cls, conf: dict) -> "AdmissionController":
+        return cls(int(conf.get("max-concurrent-creations", default_admission_max_creations)),
+                   int(conf.get("max-sessions-per-bastion", default_admission_max_sessions)),
+                   float(conf.get("startup-stagger", default_admission_stagger)))
+
+    def try_admit(self, bastion_id: str) -> Optional[float]:
+        """
+        @return: None if admitted, otherwise seconds worth waiting before next try
+        """
+        with self._condition:
+            if self.max_creations and self.creating >= self.max_creations:
+                return default_admission_check_interval
+            if self.max_sessions and self.sessions.get(bastion_id, 0) >= self.max_sessions:
+                return default_admission_check_interval
+            if (wait := self._next_start - monotonic()) > 0:
+                return wait
+            self._next_start = monotonic() + self.stagger
+            self.creating += 1
+            self.sessions[bastion_id] = self.sessions.get(bastion_id, 0) + 1
+            return None
+
+    def admit(self, bastion_id: str, on_queued: Optional[Callable[[], None]] = None,
+              stopped: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Blocks until context is admitted
+        @param on_queued: Called once if context has to wait
+        @param stopped: Waiting ends when it returns True
+        @return: False if waiting was stopped
+        """
+        queued = False
+        while (wait := self.try_admit(bastion_id)) is not None:
+            if stopped and stopped():
+                return False
+            if not queued and on_queued:
+                on_queued()
+            queued = True
+            with self._condition:
+                self._condition.wait(min(wait, default_admission_check_interval))
+        return True
+
+    async def admit_async(self, bastion_id: str, on_queued: Optional[Callable[[], None]] = None,
+                          stopped: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Same as admit but for event loop, waiting does not occupy executor threads
+        """
+        queued = False
+        while (wait := self.try_admit(bastion_id)) is not None:
+            if stopped and stopped():
+                return False
+            if not queued and on_queued:
+                on_queued()
+            queued = True
+            await asyncio.sleep(min(wait, default_admission_check_interval))
+        return True
+
+    def created(self):
+        """
+        Creation in flight ended, successfully or not
+        """
+        with self._condition:
+            self.creating = max(self.creating - 1, 0)
+            self._condition.notify_all()
+
+    def released(self, bastion_id: str):
+        """
+        Context stopped using its session on bastion
+        """
+        with self._condition:
+            count = self.sessions.get(bastion_id, 0) - 1
+            if count > 0:
+                self.sessions[bastion_id] = count
+            else:
+                self.sessions.pop(bastion_id, None)
+            self._condition.notify_all()
@@ -0,0 +1,344 @@
+import asyncio
+import logging
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Thread, Event
+from typing import Optional
+
+import rich
+
+from abst.bastion_support.oci_bastion import Bastion
+from abst.bastion_support.session_waiter import SessionWaiter
+from abst.bastion_support.status_display import StatusDisplay
+from abst.config import default_async_executor_workers, default_key_probe_timeout, broadcast_shm_name
+from abst.sharing.local_broadcast import LocalBroadcast
+from abst.utils.misc_funcs import link_signals
+from abst.utils.net import probe_port_async
+
+
+class AsyncTunnelProcess:
+    """
+    Popen like view of asyncio subprocess, so Bastion.kill and display can use it
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+
+    def poll(self) -> Optional[int]:
+        return self.process.returncode
+
+    def send_signal(self, sig):
+        if self.process.returncode is None:
+            try:
+                os.kill(self.process.pid, sig)
+            except ProcessLookupError:
+                pass
+
+
+class AsyncBastionScheduler:
+    """
+    Runs session lifecycle, ssh processes and display of all bastions on one event loop,
+    blocking OCI SDK calls are executed in bounded thread pool
+    """
+
+    def __init__(self, bastions: list, force: bool = False, display: Optional[StatusDisplay] = None,
+                 workers: int = default_async_executor_workers):
+        self.bastions = bastions
+        self.force = force
+        self.display = display
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="abst-oci")
+        self.tasks: list = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def run(self):
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.executor.shutdown(wait=False)
+        # Event loop handlers are gone, second signal should force exit
+        link_signals()
+        BastionScheduler.kill_all()
+
+    def stop(self):
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        BastionScheduler.stopped = True
+        for task in self.tasks:
+            task.cancel()
+
+    async def main(self):
+        loop = self.loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+
+        self.tasks = [asyncio.create_task(self.forward_lifecycle(bastion),
+                                          name=bastion.get_print_name())
+                      for bastion in self.bastions]
+        if self.display:
+            self.tasks.append(asyncio.create_task(self.display_loop(), name="display"))
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def blocking(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                partial(func, *args, **kwargs))
+
+    async def display_loop(self):
+        changed = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        subscription = LocalBroadcast(broadcast_shm_name).subscribe(
+            lambda *_: loop.call_soon_threadsafe(changed.set))
+        self.display.start()
+        try:
+            while True:
+                self.display.refresh()
+                try:
+                    await asyncio.wait_for(changed.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+        finally:
+            self.display.stop()
+            subscription.close()
+
+    def count_tasks(self) -> int:
+        """
+        Count of unfinished tasks on scheduler loop, called from metrics thread
+        """
+        if self.loop is None:
+            return 0
+        return len([task for task in list(asyncio.all_tasks(self.loop)) if not task.done()])
+
+    async def forward_lifecycle(self, bastion: Bastion):
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        while not BastionScheduler.stopped and not bastion.reconnect.gave_up:
+            delay = None
+            try:
+                if not await self.forward_once(bastion):
+                    delay = bastion.schedule_reconnect("creating bastion session failed")
+            except SystemExit:
+                logging.info(f"({bastion.get_print_name()}) Context stopped")
+                return
+            except Exception as ex:
+                logging.error(f"({bastion.get_print_name()}) Exception {ex}")
+                delay = bastion.schedule_reconnect(f"exception {ex}")
+
+            bastion.connected = False
+            bastion.active_tunnel = None
+            bastion.response = None
+            # Queued contexts can create sessions while this one waits
+            bastion.release_admission()
+            if delay is not None:
+                await bastion.reconnect.wait_async(delay)
+
+    async def forward_once(self, bastion: Bastion) -> bool:
+        """
+        Same lifecycle as Bastion.create_forward_loop
+        @return: False if session could not be created
+        """
+        print(f"Loading Credentials for {bastion.get_print_name()}")
+        creds = bastion.load_self_creds()
+        bastion.configure_reconnect(creds)
+        local_port = creds.get("local-port", 22)
+        username = creds.get("resource-os-username", None)
+        if username:
+            bastion.lb.publish(bastion.context_name, {"port": local_port, "username": username})
+
+        if not await self.admit(bastion, creds):
+            return True
+        bastion.current_status = "creating bastion session"
+        host, ip, port, ssh_pub_key_path, res = await self.blocking(
+            bastion.create_bastion_forward_port_session, creds)
+        bid, response = bastion.load_response(res)
+
+        if bid is None:
+            bastion.current_status = "creating bastion session failed"
+            rich.print(f"Failed to Create Bastion {bastion.get_print_name()}"
+                       f" with response '{response}'")
+            return False
+
+        bastion.current_status = "creating bastion session succeeded"
+        bastion.bid = bid
+        bastion.current_status = "waiting for session init"
+        prepared = await self.wait_for_prepared(bastion, creds, ssh_pub_key_path.strip('.pub'))
+        bastion.creation_done()
+        if not prepared:
+            await self.blocking(bastion.discard_session, bid)
+            return True
+
+        bastion.current_status = "digging tunnel"
+        bastion.configure_tunnel(creds)
+        bastion.set_port_forward(bid, host, ip, port, local_port, ssh_pub_key_path, self.force,
+                                 creds.get("ssh-custom-arguments", ""))
+
+        rotation_stop = Event()
+        rotate_fraction = float(Bastion.get_setting(creds, "rotate-at-ttl-fraction", 0))
+        if 0 < rotate_fraction < 1:
+            Thread(name=f"rotate-{bastion.get_print_name()}", target=bastion.rotate_before_expiry,
+                   args=[creds, rotate_fraction, self.force, rotation_stop], daemon=True).start()
+
+        try:
+            await self.connect_till_deleted(bastion)
+        finally:
+            rotation_stop.set()
+        return True
+
+    async def admit(self, bastion: Bastion, creds: dict) -> bool:
+        """
+        Waits on event loop for admission of session creation
+        @return: False if abst stopped while context was queued
+        """
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        if Bastion.admission is None:
+            return True
+        if not await Bastion.admission.admit_async(creds["bastion-id"], bastion.mark_queued,
+                                                   lambda: BastionScheduler.stopped):
+            return False
+        bastion.mark_admitted(creds["bastion-id"])
+        return True
+
+    async def connect_till_deleted(self, bastion: Bastion):
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        auth_failures = 0
+        while not BastionScheduler.stopped:
+            bastion.reconnect.connecting()
+            succeeded = await self.run_ssh_tunnel(bastion)
+            if bastion.take_rotation():
+                auth_failures = 0
+                continue
+            auth_failures = 0 if succeeded else auth_failures + 1
+
+            sdata = await self.blocking(bastion.get_bastion_state)
+            if sdata["lifecycle_state"] != "ACTIVE" or Bastion.get_remaining_ttl(sdata) <= 0:
+                print(f"Bastion Session {bastion.get_print_name()} got deleted")
+                bastion.current_status = "bastion session deleted"
+                return
+            if auth_failures > 2 or BastionScheduler.stopped:
+                break
+            delay = bastion.schedule_reconnect("tunnel closed" if succeeded else "authorization failed")
+            if delay is None:
+                break
+            rich.print(f"({bastion.get_print_name()}) Reconnecting in {delay:.1f}s")
+            await bastion.reconnect.wait_async(delay)
+
+        if BastionScheduler.stopped:
+            return
+        print(f"SSH Tunnel for {bastion.get_print_name()} Terminated")
+        if not bastion.reconnect.gave_up:
+            bastion.current_status = "ssh tunnel terminated"
+        await self.blocking(bastion.discard_session, bastion.bid)
+
+    async def wait_for_prepared(self, bastion: Bastion, creds: dict, private_key_path: str) -> bool:
+        print(f"Waiting for Bastion {bastion.get_print_name()} to initialize")
+        waiter = SessionWaiter.from_settings(
+            lambda key, default: Bastion.get_setting(creds, key, default))
+
+        async def is_active():
+            state = await self.blocking(bastion.get_bastion_state)
+            return (state or {}).get("lifecycle_state", None) == "ACTIVE"
+
+        ready = await waiter.wait_for_async("active", is_active)
+        if ready and Bastion.is_setting_enabled(creds, "verify-key", True):
+            ready = await waiter.wait_for_async(
+                "key", partial(self.probe_key_accepted, bastion, creds["host"], private_key_path))
+        return bastion.record_readiness(waiter, ready)
+
+    async def probe_key_accepted(self, bastion: Bastion, host: str, private_key_path: str) -> bool:
+        args = bastion.build_key_probe_args(host, private_key_path, self.force)
+        try:
+            p = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                     stdout=asyncio.subprocess.DEVNULL,
+                                                     stderr=asyncio.subprocess.PIPE)
+        except FileNotFoundError:
+            return True
+
+        async def read_result():
+            async for raw_line in p.stderr:
+                accepted = Bastion.classify_key_probe_line(raw_line.decode("utf-8", errors="replace"))
+                if accepted is not None:
+                    return accepted
+            return False
+
+        try:
+            return await asyncio.wait_for(read_result(), default_key_probe_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if p.returncode is None:
+                p.kill()
+            await p.wait()
+
+    async def run_ssh_tunnel(self, bastion: Bastion) -> bool:
+        """
+        Runs ssh tunnel process until it ends
+        @return: False if ssh failed on authorization
+        """
+        if bastion.ssh_engine == "asyncssh":
+            # In process forwards of all bastions share this loop
+            forwarder = bastion.build_forwarder()
+            bastion.active_tunnel = forwarder
+            try:
+                return await forwarder.run()
+            except asyncio.CancelledError:
+                forwarder.close()
+                raise
+        if bastion.control_master:
+            authorized, tunnel = await self.blocking(bastion.open_control_master_forward)
+            if tunnel is None:
+                return authorized
+            bastion.active_tunnel = tunnel
+            while tunnel.poll() is None:
+                await asyncio.sleep(1)
+            bastion.connected = False
+            return True
+
+        args = bastion.process_args(False, False, bastion.ssh_tunnel_arg_str)
+        try:
+            p = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE,
+                                                     stderr=asyncio.subprocess.STDOUT)
+        except FileNotFoundError:
+            bastion.connected = False
+            rich.print(f"({bastion.get_print_name()}) Failed to establish SSH tunnel, ssh not found")
+            return True
+
+        bastion.active_tunnel = AsyncTunnelProcess(p)
+        readiness = None
+        if bastion.tunnel_readiness != "log" and bastion.forward_target:
+            readiness = asyncio.create_task(self.watch_tunnel_ready(bastion, p))
+        try:
+            async for raw_line in p.stdout:
+                if not bastion.process_ssh_line(raw_line.decode("utf-8", errors="replace").strip()):
+                    bastion.active_tunnel.send_signal(signal.SIGTERM)
+                    await p.wait()
+                    return False
+
+            await p.wait()
+        finally:
+            if readiness:
+                readiness.cancel()
+        bastion.process_ssh_exit(p.returncode)
+        return True
+
+    async def watch_tunnel_ready(self, bastion: Bastion, process: asyncio.subprocess.Process):
+        """
+        Probes local port until tunnel accepts connections
+        """
+        waiter = bastion.tunnel_waiter()
+        port = bastion.forward_target["local_port"]
+        handshake = bastion.tunnel_readiness == "ssh-banner"
+
+        async def is_ready():
+            return process.returncode is not None or \
+                await probe_port_async("127.0.0.1", port, handshake)
+
+        await waiter.wait_for_async("tunnel", is_ready)
+        if process.returncode is not None:
+            return
+        if await probe_port_async("127.0.0.1", port, handshake):
+            bastion.mark_tunnel_ready(waiter.phases["tunnel"])
+        else:
+            rich.print(f"({bastion.get_print_name()}) Local port {port} does not accept "
+                       f"connections after {waiter.deadline} seconds")
+            bastion.current_status = "tunnel not ready"
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from threading import Thread, Lock
+from typing import Callable, Optional
+
+from abst.config import default_ssh_keepalive_interval
+
+
+def is_asyncssh_available() -> bool:
+    try:
+        import asyncssh  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ForwardingLoop:
+    """
+    Event loop shared by all in process forwards started from threads
+    """
+    _lock = Lock()
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._lock:
+            if cls._loop is None:
+                cls._loop = asyncio.new_event_loop()
+                Thread(name="abst-forwarding-loop", target=cls._loop.run_forever,
+                       daemon=True).start()
+            return cls._loop
+
+    @classmethod
+    def run(cls, coro):
+        """
+        Runs coroutine on shared loop and blocks calling thread until it finishes
+        """
+        return asyncio.run_coroutine_threadsafe(coro, cls.get_loop()).result()
+
+
+class AsyncSSHForwarder:
+    """
+    Port forward through bastion session done in process with asyncssh
+
+    State changes are reported by on_event(event, detail) callback with events
+    connecting, authenticated, listening, auth_failed and closed
+    """
+
+    def __init__(self, host: str, username: str, private_key_path: str, local_port: int,
+                 target_ip: str, target_port: int, port: int = 22, verify_host_key: bool = True,
+                 keepalive_interval: float = default_ssh_keepalive_interval,
+                 on_event: Optional[Callable] = None):
+        """
+        @param host: Bastion host
+        @param username: Bastion session id
+        @param private_key_path: Private key of public key session was created with
+        @param local_port: Local port to serve
+        @param target_ip: Target resource ip
+        @param target_port: Target resource port
+        @param verify_host_key: Verify host key against ~/.ssh/known_hosts
+        @param on_event: Callback called with event name and detail
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.private_key_path = private_key_path
+        self.local_port = int(local_port)
+        self.target_ip = target_ip
+        self.target_port = int(target_port)
+        self.verify_host_key = verify_host_key
+        self.keepalive_interval = keepalive_interval
+        self.on_event = on_event
+        self.returncode: Optional[int] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._conn = None
+        self._closing = False
+
+    def emit(self, event: str, detail: Optional[str] = None):
+        logging.debug(f"({self.username}@{self.host}) Forward event {event} {detail or ''}")
+        if self.on_event:
+            self.on_event(event, detail)
+
+    async def run(self) -> bool:
+        """
+        Connects, serves local port until connection closes
+        @return: False if bastion did not accept key
+        """
+        import asyncssh
+        self._loop = asyncio.get_running_loop()
+        self.emit("connecting")
+        try:
+            self._conn = await asyncssh.connect(
+                self.host, self.port, username=self.username,
+                client_keys=[self.private_key_path], agent_path=None,
+                known_hosts=() if self.verify_host_key else None,
+                keepalive_interval=self.keepalive_interval)
+        except asyncssh.PermissionDenied as ex:
+            self.returncode = 255
+            self.emit("auth_failed", str(ex))
+            return False
+        except (OSError, asyncssh.Error) as ex:
+            self.returncode = 255
+            self.emit("closed", str(ex))
+            return True
+
+        self.emit("authenticated")
+        try:
+            if self._closing:
+                self.returncode = 0
+                return True
+            try:
+                await self._conn.forward_local_port("localhost", self.local_port,
+                                                    self.target_ip, self.target_port)
+            except OSError as ex:
+                self.returncode = 255
+                self.emit("closed", f"Can not listen on port {self.local_port} {ex}")
+                return True
+            self.emit("listening", f"localhost:{self.local_port}")
+            await self._conn.wait_closed()
+        finally:
+            self._conn.close()
+
+        self.returncode = 0
+        self.emit("closed", None if self._closing else "Connection lost")
+        return True
+
+    def close(self):
+        """
+        Closes connection, can be called from any thread
+        """
+        self._closing = True
+        if self._loop is None or self._conn is None:
+            return
+        self._loop.call_soon_threadsafe(self._conn.close)
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def send_signal(self, sig):
+        self.close()
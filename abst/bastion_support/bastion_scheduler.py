@@ -1,18 +1,25 @@
-from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
 from pathlib import Path
-from threading import Thread
-from time import sleep
+from threading import Thread, Event
 from typing import Optional
 
 import rich
-from click import clear
 from rich import print
-from rich.align import Align
 
+from abst.bastion_support.admission import AdmissionController
+from abst.bastion_support.control_master import ControlMaster
+from abst.bastion_support.health_prober import HealthProber
+from abst.bastion_support.metrics import MetricsExporter
 from abst.bastion_support.oci_bastion import Bastion
+from abst.bastion_support.oci_clients import BastionClientRegistry
+from abst.bastion_support.status_display import StatusDisplay
 from abst.config import default_stack_location, default_stack_contents, \
-    default_contexts_location
-from abst.utils.misc_funcs import link_signals
+    default_contexts_location, default_oci_rate_limit, default_oci_rate_burst, \
+    default_health_probe_interval, default_health_probe_timeout, default_health_probe_failures, \
+    default_health_probe, default_metrics_address, broadcast_shm_name
+from abst.sharing.local_broadcast import LocalBroadcast
+from abst.utils.misc_funcs import link_signals, link_dump_signal
 from abst.wrappers import load_stack_decorator
 
 
@@ -21,6 +28,7 @@ class BastionScheduler:
     __live_stack = set()
     stopped = False
     session_list = []
+    __shutting_down = False
 
     @classmethod
     def load_stack(cls):
@@ -70,69 +78,65 @@ class BastionScheduler:
         except KeyError:
             rich.print(f"[red]No Bastion by name {name} in stack[/red]")
 
-    @classmethod
-    def __display(cls, console):
-        console.clear()
-        from rich.table import Table
-        table = Table(title="Bastion Sessions", highlight=True)
-        table.add_column("Name", justify="left", style="cyan", no_wrap=True)
-        table.add_column("Local Port", style="magenta", no_wrap=True)
-        table.add_column("Active", justify="right", style="green", no_wrap=True)
-        table.add_column("Status", justify="right", style="green", no_wrap=True)
-        for bastion in cls.__live_stack:
-            conf = bastion.load_self_creds()
-            active = bastion.connected and bastion.active_tunnel.poll() is None
-            name = "default" if bastion.context_name is None else bastion.context_name
-
-            try:
-                table.add_row(name, conf.get('local-port', 'Not Specified'), str(active),
-                              bastion.current_status)
-            except:
-                pass
-        centered_table = Align.center(table)
-        console.print(centered_table)
-
     @classmethod
     def __display_loop(cls):
-        from rich.console import Console
-        console = Console()
         link_signals()
-        while True:
-            clear()
-            cls.__display(console)
-            sleep(1)
+        display = StatusDisplay(lambda: list(cls.__live_stack))
+        # Status change published by any context redraws at once, otherwise every second
+        changed = Event()
+        subscription = LocalBroadcast(broadcast_shm_name).subscribe(lambda *_: changed.set())
+        display.start()
+        try:
+            while True:
+                display.refresh()
+                changed.wait(1)
+                changed.clear()
+        finally:
+            display.stop()
+            subscription.close()
 
     @classmethod
-    def _run_indefinitely(cls, func, force: bool = False):
-        while True:
-            if cls.stopped:
-                return
+    def _run_indefinitely(cls, bastion: Bastion, force: bool = False):
+        while not cls.stopped and not bastion.reconnect.gave_up:
+            delay = None
             try:
-                func(force=force)
-            finally:
-                sleep(0.3)
+                bastion.create_forward_loop(force=force)
+            except Exception as ex:
+                logging.error(f"({bastion.get_print_name()}) Exception {ex}")
+                delay = bastion.schedule_reconnect(f"exception {ex}")
+            # Queued contexts can create sessions while this one waits
+            bastion.release_admission()
+            if delay is not None:
+                bastion.reconnect.wait(delay)
 
     @classmethod
     @load_stack_decorator
-    def run(cls, force=False, set_dir: Optional[Path] = None):
+    def run(cls, force=False, set_dir: Optional[Path] = None, reuse: bool = False,
+            threaded: bool = False, metrics_port: Optional[int] = None):
         link_signals()
+        link_dump_signal()
         rich.print("Will run all Bastions in parallel")
-        thread_list = []
+        conf = Bastion.load_config()
+        BastionClientRegistry.configure_rate_limit(
+            float(conf.get("oci-api-rate-limit", default_oci_rate_limit)),
+            float(conf.get("oci-api-rate-burst", default_oci_rate_burst)))
+        Thread(name="cleanup-pending", target=Bastion.cleanup_pending_sessions, daemon=True).start()
+        Bastion.admission = AdmissionController.from_config(conf)
+        HealthProber(lambda: list(cls.__live_stack),
+                     float(conf.get("health-probe-interval", default_health_probe_interval)),
+                     float(conf.get("health-probe-timeout", default_health_probe_timeout)),
+                     int(conf.get("health-probe-failures", default_health_probe_failures)),
+                     conf.get("health-probe", default_health_probe)).start()
+        exporter = cls.start_metrics(conf, metrics_port)
 
         if not set_dir:
             for context_name in cls.__dry_stack:
                 if cls.stopped:
                     return
                 region = Bastion.load_json(Bastion.get_creds_path_resolve(context_name)).get("region", None)
-                bastion = Bastion(None if context_name == "default" else context_name, region=region)
-                Bastion.session_list.append(bastion)
-                cls.session_list.append(bastion)
-                cls.__live_stack.add(bastion)
-                t = Thread(name=context_name, target=cls._run_indefinitely,
-                           args=[bastion.create_forward_loop, force], daemon=True)
-                thread_list.append(t)
-                t.start()
-                rich.print(f"Started {context_name}")
+                bastion = Bastion(None if context_name == "default" else context_name, region=region,
+                                  reuse_session=reuse)
+                cls.__schedule(bastion, context_name, force, threaded)
         else:
             for context_path in filter(lambda p: not str(p.name).startswith(".") and str(p.name).endswith(".json"),
                                        set_dir.iterdir()):
@@ -141,18 +145,45 @@ class BastionScheduler:
                 context_name = context_path.name[:-5]
                 region = Bastion.load_json(context_path).get("region", None)
                 bastion = Bastion(None if context_name == "default" else context_name, region=region,
-                                  direct_json_path=context_path)
+                                  direct_json_path=context_path, reuse_session=reuse)
+                cls.__schedule(bastion, context_name, force, threaded)
 
-                Bastion.session_list.append(bastion)
-                cls.session_list.append(bastion)
-                cls.__live_stack.add(bastion)
-                t = Thread(name=context_name, target=cls._run_indefinitely,
-                           args=[bastion.create_forward_loop, force], daemon=True)
-                thread_list.append(t)
-                t.start()
-                rich.print(f"Started {context_name}")
+        if threaded:
+            cls.__display_loop()
+        else:
+            from abst.bastion_support.async_scheduler import AsyncBastionScheduler
+            scheduler = AsyncBastionScheduler(list(cls.__live_stack), force,
+                                              StatusDisplay(lambda: list(cls.__live_stack)))
+            if exporter:
+                exporter.get_task_count = scheduler.count_tasks
+            scheduler.run()
 
-        cls.__display_loop()
+    @classmethod
+    def start_metrics(cls, conf: dict, metrics_port: Optional[int] = None) -> Optional[MetricsExporter]:
+        """
+        Starts OpenMetrics endpoint if port is set by option or metrics-port in config
+        """
+        port = metrics_port if metrics_port is not None else conf.get("metrics-port", None)
+        if port is None:
+            return None
+        exporter = MetricsExporter(lambda: list(cls.__live_stack),
+                                   conf.get("metrics-address", default_metrics_address), int(port))
+        if not exporter.start():
+            rich.print(f"[red]Metrics endpoint could not listen on {exporter.address}:{port}[/red]")
+            return None
+        rich.print(f"Serving metrics on http://{exporter.address}:{exporter.port}/metrics")
+        return exporter
+
+    @classmethod
+    def __schedule(cls, bastion: Bastion, context_name: str, force: bool, threaded: bool):
+        Bastion.session_list.append(bastion)
+        cls.session_list.append(bastion)
+        cls.__live_stack.add(bastion)
+        if threaded:
+            t = Thread(name=context_name, target=cls._run_indefinitely,
+                       args=[bastion, force], daemon=True)
+            t.start()
+        rich.print(f"Started {context_name}")
 
     @classmethod
     @load_stack_decorator
@@ -165,33 +196,41 @@ class BastionScheduler:
                 return True, context_name
         return False, None
 
-    @classmethod
-    def kill_session(cls, sess, index, total):
-        try:
-            rich.print(f"[red]Killing[/red] {sess.bid}")
-            Bastion.current_status = "deleting"
-            sess.kill()
-            Bastion.delete_bastion_session(sess.bid, sess.region)
-        except Exception:
-            pass
-
     @classmethod
     def kill_all(cls, a=None, b=None, c=None):
         # This should be only executed in running state
+        if cls.__shutting_down:
+            rich.print("[red]Forced exit, sessions are left to expire[/red]")
+            os._exit(1)
+        cls.__shutting_down = True
         cls.stopped = True
+        Bastion.stopped = True
         blist_copy = list(cls.session_list)
-        total_sessions = len(blist_copy)
-        deleted = 0
-
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(cls.kill_session, sess, i + 1, total_sessions)
-                       for i, sess in enumerate(blist_copy)]
-
-        # Optionally, wait for all futures to complete if you need synchronization
-        for future in futures:
-            future.result()  # This will re-raise any exceptions caught during the session killings
-            deleted += 1
-            print(f"Deleting {deleted}/{total_sessions}")
+
+        # Kill all ssh children at once so nothing holds the sessions
+        ControlMaster.terminate_all()
+        for sess in blist_copy:
+            sess.current_status = "deleting"
+            sess.stop_relay()
+            sess.terminate_tunnel()
+
+        sessions = dict()
+        for sess in blist_copy:
+            if released := sess.release_session():
+                sessions[released[0]] = released[1]
+
+        rich.print(f"[red]Deleting[/red] {len(sessions)} sessions")
+        left = Bastion.delete_sessions(sessions)
+
+        for sess in blist_copy:
+            sess.lb.delete_context(sess.context_name)
+
+        if left:
+            Bastion.store_pending_deletions(left)
+            rich.print(f"[yellow]{len(left)}/{len(sessions)} sessions were not deleted in time, "
+                       f"they will be cleaned on next parallel run[/yellow]")
+        else:
+            rich.print(f"[green]Deleted {len(sessions)} sessions[/green]")
 
         exit(0)
 
@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import subprocess
+from pathlib import Path
+from threading import Lock, Event, Thread
+from time import monotonic, sleep
+from typing import Optional
+
+from abst.config import default_control_master_path, default_control_master_timeout, \
+    default_control_master_stop_timeout, default_ssh_output_buffer
+from abst.utils.ring_buffer import RingBuffer
+
+
+class ControlMaster:
+    """
+    OpenSSH ControlMaster connection per (bastion session, host)
+
+    Master process authenticates once, port forwards are added and cancelled on it
+    by ssh -O, so re-establishing forward is channel request instead of handshake.
+
+    Master runs with ControlPersist=no in foreground as child of abst instead of being
+    backgrounded by ControlPersist, so its state is known from poll without running
+    ssh -O check and it can not outlive abst. Bastion.kill stops it by ssh -O exit
+    """
+    _lock = Lock()
+    _masters: dict = dict()
+    socket_dir: Path = default_control_master_path
+
+    def __init__(self, session_id: str, host: str, private_key_path: str,
+                 ssh_options: str = "", port: int = 22):
+        self.session_id = session_id
+        self.host = host
+        self.private_key_path = private_key_path
+        self.ssh_options = ssh_options
+        self.port = port
+        self.socket_path = self.get_socket_path(session_id, host)
+        self.process: Optional[subprocess.Popen] = None
+        self.auth_failed = False
+        self.output = RingBuffer(default_ssh_output_buffer)
+
+    @classmethod
+    def get(cls, session_id: str, host: str, private_key_path: str,
+            ssh_options: str = "") -> "ControlMaster":
+        with cls._lock:
+            master = cls._masters.get((session_id, host), None)
+            if master is None:
+                master = cls._masters[(session_id, host)] = ControlMaster(
+                    session_id, host, private_key_path, ssh_options)
+            return master
+
+    @classmethod
+    def get_socket_path(cls, session_id: str, host: str) -> Path:
+        # Session ids are too long for unix socket path limit
+        digest = hashlib.sha1(f"{session_id}@{host}".encode()).hexdigest()[:20]
+        return cls.socket_dir / f"{digest}.sock"
+
+    @property
+    def destination(self) -> str:
+        return f"{self.session_id}@{self.host}"
+
+    def control_command(self, *args) -> list:
+        return ["ssh", "-o", f"ControlPath={self.socket_path}", *args, "-p", str(self.port),
+                self.destination]
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, timeout: float = default_control_master_timeout) -> bool:
+        """
+        Starts master and waits until it accepts control commands
+        @return: True if master is running, auth_failed is set if key was rejected
+        """
+        self.auth_failed = False
+        self.output.clear()
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        self.socket_path.unlink(missing_ok=True)
+
+        args = ["ssh", "-M", "-N", "-o", "ControlMaster=yes", "-o",
+                f"ControlPath={self.socket_path}", "-o", "ControlPersist=no",
+                "-o", "BatchMode=yes", *self.ssh_options.split(),
+                "-i", self.private_key_path, "-p", str(self.port), self.destination]
+        logging.debug(f"Starting control master {' '.join(args)}")
+        try:
+            self.process = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            return False
+        # Master lives as long as session, its stderr must not fill up pipe
+        drain = Thread(name=f"cm-stderr-{self.host}", target=self.drain_stderr,
+                       args=(self.process,), daemon=True)
+        drain.start()
+
+        deadline = monotonic() + timeout
+        while monotonic() < deadline:
+            if self.process.poll() is not None:
+                drain.join(1)
+                stderr = self.output.getvalue()
+                logging.debug(f"Control master {self.destination} exited "
+                              f"{self.process.returncode} {stderr.strip()}")
+                self.auth_failed = "Permission denied" in stderr
+                return False
+            if self.socket_path.exists() and self.control("check"):
+                return True
+            sleep(0.05)
+
+        self.stop()
+        return False
+
+    def drain_stderr(self, process: subprocess.Popen):
+        for line in process.stderr:
+            self.output.append(line.decode("utf-8", errors="replace").rstrip())
+        process.stderr.close()
+
+    def ensure(self) -> bool:
+        return self.is_alive() or self.start()
+
+    def control(self, command: str, *args, timeout: float = default_control_master_timeout) -> bool:
+        """
+        Sends control command (check, forward, cancel, exit) to running master
+        """
+        try:
+            return subprocess.run(self.control_command("-O", command, *args),
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL, timeout=timeout).returncode == 0
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            return False
+
+    def forward(self, spec: str) -> bool:
+        return self.control("forward", "-L", spec)
+
+    def cancel(self, spec: str) -> bool:
+        return self.control("cancel", "-L", spec)
+
+    def stop(self):
+        """
+        Ends master within few seconds even if it is stalled, it runs on health prober
+        thread when tunnel is forced to reconnect
+        """
+        if self.is_alive():
+            if not self.control("exit", timeout=default_control_master_stop_timeout):
+                self.process.terminate()
+            try:
+                self.process.wait(default_control_master_stop_timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.socket_path.unlink(missing_ok=True)
+
+    @classmethod
+    def count_alive(cls) -> int:
+        with cls._lock:
+            return sum(1 for master in cls._masters.values() if master.is_alive())
+
+    @classmethod
+    def terminate_all(cls):
+        """
+        Sends SIGTERM to all masters and forgets them without waiting, so shutdown does
+        not wait on stalled masters before sessions get deleted
+        """
+        with cls._lock:
+            masters = list(cls._masters.values())
+            cls._masters.clear()
+        for master in masters:
+            if master.is_alive():
+                logging.debug(f"Terminating control master {master.destination}")
+                master.process.terminate()
+
+    @classmethod
+    def stop_session(cls, session_id: Optional[str]):
+        """
+        Stops masters of session and forgets them
+        """
+        with cls._lock:
+            keys = [key for key in cls._masters.keys() if key[0] == session_id]
+            masters = [cls._masters.pop(key) for key in keys]
+        for master in masters:
+            logging.debug(f"Stopping control master {master.destination}")
+            master.stop()
+
+
+class ControlMasterTunnel:
+    """
+    Popen like view of port forward running on control master
+    """
+
+    def __init__(self, master: ControlMaster, spec: str):
+        self.master = master
+        self.spec = spec
+        self.returncode: Optional[int] = None
+        self._cancelled = Event()
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None and not self.master.is_alive():
+            self.returncode = self.master.process.returncode if self.master.process else 255
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is None:
+            self.master.cancel(self.spec)
+            self.returncode = 0
+        self._cancelled.set()
+
+    def wait(self, check_interval: float = 1) -> int:
+        while self.poll() is None:
+            self._cancelled.wait(check_interval)
+        return self.returncode
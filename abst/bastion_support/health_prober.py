@@ -0,0 +1,144 @@
+import logging
+from collections import deque
+from threading import Lock, Event, Thread
+from typing import Callable, Optional
+
+from abst.config import default_health_probe_interval, default_health_probe_timeout, \
+    default_health_probe_failures, default_health_probe_window, default_health_probe
+from abst.utils.net import measure_port
+from abst.utils.stats import percentile
+
+
+class LatencyStats:
+    """
+    Sliding window of probe latencies with failure counters
+    """
+
+    def __init__(self, window: int = default_health_probe_window):
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = Lock()
+        self.probes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+    def record(self, latency: Optional[float]):
+        """
+        @param latency: Seconds probe took, None if probe failed
+        """
+        with self._lock:
+            self.probes += 1
+            if latency is None:
+                self.failures += 1
+                self.consecutive_failures += 1
+                return
+            self.consecutive_failures = 0
+            self._latencies.append(latency)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        with self._lock:
+            latencies = list(self._latencies)
+        return percentile(latencies, percent)
+
+    def reset_failures(self):
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def summary(self) -> str:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        if p50 is None:
+            return "-"
+        return f"{p50 * 1000:.1f}/{p95 * 1000:.1f} ms"
+
+
+class HealthProber:
+    """
+    Background thread periodically connecting through forwarded local ports of all
+    connected tunnels, tunnel is reconnected after failure_threshold failed probes in row.
+    Tunnels of one round are probed concurrently, tunnel whose previous probe still runs is skipped
+    """
+
+    def __init__(self, get_bastions: Callable[[], list],
+                 interval: float = default_health_probe_interval,
+                 timeout: float = default_health_probe_timeout,
+                 failure_threshold: int = default_health_probe_failures,
+                 mode: str = default_health_probe):
+        """
+        @param get_bastions: Callable returning bastions to probe
+        @param interval: Seconds between probe rounds
+        @param timeout: Seconds single probe can take
+        @param failure_threshold: Failed probes in row forcing reconnect
+        @param mode: tcp, ssh-banner or auto using ssh-banner for SSH targets
+        """
+        self.get_bastions = get_bastions
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.mode = mode
+        self._stop = Event()
+        self._in_flight = set()
+        self._in_flight_lock = Lock()
+
+    def start(self) -> Optional[Thread]:
+        if self.interval <= 0:
+            return None
+        thread = Thread(name="health-prober", target=self.run, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.probe_round()
+
+    def probe_round(self):
+        """
+        Probes all bastions concurrently, waits at most timeout and a second for the round
+        """
+        threads = []
+        for bastion in list(self.get_bastions()):
+            with self._in_flight_lock:
+                if id(bastion) in self._in_flight:
+                    continue
+                self._in_flight.add(id(bastion))
+            thread = Thread(name=f"health-probe-{bastion.get_print_name()}", target=self._probe_guarded,
+                            args=(bastion,), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join(self.timeout + 1)
+
+    def _probe_guarded(self, bastion):
+        try:
+            self.probe(bastion)
+        except Exception as ex:
+            logging.debug(f"Health probe of {bastion.get_print_name()} failed {ex}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(id(bastion))
+
+    def uses_handshake(self, bastion) -> bool:
+        """
+        @return: True when probe should wait for SSH banner of target
+        """
+        if self.mode == "ssh-banner":
+            return True
+        if self.mode == "auto":
+            return bastion.tunnel_readiness == "ssh-banner" or \
+                str(bastion.forward_target.get("target_port")) == "22"
+        return False
+
+    def probe(self, bastion):
+        if not bastion.connected or not bastion.forward_target or not bastion.active_tunnel or \
+                bastion.active_tunnel.poll() is not None:
+            return
+
+        latency = measure_port("127.0.0.1", bastion.forward_target["local_port"],
+                               handshake=self.uses_handshake(bastion),
+                               timeout=self.timeout)
+        bastion.health.record(latency)
+        if latency is None and bastion.health.consecutive_failures >= self.failure_threshold:
+            bastion.health.reset_failures()
+            bastion.force_reconnect(f"{self.failure_threshold} health probes failed")
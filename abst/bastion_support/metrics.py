@@ -0,0 +1,236 @@
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, Optional
+
+from abst.config import default_metrics_buckets
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets in seconds
+    """
+
+    def __init__(self, buckets: tuple = default_metrics_buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> tuple:
+        """
+        @return: ([(le, cumulative count)], sum, count)
+        """
+        with self._lock:
+            cumulative, total = [], 0
+            for le, count in zip([*self.buckets, float("inf")], self.counts):
+                total += count
+                cumulative.append((le, total))
+            return cumulative, self.sum, self.count
+
+
+class Metrics:
+    """
+    Process wide registry of tunnel timing histograms
+    """
+    histograms_help = {
+        "abst_session_create_seconds": "Time OCI took to create bastion session",
+        "abst_session_active_seconds": "Time from session creation until session was ACTIVE",
+        "abst_connect_seconds": "Time from start of session creation until tunnel accepted connections",
+    }
+    _lock = Lock()
+    _histograms: dict = dict()
+
+    @classmethod
+    def observe(cls, name: str, context: str, value: float):
+        with cls._lock:
+            histogram = cls._histograms.get((name, context), None)
+            if histogram is None:
+                histogram = cls._histograms[(name, context)] = Histogram()
+        histogram.observe(value)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._histograms.clear()
+
+    @classmethod
+    def render(cls, bastions: list, task_count: Optional[int] = None) -> str:
+        """
+        Renders metrics in OpenMetrics text format
+        @param bastions: Bastions of scheduler
+        @param task_count: Count of asyncio tasks, None in threaded mode
+        """
+        from abst.bastion_support.control_master import ControlMaster
+        from abst.bastion_support.oci_clients import BastionClientRegistry
+
+        lines = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"# HELP {name} {help_text}")
+
+        def sample(name: str, labels: dict, value):
+            label_str = ",".join(f'{key}="{escape_label(str(val))}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_str}}} {format_value(value)}" if label_str
+                         else f"{name} {format_value(value)}")
+
+        with cls._lock:
+            histograms = sorted(cls._histograms.items())
+        for name, help_text in cls.histograms_help.items():
+            family(name, "histogram", help_text)
+            for (h_name, context), histogram in histograms:
+                if h_name != name:
+                    continue
+                buckets, h_sum, h_count = histogram.snapshot()
+                for le, count in buckets:
+                    sample(f"{name}_bucket", {"context": context, "le": format_value(float(le))},
+                           count)
+                sample(f"{name}_sum", {"context": context}, h_sum)
+                sample(f"{name}_count", {"context": context}, h_count)
+
+        bastions = sorted(bastions, key=lambda b: b.get_print_name())
+        family("abst_tunnel_connected", "gauge", "1 if tunnel of context accepts connections")
+        for bastion in bastions:
+            sample("abst_tunnel_connected", {"context": bastion.get_print_name()},
+                   int(bool(bastion.connected)))
+
+        family("abst_reconnects", "counter", "Reconnect attempts of tunnel")
+        for bastion in bastions:
+            sample("abst_reconnects_total", {"context": bastion.get_print_name()},
+                   bastion.reconnect.reconnects)
+
+        family("abst_probe_latency_seconds", "summary",
+               "Latency of health probes, SSH banner of target or accept of local listener "
+               "depending on health-probe")
+        for bastion in bastions:
+            for quantile in (0.5, 0.95, 0.99):
+                latency = bastion.health.percentile(quantile * 100)
+                if latency is not None:
+                    sample("abst_probe_latency_seconds",
+                           {"context": bastion.get_print_name(), "quantile": quantile}, latency)
+
+        family("abst_probe_failures", "counter", "Failed health probes")
+        for bastion in bastions:
+            sample("abst_probe_failures_total", {"context": bastion.get_print_name()},
+                   bastion.health.failures)
+
+        family("abst_relay_bytes", "counter", "Bytes relayed through accounting relay")
+        for bastion in bastions:
+            if bastion.relay:
+                stats = bastion.relay.stats.snapshot()
+                for direction in ("sent", "received"):
+                    sample("abst_relay_bytes_total",
+                           {"context": bastion.get_print_name(), "direction": direction},
+                           stats[f"bytes_{direction}"])
+
+        family("abst_oci_api_calls", "counter", "OCI Bastion API calls by operation and result")
+        for operation, counters in sorted(BastionClientRegistry.stats.snapshot().items()):
+            for result, count in sorted(counters.items()):
+                sample("abst_oci_api_calls_total", {"operation": operation, "result": result}, count)
+
+        family("abst_ssh_processes", "gauge", "Running ssh processes, tunnels and control masters")
+        sample("abst_ssh_processes", {}, count_ssh_processes(bastions) + ControlMaster.count_alive())
+
+        family("abst_scheduler_threads", "gauge", "Threads of abst process")
+        sample("abst_scheduler_threads", {}, threading.active_count())
+        if task_count is not None:
+            family("abst_scheduler_tasks", "gauge", "Tasks of asyncio scheduler")
+            sample("abst_scheduler_tasks", {}, task_count)
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def count_ssh_processes(bastions: list) -> int:
+    # active_tunnel is placeholder without poll until first tunnel is started
+    return sum(1 for bastion in bastions
+               if bastion.ssh_engine == "openssh" and not bastion.control_master
+               and hasattr(bastion.active_tunnel, "poll") and bastion.active_tunnel.poll() is None)
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+class MetricsExporter:
+    """
+    Local HTTP endpoint serving OpenMetrics on /metrics
+    """
+
+    def __init__(self, get_bastions: Callable[[], list], address: str, port: int):
+        """
+        @param get_bastions: Callable returning bastions of scheduler
+        @param address: Address to bind, 127.0.0.1 keeps endpoint local
+        @param port: Port to bind, 0 picks free port
+        """
+        self.get_bastions = get_bastions
+        self.address = address
+        self.port = port
+        self.get_task_count: Optional[Callable[[], int]] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> bool:
+        """
+        @return: False if port could not be bound
+        """
+        try:
+            self._server = ThreadingHTTPServer((self.address, self.port), _MetricsHandler)
+        except OSError as ex:
+            logging.error(f"Metrics endpoint can not listen on {self.address}:{self.port} {ex}")
+            return False
+        self._server.daemon_threads = True
+        self._server.exporter = self
+        self.port = self._server.server_address[1]
+        Thread(name="metrics", target=self._server.serve_forever, daemon=True).start()
+        return True
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def render(self) -> str:
+        task_count = None
+        if self.get_task_count:
+            try:
+                task_count = self.get_task_count()
+            except RuntimeError:
+                # Tasks changed while being counted from other thread
+                pass
+        return Metrics.render(list(self.get_bastions()), task_count)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.exporter.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(f"Metrics request {format % args}")
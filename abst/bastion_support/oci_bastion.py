@@ -4,53 +4,96 @@ import logging
 import os
 import signal
 import subprocess
+import uuid
+import weakref
 from json import JSONDecodeError
 from pathlib import Path
+from queue import Queue, Empty
 from shlex import quote as shlex_quote
-from time import sleep
+from threading import Timer, Thread, Event
+from time import sleep, monotonic
 from typing import Optional
 
-import oci
 import rich
-from bext import title
-from oci.exceptions import ServiceError
 
 from abst.config import default_creds_path, \
     default_contexts_location, default_conf_path, \
-    default_conf_contents, get_public_key, default_parallel_sets_location, broadcast_shm_name
+    default_conf_contents, get_public_key, default_parallel_sets_location, broadcast_shm_name, \
+    default_key_probe_timeout, default_reuse_min_remaining_ttl, default_delete_deadline, \
+    default_delete_call_timeout, default_shutdown_deadline, default_shutdown_workers, \
+    default_pending_deletions_path, default_ssh_engine, default_tunnel_readiness, \
+    default_tunnel_ready_deadline, default_ssh_output_buffer, default_ssh_logs_path
+from abst.bastion_support.admission import AdmissionController
+from abst.bastion_support.asyncssh_forwarder import AsyncSSHForwarder, ForwardingLoop, \
+    is_asyncssh_available
+from abst.bastion_support.control_master import ControlMaster, ControlMasterTunnel
+from abst.bastion_support.health_prober import LatencyStats
+from abst.bastion_support.metrics import Metrics
+from abst.bastion_support.reconnect import Reconnector, NetworkWatcher
+from abst.bastion_support.relay import TunnelRelay
+from abst.bastion_support.spans import SpanRecorder
+from abst.bastion_support.oci_clients import BastionClientRegistry
+from abst.bastion_support.session_cache import SessionCache
+from abst.bastion_support.session_waiter import SessionWaiter
 from abst.sharing.local_broadcast import LocalBroadcast
 from abst.utils.misc_funcs import run_once
+from abst.utils.net import probe_port
+from abst.utils.ring_buffer import RingBuffer
 from abst.wrappers import mark_on_exit
 
 
 class Bastion:
     stopped = False
+    live_bastions = weakref.WeakSet()
     session_list = []
     session_desc = dict()
+    # Set by parallel scheduler, single context creates sessions without admission
+    admission: Optional[AdmissionController] = None
     custom_ssh_options: str = "-o ServerAliveInterval=20"
     force_ssh_options: str = "-o StrictHostKeyChecking=no -o ServerAliveInterval=20 -o UserKnownHostsFile=/dev/null"
 
-    def __init__(self, context_name=None, region=None, direct_json_path=None):
+    def __init__(self, context_name=None, region=None, direct_json_path=None, reuse_session=False):
         """
 
         @param context_name:
         @param region:
         @param direct_json_path:
+        @param reuse_session: Adopt matching ACTIVE session instead of creating new one
         """
         self.bid: Optional[str] = None
         self.context_name = context_name
         self.region = region
+        self.reuse_session: bool = reuse_session
         self.shell: bool = False
-        self.tries: int = 10
+        self.reconnect = Reconnector()
         self.connected: bool = False
         self.active_tunnel: subprocess.Popen = Optional[None]
         self.response: Optional[dict] = None
         self._current_status = None
+        self.spans = SpanRecorder(self.get_print_name())
+        self.phase_timings: dict = dict()
+        self.create_started: Optional[float] = None
+        self.ssh_tunnel_arg_str: Optional[str] = None
+        self.ssh_engine: str = default_ssh_engine
+        self.control_master: bool = False
+        self.ssh_verbose: bool = False
+        self.tunnel_readiness: str = default_tunnel_readiness
+        self.ssh_output = RingBuffer(default_ssh_output_buffer)
+        self.health = LatencyStats()
+        self.relay: Optional[TunnelRelay] = None
+        self.forward_target: Optional[dict] = None
+        self.admitted_bastion_id: Optional[str] = None
+        self.creating: bool = False
+        # Set when tunnel is ended to switch it to rotated session
+        self.rotating = Event()
+        # Bastion whose session slot is returned once tunnel switches to rotated session
+        self.rotated_bastion_id: Optional[str] = None
         self.direct_json_path = direct_json_path
         self.__mark_used__(direct_json_path)
 
         self.lb = LocalBroadcast(broadcast_shm_name)
-        self.lb.store_json(context_name, {"region": self.region})
+        self.lb.hold_lease(context_name, {"region": self.region})
+        Bastion.live_bastions.add(self)
 
     def __mark_used__(self, path: Optional[Path] = None):
         if path is None:
@@ -69,15 +112,12 @@ class Bastion:
     @current_status.setter
     def current_status(self, value):
         self._current_status = value
-        self.lb.store_json(self.context_name, {"status": value})
+        self.spans.transition(value)
+        self.lb.publish(self.context_name, {"status": value})
 
-    def get_bastion_state(self) -> dict:
-        session_id = self.response["id"]
-        config = oci.config.from_file()
-        if self.region:
-            config["region"] = self.region
-
-        req = oci.bastion.BastionClient(config).get_session(session_id)
+    def get_bastion_state(self, session_id: Optional[str] = None) -> dict:
+        session_id = session_id or self.response["id"]
+        req = BastionClientRegistry.call("get_session", session_id, region=self.region)
 
         try:
             return Bastion.parse_response(req.data)
@@ -91,41 +131,166 @@ class Bastion:
         rich.print(f"[red]Killing Bastion {self.get_print_name()} SSH Tunnel[/red]")
         try:
             Bastion.stopped = True
-            sess_id = self.response["id"]
-            Bastion.session_list.remove(sess_id)
-            region = Bastion.session_desc.pop(sess_id)
-            print(f"Cleaning {self.get_print_name()}")
-            self.delete_bastion_session(sess_id, region)
-            print(f"Preparing to remove session {self.get_print_name()}")
-            self.active_tunnel.send_signal(signal.SIGTERM)
+            self.terminate_tunnel()
+            if released := self.release_session():
+                print(f"Cleaning {self.get_print_name()}")
+                self.delete_bastion_session(*released)
         except Exception:
             rich.print(f"[green]Bastion successfully deleted[/green] {self.get_print_name()}")
         finally:
+            self.stop_relay()
+            self.spans.transition(None)
             self.lb.delete_context(self.context_name)
 
+    def terminate_tunnel(self):
+        if self.active_tunnel and self.active_tunnel.poll() is None:
+            print(f"Terminating SSH tunnel of {self.get_print_name()}")
+            self.active_tunnel.send_signal(signal.SIGTERM)
+        ControlMaster.stop_session(self.bid)
+
+    def stop_relay(self):
+        """
+        Stops accepting clients on local port, tunnel behind relay is going away
+        """
+        if self.relay:
+            self.relay.stop()
+            self.relay = None
+
+    def force_reconnect(self, reason: str):
+        """
+        Ends tunnel which is alive but does not work, forward loop will dig new one
+        """
+        rich.print(f"({self.get_print_name()}) Reconnecting tunnel, {reason}")
+        self.ssh_output.append(f"reconnect forced: {reason}")
+        self.current_status = "reconnecting"
+        self.connected = False
+        if self.control_master:
+            # Master itself can be stalled
+            ControlMaster.stop_session(self.bid)
+        if self.active_tunnel and self.active_tunnel.poll() is None:
+            self.active_tunnel.send_signal(signal.SIGTERM)
+
+    def release_session(self) -> Optional[tuple]:
+        """
+        Removes current session from bookkeeping
+        @return: (session id, region) of session that should be deleted, None if there is
+         nothing to delete or session is kept for reuse
+        """
+        if not self.response:
+            return None
+        sess_id = self.response["id"]
+        if sess_id in Bastion.session_list:
+            Bastion.session_list.remove(sess_id)
+        region = Bastion.session_desc.pop(sess_id, self.region)
+        if self.reuse_session:
+            print(f"Keeping session of {self.get_print_name()} for reuse")
+            return None
+        return sess_id, region
+
     @classmethod
-    def delete_bastion_session(cls, sess_id, region=None):
+    def delete_bastion_session(cls, sess_id, region=None,
+                               deadline: float = default_delete_deadline) -> bool:
+        """
+        Deletes session, retries on service errors until deadline runs out
+        @param deadline: Seconds until giving up
+        @return: True if session got deleted or is already being deleted
+        """
+        from oci.exceptions import ServiceError
+        end = monotonic() + deadline
+        backoff = 0.1
         try:
-            config = oci.config.from_file()
-            if region:
-                config["region"] = region
             while True:
                 try:
-                    if oci.bastion.BastionClient(config).get_session(
-                            sess_id).data.lifecycle_state == "DELETED":
-                        return
-                    oci.bastion.BastionClient(config).delete_session(sess_id)
-                    return
-                except ServiceError:
-                    sleep(0.1)
+                    BastionClientRegistry.call("delete_session", sess_id, region=region,
+                                               timeout=default_delete_call_timeout, deadline=end)
+                    return True
+                except ServiceError as ex:
+                    if ex.status in (404, 409):
+                        # Already deleted or being deleted
+                        return True
+                    logging.debug(f"Failed to delete session {sess_id} {ex.status} {ex.code}")
+                if (remaining := end - monotonic()) <= 0:
+                    return False
+                sleep(min(backoff, remaining))
+                backoff = min(backoff * 2, 2)
         except Exception as ex:
             logging.info(f"Exception while trying to delete session {ex}")
+            return False
+
+    @classmethod
+    def delete_sessions(cls, sessions: dict, deadline: float = default_shutdown_deadline,
+                        workers: int = default_shutdown_workers) -> dict:
+        """
+        Deletes sessions concurrently with overall deadline
+        @param sessions: Session id to region mapping
+        @return: Session id to region mapping of sessions which did not get deleted
+        """
+        if not sessions:
+            return {}
+
+        end = monotonic() + deadline
+        queued = Queue()
+        for item in sessions.items():
+            queued.put(item)
+        results = Queue()
+
+        def work():
+            while (remaining := end - monotonic()) > 0:
+                try:
+                    sess_id, region = queued.get_nowait()
+                except Empty:
+                    return
+                results.put((sess_id, cls.delete_bastion_session(sess_id, region, remaining)))
+
+        # Daemon workers, calls stuck past deadline must not hold interpreter exit
+        for i in range(min(workers, len(sessions))):
+            Thread(name=f"abst-delete-{i}", target=work, daemon=True).start()
+
+        left = dict(sessions)
+        for _ in sessions:
+            try:
+                sess_id, deleted = results.get(timeout=max(end - monotonic(), 0))
+            except Empty:
+                logging.info(f"Session deletion deadline {deadline}s reached")
+                break
+            if deleted:
+                left.pop(sess_id)
+            print(f"Deleted {len(sessions) - len(left)}/{len(sessions)}")
+        return left
+
+    @classmethod
+    def store_pending_deletions(cls, sessions: dict):
+        """
+        Stores sessions which failed to be deleted for later cleanup
+        """
+        pending = cls.load_json(default_pending_deletions_path) \
+            if default_pending_deletions_path.exists() else {}
+        pending.update(sessions)
+        cls.write_creds_json(pending, default_pending_deletions_path)
+
+    @classmethod
+    def cleanup_pending_sessions(cls):
+        """
+        Retries deletion of sessions left over by previous shutdowns
+        """
+        if not default_pending_deletions_path.exists():
+            return
+        pending = cls.load_json(default_pending_deletions_path)
+        if not pending:
+            return
+        logging.info(f"Cleaning {len(pending)} sessions left from previous run")
+        left = cls.delete_sessions(pending)
+        if left:
+            cls.write_creds_json(left, default_pending_deletions_path)
+        else:
+            default_pending_deletions_path.unlink(missing_ok=True)
 
     @mark_on_exit
     def create_managed_loop(self, shell: bool = False):
         Bastion.shell = shell
         print(f"Loading Credentials {self.get_print_name()}")
         creds = self.load_self_creds()
+        self.configure_reconnect(creds)
         conf = Bastion.load_config()
 
         self.current_status = "creating bastion session"
@@ -165,9 +330,9 @@ class Bastion:
             exit(1)
 
         self.current_status = "waiting for session init"
-        self.wait_for_prepared()
-
-        sleep(1)  # Precaution init delay
+        if not self.wait_for_prepared(creds, str(Path(private_key_path).expanduser().resolve())):
+            self.discard_session(bid)
+            return
 
         self.current_status = "digging tunnel"
         ssh_tunnel_args, exit_code = self.run_ssh_tunnel_managed_session(bid, host,
@@ -184,22 +349,17 @@ class Bastion:
             self.kill()
             return
 
-        while status := (sdata := self.get_bastion_state())[
-                            "lifecycle_state"] == "ACTIVE":
-            deleted = self.connect_till_deleted(sdata, ssh_tunnel_args, status, shell,
-                                                True)
-
-            if deleted:
-                print(f"Bastion {self.get_print_name()} Session got deleted")
-                self.current_status = "bastion session deleted"
-                return
+        if self.connect_till_deleted(shell, ssh_tunnel_args, True):
+            print(f"Bastion {self.get_print_name()} Session got deleted")
+            self.current_status = "bastion session deleted"
+            return
 
         print(f"SSH Tunnel for {self.get_print_name()} Terminated")
         self.current_status = "ssh tunnel terminated"
         self.kill()
 
     @mark_on_exit
-    def create_forward_loop(self, shell: bool = False, force: bool = False, tries: int = 0):
+    def create_forward_loop(self, shell: bool = False, force: bool = False):
 
         from abst.bastion_support.bastion_scheduler import BastionScheduler
         if BastionScheduler.stopped:
@@ -208,40 +368,43 @@ class Bastion:
         Bastion.shell = shell
         print(f"Loading Credentials for {self.get_print_name()}")
         creds = self.load_self_creds()
+        self.configure_reconnect(creds)
         local_port = creds.get("local-port", 22)
         username = creds.get("resource-os-username", None)
         if username:
-            self.lb.store_json(self.context_name, {"port": local_port, "username": username})
+            self.lb.publish(self.context_name, {"port": local_port, "username": username})
         else:
             rich.print(
                 "[yellow]No username in context json, please "
                 "specify resource-os-username for abst ssh to work[/yellow]")
 
+        from bext import title
         title(f'{self.get_print_name()}:{local_port}')
 
+        if not self.admit_session(creds):
+            return
         self.current_status = "creating bastion session"
+        self.reconnect.connecting()
 
         try:
             host, ip, port, ssh_pub_key_path, res = self.create_bastion_forward_port_session(
                 creds)
         except subprocess.CalledProcessError as ex:
             logging.debug(f"Exception {ex}")
-            rich.print(f"[red]Invalid Config in abst[/red]")
-            exit(1)
+            rich.print(f"[red]Invalid Config in abst {self.get_print_name()}[/red]")
+            self.reconnect.give_up("invalid config")
+            self.current_status = "Failed"
+            return
 
         bid, response = self.load_response(res)
 
         if bid is None:
-            self.current_status = "creating bastion session failed"
             rich.print(f"Failed to Create Bastion {self.get_print_name()}"
                        f" with response '{response}'")
-            if tries < 3:
-                rich.print("Will try again in 1 second...")
-                sleep(1)
-                return self.create_forward_loop(shell, force, tries + 1)
-            else:
-                rich.print(f"Failed to create bastion {tries=}, please try to restart abst")
-                exit(1)
+            self.release_admission()
+            if (delay := self.schedule_reconnect("creating bastion session failed")) is not None:
+                self.reconnect.wait(delay)
+            return
         else:
             self.current_status = "creating bastion session succeeded"
             self.bid = bid
@@ -249,31 +412,173 @@ class Bastion:
 
         self.current_status = "waiting for session init"
 
-        self.wait_for_prepared()
-
-        sleep(1)  # Precaution
+        prepared = self.wait_for_prepared(creds, ssh_pub_key_path.strip('.pub'), force)
+        self.creation_done()
+        if not prepared:
+            self.discard_session(bid)
+            return
 
         self.current_status = "digging tunnel"
+        self.configure_tunnel(creds)
 
-        user_custom_args = creds.get("ssh-custom-arguments", "")
-        ssh_tunnel_arg_str = self.run_ssh_tunnel_port_forward(bid, host, ip, port,
-                                                              shell,
-                                                              local_port,
-                                                              ssh_pub_key_path, force, user_custom_args)
+        rotation_stop = Event()
+        rotate_fraction = float(Bastion.get_setting(creds, "rotate-at-ttl-fraction", 0))
+        if 0 < rotate_fraction < 1:
+            Thread(name=f"rotate-{self.get_print_name()}", target=self.rotate_before_expiry,
+                   args=[creds, rotate_fraction, force, rotation_stop], daemon=True).start()
 
-        while status := (sdata := self.get_bastion_state())[
-                            "lifecycle_state"] == "ACTIVE" and \
-                        not BastionScheduler.stopped:
-            deleted = self.connect_till_deleted(sdata, ssh_tunnel_arg_str, status, shell)
-
-            if deleted:
+        try:
+            user_custom_args = creds.get("ssh-custom-arguments", "")
+            if self.run_ssh_tunnel_port_forward(bid, host, ip, port, shell, local_port,
+                                                ssh_pub_key_path, force, user_custom_args):
                 print(f"Bastion Session {self.get_print_name()} got deleted")
                 self.current_status = "bastion session deleted"
                 return
+            if BastionScheduler.stopped:
+                return
+        finally:
+            rotation_stop.set()
 
         print(f"SSH Tunnel for {self.get_print_name()} Terminated")
-        self.current_status = "ssh tunnel terminated"
-        self.kill()
+        if not self.reconnect.gave_up:
+            self.current_status = "ssh tunnel terminated"
+        # Only this context ends, tunnels of other contexts keep running
+        self.terminate_tunnel()
+        self.discard_session(self.bid)
+
+    def admit_session(self, creds: dict) -> bool:
+        """
+        Waits for admission of session creation, status is queued while waiting
+        @return: False if abst stopped while context was queued
+        """
+        if Bastion.admission is None:
+            return True
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        if not Bastion.admission.admit(creds["bastion-id"], self.mark_queued,
+                                       lambda: Bastion.stopped or BastionScheduler.stopped):
+            return False
+        self.mark_admitted(creds["bastion-id"])
+        return True
+
+    def mark_queued(self):
+        self.current_status = "queued"
+
+    def mark_admitted(self, bastion_id: str):
+        self.admitted_bastion_id = bastion_id
+        self.creating = True
+
+    def creation_done(self):
+        """
+        Returns creation slot, session is ACTIVE or it will not become ACTIVE
+        """
+        if self.creating and Bastion.admission is not None:
+            Bastion.admission.created()
+        self.creating = False
+
+    def release_admission(self):
+        """
+        Returns creation and session slot, context does not use its session anymore
+        """
+        self.creation_done()
+        if self.admitted_bastion_id is not None and Bastion.admission is not None:
+            Bastion.admission.released(self.admitted_bastion_id)
+        self.admitted_bastion_id = None
+
+    def admit_rotation(self, bastion_id: str, stop: Event) -> bool:
+        """
+        Waits for admission of replacement session, until tunnel switches over context
+        holds two session slots of bastion
+        @return: False if rotation or abst stopped while waiting
+        """
+        if Bastion.admission is None:
+            return True
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+        return Bastion.admission.admit(
+            bastion_id, stopped=lambda: stop.is_set() or Bastion.stopped or BastionScheduler.stopped)
+
+    def rotation_done(self, bastion_id: str, rotated: bool):
+        """
+        Returns creation slot of replacement session, its session slot too if rotation failed
+        @param rotated: True if replacement session is ACTIVE and tunnel will switch to it
+        """
+        if Bastion.admission is None:
+            return
+        Bastion.admission.created()
+        if rotated:
+            self.rotated_bastion_id = bastion_id
+        else:
+            Bastion.admission.released(bastion_id)
+
+    def release_rotated_slot(self):
+        """
+        Returns session slot of replaced session
+        """
+        if self.rotated_bastion_id is not None and Bastion.admission is not None:
+            Bastion.admission.released(self.rotated_bastion_id)
+        self.rotated_bastion_id = None
+
+    def rotate_before_expiry(self, creds: dict, rotate_fraction: float, force: bool,
+                             stop: Event):
+        """
+        Creates replacement session when only rotate_fraction of session TTL is left,
+        once it accepts key the tunnel is switched over and old session is deleted
+        @param creds: Context credentials
+        @param rotate_fraction: Fraction of session TTL left when rotation starts
+        @param force: If force ssh options should be used
+        @param stop: Event stopping rotation when forward loop ends
+        """
+        from abst.bastion_support.bastion_scheduler import BastionScheduler
+
+        while not stop.is_set():
+            try:
+                sdata = self.get_bastion_state()
+            except Exception as ex:
+                logging.debug(f"({self.get_print_name()}) Rotation stopped {ex}")
+                return
+            remaining = Bastion.get_remaining_ttl(sdata)
+            rotate_in = remaining - sdata["session_ttl_in_seconds"] * rotate_fraction
+            if rotate_in > 0:
+                stop.wait(rotate_in)
+                continue
+            if BastionScheduler.stopped or Bastion.stopped:
+                return
+
+            if not self.admit_rotation(creds["bastion-id"], stop):
+                return
+
+            old_bid = self.bid
+            rich.print(f"Rotating session of {self.get_print_name()}, {remaining} seconds left")
+            try:
+                host, ip, port, ssh_pub_key_path, res = self.create_bastion_forward_port_session(
+                    creds, allow_reuse=False)
+                new_bid = Bastion.parse_response(res)["id"]
+            except Exception as ex:
+                logging.error(f"({self.get_print_name()}) Failed to create rotated session {ex}")
+                self.rotation_done(creds["bastion-id"], rotated=False)
+                stop.wait(max(min(remaining / 2, 30), 1))
+                continue
+
+            prepared = self.wait_for_prepared(creds, ssh_pub_key_path.strip('.pub'), force,
+                                              session_id=new_bid) and not stop.is_set()
+            self.rotation_done(creds["bastion-id"], rotated=prepared)
+            if not prepared:
+                self.discard_session(new_bid)
+                continue
+
+            self.set_port_forward(new_bid, host, ip, port, creds.get("local-port", 22),
+                                  ssh_pub_key_path, force, creds.get("ssh-custom-arguments", ""))
+            self.load_response(res)
+            self.bid = new_bid
+
+            # Forward loop reconnects with new session arguments right away
+            if self.active_tunnel and self.active_tunnel.poll() is None:
+                self.rotating.set()
+                self.active_tunnel.send_signal(signal.SIGTERM)
+            else:
+                self.release_rotated_slot()
+            self.current_status = "session rotated"
+            self.discard_session(old_bid)
+            rich.print(f"Session of {self.get_print_name()} rotated to '{new_bid}'")
 
     def run_ssh_tunnel_managed_session(self, bid, host, private_key_path, username,
                                        ip, port,
@@ -295,27 +600,270 @@ class Bastion:
         return ssh_tunnel_arg_str, exit_code
 
     def run_ssh_tunnel_port_forward(self, bid, host, ip, port, shell, local_port,
-                                    ssh_pub_key_path, force=False, custom_user_options: str = ""):
+                                    ssh_pub_key_path, force=False,
+                                    custom_user_options: str = "") -> bool:
+        """
+        Runs port forward tunnel and reconnects it until session is deleted
+        @return: True if session got deleted
+        """
         if custom_user_options:
             print(
                 "[yellow][WARNING] Having custom ssh arguments can prevent your ssh command from working[/yellow]")
 
         print(f"Bastion {self.get_print_name()} initialized")
         print(f"Initializing SSH Tunnel for {self.get_print_name()}")
-        additional_args = "" if not force else self.force_ssh_options
+        ssh_tunnel_arg_str = self.set_port_forward(bid, host, ip, port, local_port,
+                                                   ssh_pub_key_path, force, custom_user_options)
+        logging.info(f"Running ssh command {ssh_tunnel_arg_str}")
+        # Tunnel arguments change when session gets rotated
+        return self.connect_till_deleted(shell)
 
-        ssh_tunnel_arg_str = (
+    def build_port_forward_args(self, bid, host, ip, port, local_port, ssh_pub_key_path,
+                                force=False, custom_user_options: str = "") -> str:
+        additional_args = "" if not force else self.force_ssh_options
+        return (
             f"ssh {self.custom_ssh_options} {custom_user_options} -N -L {local_port}:{ip}:{port} -p 22 {bid}@{host} "
-            f"-vvv -i {ssh_pub_key_path.strip('.pub')} {additional_args}")
-        logging.info(f"Running ssh command {ssh_tunnel_arg_str}")
-        exit_code = self.__run_ssh_tunnel(ssh_tunnel_arg_str, shell)
-        logging.info(f"SSH command exit code {exit_code}")
-        return ssh_tunnel_arg_str
+            f"{'-vvv' if self.ssh_verbose else ''} -i {ssh_pub_key_path.strip('.pub')} {additional_args}")
+
+    def set_port_forward(self, bid, host, ip, port, local_port, ssh_pub_key_path,
+                         force=False, custom_user_options: str = "") -> str:
+        """
+        Sets target of tunnel for both ssh engines
+        @return: ssh tunnel arguments
+        """
+        if self.relay:
+            local_port = self.relay.upstream_port
+        self.forward_target = {"session_id": bid, "host": host, "target_ip": ip,
+                               "target_port": port, "local_port": local_port,
+                               "private_key_path": ssh_pub_key_path.strip('.pub'),
+                               "verify_host_key": not force,
+                               "ssh_options": " ".join([self.force_ssh_options if force
+                                                        else self.custom_ssh_options,
+                                                        custom_user_options])}
+        self.ssh_tunnel_arg_str = self.build_port_forward_args(bid, host, ip, port, local_port,
+                                                               ssh_pub_key_path, force,
+                                                               custom_user_options)
+        return self.ssh_tunnel_arg_str
+
+    def resolve_ssh_engine(self, creds: dict) -> str:
+        engine = str(Bastion.get_setting(creds, "ssh-engine", default_ssh_engine)).lower()
+        if engine not in ("openssh", "asyncssh"):
+            rich.print(f"[yellow]Unknown ssh-engine '{engine}', using openssh[/yellow]")
+            return "openssh"
+        if engine == "asyncssh" and not is_asyncssh_available():
+            rich.print("[yellow]asyncssh is not installed, using openssh, install it with "
+                       "`pip3 install abst[asyncssh]`[/yellow]")
+            return "openssh"
+        return engine
+
+    def configure_tunnel(self, creds: dict):
+        """
+        Resolves tunnel settings of context
+        """
+        self.ssh_engine = self.resolve_ssh_engine(creds)
+        self.control_master = self.use_control_master(creds)
+        self.tunnel_readiness = str(Bastion.get_setting(creds, "tunnel-readiness",
+                                                        default_tunnel_readiness)).lower()
+        if self.tunnel_readiness not in ("tcp", "ssh-banner", "log"):
+            rich.print(f"[yellow]Unknown tunnel-readiness '{self.tunnel_readiness}', "
+                       f"using tcp[/yellow]")
+            self.tunnel_readiness = "tcp"
+        # Readiness from ssh output needs debug output
+        self.ssh_verbose = self.tunnel_readiness == "log" or \
+            Bastion.is_setting_enabled(creds, "ssh-verbose", False)
+        if self.relay is None and Bastion.is_setting_enabled(creds, "relay", False):
+            self.start_relay(creds)
+
+    def start_relay(self, creds: dict):
+        """
+        Puts accounting relay on local port, tunnel is moved to internal port behind it.
+        Relay keeps listening across reconnects
+        """
+        relay = TunnelRelay(creds.get("local-port", 22),
+                            float(Bastion.get_setting(creds, "relay-bandwidth-limit", 0)),
+                            on_stats=lambda stats: self.lb.publish(self.context_name,
+                                                                   {"traffic": stats}))
+        if relay.start():
+            self.relay = relay
+            logging.info(f"({self.get_print_name()}) Relaying local port {relay.listen_port} "
+                         f"to tunnel on {relay.upstream_port}")
+        else:
+            rich.print(f"[yellow]({self.get_print_name()}) Relay could not listen on "
+                       f"{relay.listen_port}, forwarding without relay[/yellow]")
+
+    def use_control_master(self, creds: dict) -> bool:
+        return self.ssh_engine == "openssh" and os.name != "nt" and \
+            Bastion.is_setting_enabled(creds, "control-master", False)
+
+    def open_control_master_forward(self) -> tuple:
+        """
+        Adds local port forward to control master of current session, master is started
+        only if it is not running yet
+        @return: (authorized, tunnel) tunnel is None if forward could not be opened
+        """
+        target = self.forward_target
+        master = ControlMaster.get(target["session_id"], target["host"],
+                                   target["private_key_path"], target["ssh_options"])
+        if not master.is_alive():
+            self.current_status = "connecting"
+            if not master.start():
+                self.connected = False
+                if master.auth_failed:
+                    rich.print(f"({self.get_print_name()}) SSH Tunnel authorization failed")
+                    return False, None
+                rich.print(f"({self.get_print_name()}) Failed to start SSH control master")
+                return True, None
+
+        spec = f'{target["local_port"]}:{target["target_ip"]}:{target["target_port"]}'
+        if not master.forward(spec):
+            rich.print(f"({self.get_print_name()}) Failed to forward local port {spec}")
+            self.connected = False
+            return True, None
+
+        self.mark_tunnel_ready()
+        return True, ControlMasterTunnel(master, spec)
+
+    def run_control_master_tunnel(self) -> bool:
+        """
+        Forwards through control master until master ends or forward is cancelled
+        @return: False if ssh failed on authorization
+        """
+        authorized, tunnel = self.open_control_master_forward()
+        if tunnel is None:
+            return authorized
+        self.active_tunnel = tunnel
+        tunnel.wait()
+        self.connected = False
+        return True
 
-    def wait_for_prepared(self):
+    def build_forwarder(self) -> AsyncSSHForwarder:
+        target = self.forward_target
+        return AsyncSSHForwarder(target["host"], target["session_id"], target["private_key_path"],
+                                 target["local_port"], target["target_ip"], target["target_port"],
+                                 verify_host_key=target["verify_host_key"],
+                                 on_event=self.process_forward_event)
+
+    def process_forward_event(self, event: str, detail: Optional[str] = None):
+        """
+        Updates tunnel state from in process forward events
+        """
+        self.ssh_output.append(f"{event} {detail}" if detail else event)
+        if event == "connecting":
+            self.current_status = "connecting"
+        elif event == "listening":
+            self.mark_tunnel_ready()
+        elif event == "auth_failed":
+            self.dump_ssh_output("authorization failed")
+            self.connected = False
+            self.current_status = "authorization failed"
+            rich.print(f"({self.get_print_name()}) SSH Tunnel authorization failed {detail}")
+        elif event == "closed":
+            self.connected = False
+            if detail:
+                rich.print(f"({self.get_print_name()}) SSH Tunnel closed: {detail}")
+
+    def wait_for_prepared(self, creds: dict, private_key_path: Optional[str] = None,
+                          force: bool = False, session_id: Optional[str] = None) -> bool:
+        """
+        Waits until session is ACTIVE and bastion accepts key with backoff and deadline
+        @param creds: Context credentials used for waiter settings
+        @param private_key_path: Private key used for probing, probe is skipped if None
+        @param force: If force ssh options should be used for probing
+        @param session_id: Session to wait for, current session if None
+        @return: True if session is ready before deadline
+        """
+        session_id = session_id or self.bid
         print(f"Waiting for Bastion {self.get_print_name()} to initialize")
-        while self.get_bastion_state()["lifecycle_state"] != "ACTIVE":
-            sleep(0.5)
+        waiter = SessionWaiter.from_settings(
+            lambda key, default: Bastion.get_setting(creds, key, default))
+
+        ready = waiter.wait_for("active", lambda: (self.get_bastion_state(session_id) or {}).get(
+            "lifecycle_state", None) == "ACTIVE")
+        if ready and private_key_path and Bastion.is_setting_enabled(creds, "verify-key", True):
+            ready = waiter.wait_for("key", lambda: self.probe_key_accepted(creds["host"],
+                                                                           private_key_path,
+                                                                           force, session_id))
+        return self.record_readiness(waiter, ready)
+
+    def record_readiness(self, waiter: SessionWaiter, ready: bool) -> bool:
+        """
+        Publishes readiness phase timings and failure status
+        """
+        self.phase_timings = waiter.phases
+        self.lb.publish(self.context_name, {"timings": waiter.phases})
+        if ready and "active" in waiter.phases:
+            Metrics.observe("abst_session_active_seconds", self.get_print_name(),
+                            waiter.phases["active"])
+        logging.info(f"({self.get_print_name()}) Session readiness timings {waiter.phases}")
+
+        if not ready:
+            rich.print(f"[red]Bastion {self.get_print_name()} session did not get ready "
+                       f"in {waiter.deadline} seconds[/red]")
+            self.current_status = "waiting for session init failed"
+        return ready
+
+    def probe_key_accepted(self, host: str, private_key_path: str, force: bool = False,
+                           session_id: Optional[str] = None) -> bool:
+        """
+        Checks if bastion already accepts key for this session by authenticating and
+        disconnecting right after
+        @return: True if key was accepted or probe was inconclusive
+        """
+        timeout = default_key_probe_timeout
+        args = self.build_key_probe_args(host, private_key_path, force, session_id)
+        try:
+            p = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            return True
+
+        timer = Timer(timeout, p.kill)
+        timer.start()
+        try:
+            for raw_line in p.stderr:
+                accepted = Bastion.classify_key_probe_line(raw_line.decode("utf-8", errors="replace"))
+                if accepted is not None:
+                    return accepted
+            return False
+        finally:
+            timer.cancel()
+            if p.poll() is None:
+                p.terminate()
+            p.wait()
+
+    def build_key_probe_args(self, host: str, private_key_path: str, force: bool = False,
+                             session_id: Optional[str] = None) -> list:
+        additional_args = self.force_ssh_options.split() if force else []
+        return ["ssh", "-v", "-N", "-o", "BatchMode=yes", "-o",
+                f"ConnectTimeout={default_key_probe_timeout}",
+                *additional_args, "-i", private_key_path, "-p", "22",
+                f"{session_id or self.bid}@{host}"]
+
+    @classmethod
+    def classify_key_probe_line(cls, line: str) -> Optional[bool]:
+        """
+        @return: True if key was accepted, False if rejected, None if line does not tell
+        """
+        if "Authenticated to" in line:
+            return True
+        if "Permission denied" in line:
+            logging.debug("Key not accepted yet")
+            return False
+        if "Host key verification failed" in line:
+            # Can not tell without known host, tunnel will report it
+            return True
+        return None
+
+    def discard_session(self, bid: str):
+        """
+        Deletes session which will not be used
+        """
+        if bid in Bastion.session_list:
+            Bastion.session_list.remove(bid)
+        region = Bastion.session_desc.pop(bid, self.region)
+        SessionCache.remove(self.get_session_cache_key(), bid)
+        ControlMaster.stop_session(bid)
+        self.delete_bastion_session(bid, region)
 
     @classmethod
     def parse_response(cls, res):
@@ -334,26 +882,118 @@ class Bastion:
 
         return bid, response
 
-    def create_bastion_forward_port_session(self, creds):
+    def create_bastion_forward_port_session(self, creds, allow_reuse: bool = True):
         ssh_pub_path = Bastion.init_session_details(creds)
-
-        res = self.__create_bastion_session_port_forward(creds["bastion-id"],
-                                                         creds["target-ip"],
-                                                         f'{creds["default-name"]}-ctx-'
-                                                         f'{self.get_print_name()}',
-                                                         int(creds["target-port"]),
-                                                         ssh_pub_path,
-                                                         int(creds["ttl"]), False,
-                                                         creds.get("region", None))
+        name = f'{creds["default-name"]}-ctx-{self.get_print_name()}'
+        self.create_started = monotonic()
+
+        res = None
+        if allow_reuse and (self.reuse_session or Bastion.is_setting_enabled(creds, "reuse-session")):
+            self.reuse_session = True
+            res = self.find_reusable_session(creds, name, ssh_pub_path)
+
+        if res is None:
+            res = self.__create_bastion_session_port_forward(creds["bastion-id"],
+                                                             creds["target-ip"],
+                                                             name,
+                                                             int(creds["target-port"]),
+                                                             ssh_pub_path,
+                                                             int(creds["ttl"]), False,
+                                                             creds.get("region", None))
+            Metrics.observe("abst_session_create_seconds", self.get_print_name(),
+                            monotonic() - self.create_started)
         try:
             trs = Bastion.parse_response(res)
             Bastion.session_list.append(trs["id"])
             Bastion.session_desc[trs["id"]] = creds.get("region", None)
+            if self.reuse_session:
+                SessionCache.put(self.get_session_cache_key(), trs["id"])
             logging.debug(f"Added session id of {self.context_name}")
         except Exception as e:
             logging.error(f"Exception {e}")
         return creds["host"], creds["target-ip"], creds["target-port"], ssh_pub_path, res
 
+    def get_session_cache_key(self) -> str:
+        return str(self.get_creds_path())
+
+    @classmethod
+    def is_reusable_session(cls, session, creds: dict, name: str, public_key: str,
+                            min_ttl: int) -> bool:
+        """
+        @return: True if session is ACTIVE, matches name, target and public key and has more
+         than min_ttl seconds left
+        """
+        target = session.target_resource_details
+        return session.lifecycle_state == "ACTIVE" and \
+            session.display_name == name and \
+            getattr(target, "target_resource_private_ip_address", None) == creds["target-ip"] and \
+            str(getattr(target, "target_resource_port", None)) == str(creds["target-port"]) and \
+            session.key_details.public_key_content.strip() == public_key and \
+            Bastion.get_remaining_ttl(Bastion.parse_response(session)) > min_ttl
+
+    def find_reusable_session(self, creds: dict, name: str, ssh_pub_path: str):
+        """
+        Looks up ACTIVE session matching name, target and public key with enough TTL left,
+        cached session id is checked first and bastion session list after
+        @return: Session data of matching session or None, also when sessions can not be listed
+        """
+        from oci.exceptions import ServiceError
+        region = creds.get("region", None)
+        public_key = get_public_key(ssh_pub_path).strip()
+        min_ttl = int(Bastion.get_setting(creds, "reuse-min-remaining-ttl",
+                                          default_reuse_min_remaining_ttl))
+        cache_key = self.get_session_cache_key()
+
+        def matches(session) -> bool:
+            return Bastion.is_reusable_session(session, creds, name, public_key, min_ttl)
+
+        if cached_id := SessionCache.get(cache_key):
+            try:
+                session = BastionClientRegistry.call("get_session", cached_id, region=region).data
+                if matches(session):
+                    rich.print(f"Reusing cached session {cached_id} for {self.get_print_name()}")
+                    return session
+            except ServiceError as ex:
+                logging.debug(f"Cached session {cached_id} not available {ex}")
+            SessionCache.remove(cache_key, cached_id)
+
+        try:
+            summaries = BastionClientRegistry.call("list_sessions", creds["bastion-id"],
+                                                   region=region, display_name=name,
+                                                   session_lifecycle_state="ACTIVE").data
+        except ServiceError as ex:
+            logging.error(f"({self.get_print_name()}) Failed to list sessions for reuse {ex}")
+            return None
+
+        candidates = []
+        for summary in summaries:
+            try:
+                session = BastionClientRegistry.call("get_session", summary.id, region=region).data
+            except ServiceError as ex:
+                # Session can get deleted between list and get
+                logging.debug(f"Session {summary.id} not available {ex}")
+                continue
+            if matches(session):
+                candidates.append(session)
+
+        if not candidates:
+            return None
+
+        session = max(candidates,
+                      key=lambda sess: Bastion.get_remaining_ttl(Bastion.parse_response(sess)))
+        rich.print(f"Reusing session {session.id} for {self.get_print_name()}")
+        return session
+
+    @classmethod
+    def get_remaining_ttl(cls, sdata: dict) -> int:
+        """
+        Seconds left until session TTL runs out
+        """
+        created_time = datetime.datetime.fromisoformat(sdata["time_created"]).astimezone(
+            datetime.timezone.utc)
+        now_time = datetime.datetime.now(datetime.timezone.utc)
+        return int(sdata["session_ttl_in_seconds"] - (now_time - created_time).total_seconds())
+
     @classmethod
     def init_session_details(cls, creds):
         cfg = Bastion.load_config()
@@ -441,6 +1081,19 @@ class Bastion:
     def load_config(cls):
         return cls.load_json(default_conf_path)
 
+    @classmethod
+    def get_setting(cls, creds: dict, key: str, default=None):
+        """
+        Resolves setting from context, then from abst config and then default
+        """
+        if key in creds.keys():
+            return creds[key]
+        return cls.load_config().get(key, default)
+
+    @classmethod
+    def is_setting_enabled(cls, creds: dict, key: str, default: bool = False) -> bool:
+        return str(cls.get_setting(creds, key, default)).lower() in ("true", "1", "yes", "on")
+
     @classmethod
     def load_json(cls, path=default_creds_path) -> dict:
         if not path.name.endswith(".json"):
@@ -502,51 +1155,83 @@ class Bastion:
             json.dump(td, f, indent=4)
         return path
 
-    def connect_till_deleted(self, sdata, ssh_tunnel_arg_str, status, shell,
-                             already_split=False):
+    def connect_till_deleted(self, shell, ssh_tunnel_args=None, already_split=False) -> bool:
         """
-        Will connect to session and reconnect every time it disconnects until session is
-        deleted :param shell: If you use shell environment (can have different impacts on
-        MAC and LINUX) :param sdata: :param ssh_tunnel_arg_str: param status: :return:
+        Runs tunnel and reconnects it with backoff every time it disconnects until session is
+        deleted, tunnel ended by session rotation is reconnected right away
+        @param shell: If you use shell environment (can have different impacts on MAC and LINUX)
+        @param ssh_tunnel_args: Tunnel arguments, current ssh_tunnel_arg_str if None as it
+         changes on session rotation
+        @return: True if session got deleted, False if abst stopped or tunnel should get
+         new session
         """
         from abst.bastion_support.bastion_scheduler import BastionScheduler
 
-        for i in range(1, 3):
-            if not status and not BastionScheduler.stopped:
-                rich.print(f"({self.get_print_name()}) Trying another time {i}/3")
-                status = self.__run_ssh_tunnel(ssh_tunnel_arg_str, shell, already_split)
-            else:
-                break
-
-        # Proceed with check for disconnect or termination, after process termination
-        if not self.connected and status and not BastionScheduler.stopped:
-            rich.print(
-                f"Checking for idle termination, Bastion {self.get_print_name()} "
-                f"Active? {status}")
-            created_time = datetime.datetime.fromisoformat(
-                sdata["time_created"]).astimezone(
-                datetime.timezone.utc)
-            now_time = datetime.datetime.now(datetime.timezone.utc)
-            ttl_now = now_time - created_time
-            ttl_max = sdata["session_ttl_in_seconds"]
-            delta = ttl_max - ttl_now.seconds
-            if delta > 0 and not BastionScheduler.stopped and not Bastion.stopped:
-                print(
-                    f"Bastion {self.get_print_name()} "
-                    f"Current session {delta} seconds remaining ({ttl_now}) "
-                    f"reconnecting")
-                self.__run_ssh_tunnel(ssh_tunnel_arg_str, shell, already_split)
+        auth_failures = 0
+        while not BastionScheduler.stopped and not Bastion.stopped:
+            self.reconnect.connecting()
+            succeeded = self.__run_ssh_tunnel(ssh_tunnel_args or self.ssh_tunnel_arg_str, shell,
+                                              already_split)
+            if BastionScheduler.stopped or Bastion.stopped:
                 return False
-            else:
-                print(
-                    f"Bastion {self.get_print_name()} "
-                    f"Session TTL run out, please start create new one")
+            if self.take_rotation():
+                auth_failures = 0
+                continue
+
+            sdata = self.get_bastion_state()
+            delta = Bastion.get_remaining_ttl(sdata)
+            if sdata["lifecycle_state"] != "ACTIVE" or delta <= 0:
+                print(f"Bastion {self.get_print_name()} Session TTL run out or session "
+                      f"was deleted")
                 return True
 
+            auth_failures = 0 if succeeded else auth_failures + 1
+            if auth_failures > 2:
+                # Key of this session keeps being rejected, new session is needed
+                return False
+            delay = self.schedule_reconnect("tunnel closed" if succeeded else "authorization failed")
+            if delay is None:
+                return False
+            print(f"Bastion {self.get_print_name()} Current session {delta} seconds remaining "
+                  f"reconnecting in {delay:.1f}s")
+            self.reconnect.wait(delay)
+        return False
+
+    def take_rotation(self) -> bool:
+        """
+        @return: True if tunnel ended because session got rotated, then it should be
+         reconnected without backoff
+        """
+        if not self.rotating.is_set():
+            return False
+        self.rotating.clear()
+        self.release_rotated_slot()
+        logging.info(f"({self.get_print_name()}) Reconnecting tunnel to rotated session")
+        return True
+
+    def configure_reconnect(self, creds: dict):
+        self.reconnect.configure(lambda key, default: Bastion.get_setting(creds, key, default))
+        NetworkWatcher.subscribe(self.reconnect.network_changed)
+
+    def schedule_reconnect(self, reason: str) -> Optional[float]:
+        """
+        Records failed attempt of tunnel
+        @return: Seconds to wait before next attempt, None if context gave up
+        """
+        delay = self.reconnect.failed(reason)
+        if delay is None:
+            rich.print(f"[red]({self.get_print_name()}) Giving up after {self.reconnect.attempts - 1}"
+                       f" failed attempts, last error: {reason}[/red]")
+            self.current_status = "Failed"
+            return None
+        self.current_status = f"{reason}, retry {self.reconnect.attempts} in {delay:.1f}s"
+        return delay
+
     @classmethod
     def __create_bastion_session_port_forward(cls, bastion_id, ip, name, port: int,
                                               ssh_path,
                                               ttl: int, shell, region: Optional[str]):
+        import oci
         public_key = get_public_key(ssh_path)
         sess_details = oci.bastion.models.CreateSessionDetails(bastion_id=bastion_id,
                                                                target_resource_details=oci.bastion.models.CreatePortForwardingSessionTargetResourceDetails(
@@ -558,14 +1243,11 @@ class Bastion:
                                                                display_name=name,
                                                                key_type="PUB",
                                                                session_ttl_in_seconds=ttl)
-        config = oci.config.from_file()
-        # Overriding region from user profile
-        if region:
-            config["region"] = region
 
         print("Creating Port Forward Session")
         if not cls.stopped:
-            req = oci.bastion.BastionClient(config).create_session(sess_details)
+            req = BastionClientRegistry.call("create_session", sess_details, region=region,
+                                             opc_retry_token=str(uuid.uuid4()))
             logging.debug(f"{req.data} Status: {req.status}")
         else:
             return None
@@ -577,6 +1259,7 @@ class Bastion:
                                              region: Optional[str]):
         if Bastion.stopped:
             return
+        import oci
         public_key = get_public_key(ssh_path)
         sess_details = oci.bastion.models.CreateSessionDetails(bastion_id=bastion_id,
                                                                target_resource_details=oci.bastion.models.CreateManagedSshSessionTargetResourceDetails(
@@ -588,12 +1271,9 @@ class Bastion:
                                                                display_name=name,
                                                                key_type="PUB",
                                                                session_ttl_in_seconds=ttl)
-        config = oci.config.from_file()
 
-        if region:
-            config["region"] = region
-
-        req = oci.bastion.BastionClient(config).create_session(sess_details)
+        req = BastionClientRegistry.call("create_session", sess_details, region=region,
+                                         opc_retry_token=str(uuid.uuid4()))
 
         print("Creating Managed SSH Session")
         logging.debug(f"{req.data} Status: {req.status}")
@@ -658,6 +1338,13 @@ class Bastion:
          LINUX)
         :return:
         """
+        if self.ssh_engine == "asyncssh" and self.forward_target:
+            forwarder = self.build_forwarder()
+            self.active_tunnel = forwarder
+            return ForwardingLoop.run(forwarder.run())
+        if self.control_master and self.forward_target:
+            return self.run_control_master_tunnel()
+
         args_split = self.process_args(already_split, shell, ssh_tunnel_arg_str)
         try:
             p = subprocess.Popen(args_split, stdout=subprocess.PIPE,
@@ -670,56 +1357,144 @@ class Bastion:
             return True
 
         self.active_tunnel = p
-        while p.poll() is None and self.tries >= 0:
+        if self.tunnel_readiness != "log" and self.forward_target:
+            Thread(name=f"ready-{self.get_print_name()}", target=self.watch_tunnel_ready,
+                   args=[p], daemon=True).start()
+        while p.poll() is None:
             line = p.stdout.readline().decode("utf-8").strip()
             line_err = None
 
             if p.stderr:
                 line_err = p.stderr.readline().decode("utf-8").strip()
 
-            if line:
-                logging.debug(f"({self.get_print_name()}) SSH stdout: {line}")
             if line_err:
-                logging.debug(f"({self.get_print_name()}) SSH stderr: {line_err}")
+                self.ssh_output.append(line_err)
+                logging.debug("(%s) SSH stderr: %s", self.get_print_name(), line_err)
 
-            if "Permission denied" in line:
-                self.connected = False
+            if not self.process_ssh_line(line):
                 return False
-            if "pledge:" in line:
-                self.print_succeeded()
-                self.connected = True
-                self.current_status = "connected"
-                self.tries = 10
 
             if not line and not line_err:
                 sleep(0.1)
 
         logging.debug(f"({self.get_print_name()}) Waiting for ssh tunnel to end")
         p.wait()
+        self.process_ssh_exit(p.returncode)
+        return True
+
+    def process_ssh_line(self, line: str) -> bool:
+        """
+        Updates tunnel state from line of ssh output
+        @return: False if ssh failed on authorization
+        """
+        if line:
+            self.ssh_output.append(line)
+            # Lazy formatting, this runs for every line of every tunnel
+            logging.debug("(%s) SSH stdout: %s", self.get_print_name(), line)
+
+        if "Permission denied" in line:
+            self.connected = False
+            self.dump_ssh_output("authorization failed")
+            return False
+        if "pledge:" in line and self.tunnel_readiness == "log":
+            self.mark_tunnel_ready()
+        return True
+
+    def mark_tunnel_ready(self, elapsed: Optional[float] = None):
+        """
+        Marks tunnel connected
+        @param elapsed: Seconds from tunnel start until it accepted connections
+        """
+        self.print_succeeded()
+        self.connected = True
+        self.current_status = "connected"
+        self.reconnect.connected()
+        if self.create_started is not None:
+            # Only first connection of session, reconnects are counted separately
+            Metrics.observe("abst_connect_seconds", self.get_print_name(),
+                            monotonic() - self.create_started)
+            self.create_started = None
+        if elapsed is not None:
+            self.phase_timings = {**self.phase_timings, "tunnel": elapsed}
+            self.lb.publish(self.context_name, {"timings": self.phase_timings})
+            logging.info(f"({self.get_print_name()}) Tunnel accepted connections after {elapsed}s")
+
+    def tunnel_waiter(self) -> SessionWaiter:
+        return SessionWaiter(initial_interval=0.05, max_interval=1,
+                             deadline=default_tunnel_ready_deadline)
+
+    def is_tunnel_ready(self) -> bool:
+        return probe_port("127.0.0.1", self.forward_target["local_port"],
+                          handshake=self.tunnel_readiness == "ssh-banner")
+
+    def watch_tunnel_ready(self, process):
+        """
+        Probes local port until tunnel accepts connections or process ends
+        """
+        waiter = self.tunnel_waiter()
+        waiter.wait_for("tunnel", lambda: process.poll() is not None or self.is_tunnel_ready())
+        if process.poll() is not None:
+            return
+        if self.is_tunnel_ready():
+            self.mark_tunnel_ready(waiter.phases["tunnel"])
+        else:
+            rich.print(f"({self.get_print_name()}) Local port {self.forward_target['local_port']} "
+                       f"does not accept connections after {waiter.deadline} seconds")
+            self.current_status = "tunnel not ready"
+
+    def process_ssh_exit(self, returncode: int):
+        """
+        Updates tunnel state after ssh process ended
+        """
         logging.debug(
             f"({self.get_print_name()}) SSH Tunnel Process ended with exit code "
-            f"{p.returncode}")
+            f"{returncode}")
 
-        if p.returncode == 255:
+        if returncode == 255 and not self.rotating.is_set():
+            dump_path = self.dump_ssh_output(f"ssh exited with {returncode}")
             rich.print(
                 f"({self.get_print_name()}) "
                 f"SSH Tunnel can not be initialized because of failed authorization")
+            rich.print(f"({self.get_print_name()}) Last ssh output saved to {dump_path}")
             rich.print(
                 f"({self.get_print_name()}) "
                 f"Please check you configuration, for more info use --debug flag")
-            if self.tries <= 0:
+            if self.reconnect.attempts >= 3:
                 rich.print(
                     "[red]If this continues to happen without connection it can be because ip changed in ["
                     "yellow]~/.ssh/known_hosts[/yellow], delete it and"
                     " try again[/red]")
-                self.kill()
-                self.current_status = "Failed"
-                exit(255)
-            else:
-                self.tries -= 1
-                self.current_status = f"failed {self.tries} left"
         self.connected = False
-        return True
+
+    @classmethod
+    def get_ssh_output_path(cls, context_name: Optional[str]) -> Path:
+        return default_ssh_logs_path / f"{context_name if context_name else 'default'}.log"
+
+    def dump_ssh_output(self, reason: str) -> Path:
+        """
+        Writes buffered ssh output of tunnel into ~/.abst/logs/<context>.log
+        @param reason: Why output was dumped, written to header
+        """
+        path = Bastion.get_ssh_output_path(self.context_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(f"# {self.get_print_name()} {reason} at {datetime.datetime.now().isoformat()}"
+                    f" status: {self.current_status}\n")
+            f.write(self.ssh_output.getvalue())
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def dump_all_ssh_outputs(cls, *_):
+        """
+        Signal handler dumping output of all tunnels in this process
+        """
+        for bastion in list(cls.live_bastions):
+            try:
+                bastion.dump_ssh_output("requested")
+            except OSError as ex:
+                logging.error(f"Failed to dump ssh output of {bastion.get_print_name()} {ex}")
 
     @run_once
     def print_succeeded(self):
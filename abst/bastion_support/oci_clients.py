@@ -0,0 +1,147 @@
+import logging
+import os
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional
+
+from abst.bastion_support.rate_limit import TokenBucket, ApiCallStats, backoff_delay, \
+    parse_retry_after
+from abst.config import default_oci_rate_limit, default_oci_rate_burst, \
+    default_oci_max_attempts, default_oci_backoff_base, default_oci_backoff_cap, \
+    default_oci_config_location, default_oci_profile
+
+
+class BastionClientRegistry:
+    """
+    Process wide registry of OCI Bastion clients
+
+    One client (and its connection pool and signer) is kept per (profile, region),
+    OCI config is parsed again only when the config file modification time changes.
+    Calls made by call() share token bucket per (tenancy, region) and are retried on
+    throttling with jittered exponential backoff
+    """
+    _lock = Lock()
+    _configs: dict = dict()
+    _clients: dict = dict()
+    _limiters: dict = dict()
+    config_location: str = default_oci_config_location
+    rate_limit: float = default_oci_rate_limit
+    rate_burst: float = default_oci_rate_burst
+    stats = ApiCallStats()
+    retry_statuses: tuple = (429, 500, 502, 503, 504)
+
+    @classmethod
+    def _config_mtime(cls) -> Optional[float]:
+        try:
+            return os.stat(os.path.expanduser(cls.config_location)).st_mtime
+        except OSError:
+            return None
+
+    @classmethod
+    def get_config(cls, region: Optional[str] = None,
+                   profile: str = default_oci_profile) -> dict:
+        """
+        Returns parsed OCI config for profile with region overridden if supplied,
+        parsed config is cached until config file changes
+        """
+        import oci
+        mtime = cls._config_mtime()
+        with cls._lock:
+            cached = cls._configs.get(profile, None)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, oci.config.from_file(cls.config_location, profile))
+                cls._configs[profile] = cached
+                # Clients built from old config are stale now
+                for key in [key for key in cls._clients.keys() if key[0] == profile]:
+                    cls._clients.pop(key)
+
+        config = dict(cached[1])
+        if region:
+            config["region"] = region
+        return config
+
+    @classmethod
+    def get_client(cls, region: Optional[str] = None,
+                   profile: str = default_oci_profile,
+                   timeout: Optional[tuple] = None):
+        """
+        Returns shared BastionClient for profile and region
+        @param timeout: Connect and read timeout, SDK defaults if None
+        """
+        import oci
+        config = cls.get_config(region, profile)
+        key = (profile, config.get("region", None), timeout)
+        with cls._lock:
+            client = cls._clients.get(key, None)
+            if client is None:
+                kwargs = {"timeout": timeout} if timeout else {}
+                # Retries are done by call() so throttling is counted and shared
+                client = oci.bastion.BastionClient(config,
+                                                   retry_strategy=oci.retry.NoneRetryStrategy(),
+                                                   **kwargs)
+                cls._clients[key] = client
+        return client
+
+    @classmethod
+    def configure_rate_limit(cls, rate: float, burst: float):
+        with cls._lock:
+            cls.rate_limit = rate
+            cls.rate_burst = burst
+            cls._limiters.clear()
+
+    @classmethod
+    def get_limiter(cls, config: dict) -> TokenBucket:
+        key = (config.get("tenancy", None), config.get("region", None))
+        with cls._lock:
+            limiter = cls._limiters.get(key, None)
+            if limiter is None:
+                limiter = TokenBucket(cls.rate_limit, cls.rate_burst)
+                cls._limiters[key] = limiter
+        return limiter
+
+    @classmethod
+    def call(cls, operation: str, *args, region: Optional[str] = None,
+             timeout: Optional[tuple] = None, deadline: Optional[float] = None,
+             max_attempts: int = default_oci_max_attempts, **kwargs):
+        """
+        Calls BastionClient operation through rate limiter, retries throttled and
+        transient failures honoring Retry-After
+        @param operation: Name of BastionClient method
+        @param region: Region override
+        @param timeout: Connect and read timeout of client
+        @param deadline: Monotonic time after which no more retries are done
+        @param max_attempts: Maximum number of attempts
+        """
+        from oci.exceptions import ServiceError
+        limiter = cls.get_limiter(cls.get_config(region))
+        attempt = 0
+        while True:
+            limiter.acquire()
+            cls.stats.record(operation, "calls")
+            try:
+                return getattr(cls.get_client(region, timeout=timeout), operation)(*args, **kwargs)
+            except ServiceError as ex:
+                if ex.status == 429:
+                    cls.stats.record(operation, "throttled")
+                if ex.status not in cls.retry_statuses or attempt + 1 >= max_attempts:
+                    cls.stats.record(operation, "errors")
+                    raise
+                delay = backoff_delay(attempt, default_oci_backoff_base, default_oci_backoff_cap,
+                                      parse_retry_after(ex.headers))
+                if deadline is not None and monotonic() + delay > deadline:
+                    cls.stats.record(operation, "errors")
+                    raise
+                logging.debug(f"OCI {operation} failed with {ex.status}, retrying in {delay:.2f}s")
+                cls.stats.record(operation, "retries")
+                attempt += 1
+                sleep(delay)
+            except Exception:
+                cls.stats.record(operation, "errors")
+                raise
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._configs.clear()
+            cls._clients.clear()
+            cls._limiters.clear()
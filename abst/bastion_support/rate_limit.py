@@ -0,0 +1,83 @@
+import random
+from collections import defaultdict
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, refills rate tokens per second up to capacity
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Takes tokens from bucket, bucket can go to debt
+        @return: Seconds caller has to wait before using reserved tokens
+        """
+        with self._lock:
+            self._refill(monotonic())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1):
+        if wait := self.reserve(tokens):
+            sleep(wait)
+
+
+class ApiCallStats:
+    """
+    Counters of API calls by operation
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters: dict = defaultdict(lambda: {"calls": 0, "throttled": 0, "retries": 0,
+                                                    "errors": 0})
+
+    def record(self, operation: str, counter: str):
+        with self._lock:
+            self._counters[operation][counter] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {operation: dict(counters) for operation, counters in self._counters.items()}
+
+    def total(self, counter: str) -> int:
+        with self._lock:
+            return sum(counters[counter] for counters in self._counters.values())
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with full jitter, Retry-After from server is used as lower bound
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(headers: Optional[dict]) -> Optional[float]:
+    if not headers:
+        return None
+    for key, value in headers.items():
+        if key.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
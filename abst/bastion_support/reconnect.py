@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import logging
+import random
+import socket
+import weakref
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import monotonic, sleep, time
+from typing import Callable, Optional
+
+from abst.config import default_reconnect_initial_delay, default_reconnect_max_delay, \
+    default_reconnect_backoff_factor, default_reconnect_max_attempts, \
+    default_network_watch_interval, default_resume_jump_threshold
+
+
+class Reconnector:
+    """
+    Reconnect state machine of single tunnel
+
+    idle -> connecting -> connected -> backoff -> connecting ... -> failed
+    Delays between attempts grow exponentially with jitter up to max delay, network
+    change ends backoff immediately and starts counting from the beginning
+    """
+    IDLE = "idle"
+    CONNECTING = "connecting"
+    CONNECTED = "connected"
+    BACKOFF = "backoff"
+    FAILED = "failed"
+
+    def __init__(self, initial_delay: float = default_reconnect_initial_delay,
+                 max_delay: float = default_reconnect_max_delay,
+                 backoff_factor: float = default_reconnect_backoff_factor,
+                 max_attempts: int = default_reconnect_max_attempts):
+        """
+        @param initial_delay: Seconds before first reconnect
+        @param max_delay: Cap of delay in seconds
+        @param backoff_factor: Multiplier of delay after every failed attempt
+        @param max_attempts: Failed attempts in row before giving up, 0 never gives up
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff_factor = backoff_factor
+        self.max_attempts = max_attempts
+        self.state = self.IDLE
+        self.attempts = 0
+        self.reconnects = 0
+        self.last_error: Optional[str] = None
+        self.connected_since: Optional[float] = None
+        self._wake = Event()
+        self._network_changed = False
+        self._lock = Lock()
+
+    def configure(self, get_setting: Callable):
+        """
+        @param get_setting: Callable(key, default) resolving setting value
+        """
+        self.initial_delay = float(get_setting("reconnect-initial-delay", default_reconnect_initial_delay))
+        self.max_delay = float(get_setting("reconnect-max-delay", default_reconnect_max_delay))
+        self.max_attempts = int(get_setting("reconnect-max-attempts", default_reconnect_max_attempts))
+
+    def connecting(self):
+        with self._lock:
+            if self.state != self.FAILED:
+                self.state = self.CONNECTING
+            self.connected_since = None
+
+    def connected(self):
+        with self._lock:
+            self.state = self.CONNECTED
+            self.attempts = 0
+            self.connected_since = monotonic()
+
+    @property
+    def uptime(self) -> Optional[float]:
+        """
+        Seconds since tunnel connected, None if it is not connected
+        """
+        since = self.connected_since
+        return None if since is None else monotonic() - since
+
+    def failed(self, reason: str) -> Optional[float]:
+        """
+        Records failed or ended attempt
+        @return: Seconds to wait before next attempt, None if reconnecting was given up
+        """
+        with self._lock:
+            self.last_error = reason
+            self.connected_since = None
+            if self.state == self.FAILED:
+                return None
+            if self._network_changed:
+                # Old failures are most likely caused by network that is gone now
+                self._network_changed = False
+                self.attempts = 0
+            self.attempts += 1
+            if self.max_attempts and self.attempts > self.max_attempts:
+                self.state = self.FAILED
+                return None
+            self.state = self.BACKOFF
+            self.reconnects += 1
+            self._wake.clear()
+            return self.delay(self.attempts)
+
+    def delay(self, attempt: int) -> float:
+        base = min(self.initial_delay * self.backoff_factor ** (attempt - 1), self.max_delay)
+        # Equal jitter, tunnels failing together do not reconnect together
+        return base / 2 + random.uniform(0, base / 2)
+
+    def give_up(self, reason: str):
+        with self._lock:
+            self.last_error = reason
+            self.connected_since = None
+            self.state = self.FAILED
+        self._wake.set()
+
+    @property
+    def gave_up(self) -> bool:
+        return self.state == self.FAILED
+
+    def network_changed(self, reason: str):
+        with self._lock:
+            self._network_changed = True
+            if self.state == self.BACKOFF:
+                self.attempts = 0
+        logging.debug(f"Network changed ({reason}), reconnect state {self.state}")
+        self._wake.set()
+
+    def wait(self, delay: float) -> bool:
+        """
+        Sleeps till next attempt
+        @return: True if woken up early by network change
+        """
+        return self._wake.wait(delay)
+
+    async def wait_async(self, delay: float, check_interval: float = 0.1) -> bool:
+        """
+        Same as wait but for event loop
+        """
+        deadline = monotonic() + delay
+        while (remaining := deadline - monotonic()) > 0:
+            if self._wake.is_set():
+                return True
+            await asyncio.sleep(min(remaining, check_interval))
+        return self._wake.is_set()
+
+
+class NetworkWatcher:
+    """
+    Watches for interface and route changes and for resume from suspend,
+    subscribers are notified from background thread
+    """
+    interval: float = default_network_watch_interval
+    resume_threshold: float = default_resume_jump_threshold
+    _lock = Lock()
+    _subscribers: dict = dict()
+    _thread: Optional[Thread] = None
+
+    @classmethod
+    def subscribe(cls, callback: Callable[[str], None]):
+        """
+        @param callback: Bound method called with reason of change, only weakly referenced
+        """
+        with cls._lock:
+            cls._subscribers[(id(callback.__self__), callback.__func__)] = \
+                weakref.WeakMethod(callback)
+            if cls._thread is None:
+                cls._thread = Thread(name="network-watcher", target=cls.run, daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    def notify(cls, reason: str):
+        with cls._lock:
+            items = list(cls._subscribers.items())
+        for key, ref in items:
+            callback = ref()
+            if callback is None:
+                with cls._lock:
+                    cls._subscribers.pop(key, None)
+                continue
+            try:
+                callback(reason)
+            except Exception as ex:
+                logging.debug(f"Network change subscriber failed {ex}")
+
+    @classmethod
+    def signature(cls) -> str:
+        """
+        Digest of network state, interfaces, routing table and source address of default route
+        """
+        parts = []
+        try:
+            parts.append(repr(sorted(socket.if_nameindex())))
+        except (AttributeError, OSError):
+            pass
+        route_table = Path("/proc/net/route")
+        try:
+            parts.append(route_table.read_text())
+        except OSError:
+            pass
+        try:
+            # Connecting UDP socket sends nothing, it only resolves route
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.connect(("192.0.2.1", 9))
+                parts.append(sock.getsockname()[0])
+        except OSError:
+            parts.append("unreachable")
+        return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+    @classmethod
+    def run(cls):
+        signature = cls.signature()
+        last_wall, last_mono = time(), monotonic()
+        while True:
+            sleep(cls.interval)
+            wall, mono = time(), monotonic()
+            # Monotonic clock does not advance while machine sleeps, wall clock does
+            jump = (wall - last_wall) - (mono - last_mono)
+            last_wall, last_mono = wall, mono
+            if jump > cls.resume_threshold:
+                signature = cls.signature()
+                cls.notify(f"resumed after {jump:.0f}s")
+                continue
+            current = cls.signature()
+            if current != signature:
+                signature = current
+                cls.notify("interfaces or routes changed")
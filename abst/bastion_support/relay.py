@@ -0,0 +1,193 @@
+import logging
+import os
+import socket
+from threading import Lock, Event, Thread
+from typing import Callable, Optional
+
+from abst.bastion_support.rate_limit import TokenBucket
+from abst.config import default_relay_chunk, default_relay_publish_interval, \
+    default_tunnel_probe_timeout
+
+
+class RelayStats:
+    """
+    Traffic counters of single tunnel
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counters = {"bytes_sent": 0, "bytes_received": 0, "connections": 0,
+                          "active_connections": 0}
+
+    def add(self, counter: str, value: int = 1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+class TunnelRelay:
+    """
+    Listens on local port of context and relays connections to port held by ssh -L,
+    counts traffic and caps bandwidth of tunnel
+
+    On Linux data is moved by splice through pipe, so relayed bytes are not copied
+    to user space
+    """
+
+    def __init__(self, listen_port: int, bandwidth_limit: float = 0,
+                 upstream_port: Optional[int] = None,
+                 on_stats: Optional[Callable[[dict], None]] = None):
+        """
+        @param listen_port: Port clients connect to
+        @param bandwidth_limit: Bytes per second of both directions together, 0 is unlimited
+        @param upstream_port: Port of tunnel, free port is picked if None
+        @param on_stats: Called with stats snapshot when they change
+        """
+        self.listen_port = int(listen_port)
+        self.upstream_port = upstream_port or self.pick_free_port()
+        self.bucket = TokenBucket(bandwidth_limit, bandwidth_limit) if bandwidth_limit > 0 else None
+        self.on_stats = on_stats
+        self.stats = RelayStats()
+        self.use_splice = self.can_splice()
+        self._servers: list = []
+        self._stop = Event()
+
+    @classmethod
+    def can_splice(cls) -> bool:
+        return hasattr(os, "splice")
+
+    @classmethod
+    def pick_free_port(cls) -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def listen(self, family: int, address: str) -> Optional[socket.socket]:
+        server = socket.socket(family)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            if family == socket.AF_INET6:
+                server.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+            server.bind((address, self.listen_port))
+            server.listen()
+        except OSError as ex:
+            server.close()
+            logging.debug(f"Relay can not listen on {address} {self.listen_port} {ex}")
+            return None
+        return server
+
+    def start(self) -> bool:
+        """
+        Listens on both loopback addresses like ssh -L on localhost, IPv6 one is optional
+        @return: False if local port could not be bound
+        """
+        server = self.listen(socket.AF_INET, "127.0.0.1")
+        if server is None:
+            logging.error(f"Relay can not listen on {self.listen_port}")
+            return False
+        self._servers = [server]
+        if socket.has_ipv6 and (server := self.listen(socket.AF_INET6, "::1")) is not None:
+            self._servers.append(server)
+        for server in self._servers:
+            Thread(name=f"relay-{self.listen_port}", target=self.serve, args=[server],
+                   daemon=True).start()
+        if self.on_stats:
+            Thread(name=f"relay-stats-{self.listen_port}", target=self.publish, daemon=True).start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        for server in self._servers:
+            # Close alone does not wake up accept, listener would stay open until next client
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+
+    def serve(self, server: socket.socket):
+        while not self._stop.is_set():
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            Thread(name=f"relay-{self.listen_port}-conn", target=self.handle, args=[client],
+                   daemon=True).start()
+
+    def handle(self, client: socket.socket):
+        try:
+            upstream = socket.create_connection(("127.0.0.1", self.upstream_port),
+                                                timeout=default_tunnel_probe_timeout)
+        except OSError as ex:
+            logging.debug(f"Relay {self.listen_port} tunnel not reachable {ex}")
+            client.close()
+            return
+        upstream.settimeout(None)
+        self.stats.add("connections")
+        self.stats.add("active_connections")
+        try:
+            sending = Thread(name=f"relay-{self.listen_port}-send", target=self.pump,
+                             args=[client, upstream, "bytes_sent"], daemon=True)
+            sending.start()
+            self.pump(upstream, client, "bytes_received")
+            sending.join()
+        finally:
+            self.stats.add("active_connections", -1)
+            client.close()
+            upstream.close()
+
+    def pump(self, src: socket.socket, dst: socket.socket, counter: str):
+        """
+        Moves data from src to dst until src is closed, half close is passed to dst
+        """
+        try:
+            if self.use_splice:
+                self.splice(src, dst, counter)
+            else:
+                self.copy(src, dst, counter)
+            dst.shutdown(socket.SHUT_WR)
+        except OSError as ex:
+            logging.debug(f"Relay {self.listen_port} connection ended {ex}")
+            # Wakes up pump of other direction
+            for sock in (src, dst):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def splice(self, src: socket.socket, dst: socket.socket, counter: str):
+        read_fd, write_fd = os.pipe()
+        try:
+            while read := os.splice(src.fileno(), write_fd, default_relay_chunk):
+                self.throttle(read)
+                while read:
+                    written = os.splice(read_fd, dst.fileno(), read)
+                    read -= written
+                    self.stats.add(counter, written)
+        finally:
+            os.close(read_fd)
+            os.close(write_fd)
+
+    def copy(self, src: socket.socket, dst: socket.socket, counter: str):
+        while data := src.recv(default_relay_chunk):
+            self.throttle(len(data))
+            dst.sendall(data)
+            self.stats.add(counter, len(data))
+
+    def throttle(self, size: int):
+        if self.bucket:
+            self.bucket.acquire(size)
+
+    def publish(self):
+        last = None
+        while not self._stop.wait(default_relay_publish_interval):
+            snapshot = self.stats.snapshot()
+            if snapshot != last:
+                last = snapshot
+                try:
+                    self.on_stats(snapshot)
+                except Exception as ex:
+                    logging.debug(f"Relay {self.listen_port} failed to publish stats {ex}")
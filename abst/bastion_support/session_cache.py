@@ -0,0 +1,56 @@
+import json
+import logging
+from json import JSONDecodeError
+from pathlib import Path
+from threading import Lock
+from typing import Optional
+
+from abst.config import default_session_cache_path
+
+
+class SessionCache:
+    """
+    On-disk map of context config path to last used bastion session id
+    """
+    _lock = Lock()
+    path: Path = default_session_cache_path
+
+    @classmethod
+    def _load(cls) -> dict:
+        try:
+            with open(cls.path, "r") as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, JSONDecodeError):
+            return {}
+
+    @classmethod
+    def _write(cls, data: dict):
+        cls.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cls.path, "w") as f:
+            json.dump(data, f, indent=4)
+
+    @classmethod
+    def get(cls, context_key: str) -> Optional[str]:
+        with cls._lock:
+            return cls._load().get(context_key, None)
+
+    @classmethod
+    def put(cls, context_key: str, session_id: str):
+        with cls._lock:
+            data = cls._load()
+            data[context_key] = session_id
+            cls._write(data)
+        logging.debug(f"Cached session {session_id} for {context_key}")
+
+    @classmethod
+    def remove(cls, context_key: str, session_id: Optional[str] = None):
+        """
+        Removes cached session, if session_id is supplied only matching entry is removed
+        """
+        with cls._lock:
+            data = cls._load()
+            if context_key not in data.keys() or (session_id and data[context_key] != session_id):
+                return
+            data.pop(context_key)
+            cls._write(data)
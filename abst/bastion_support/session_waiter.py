@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from time import monotonic, sleep
+from typing import Awaitable, Callable, Iterator, Optional
+
+from abst.config import default_wait_initial_interval, default_wait_backoff_factor, \
+    default_wait_max_interval, default_wait_deadline
+
+
+class SessionWaiter:
+    """
+    Waits for bastion session readiness with backoff curve and overall deadline
+
+    Polls are fast at the beginning and slow down by backoff factor up to max interval,
+    duration of every phase is recorded in phases
+    """
+
+    def __init__(self, initial_interval: float = default_wait_initial_interval,
+                 backoff_factor: float = default_wait_backoff_factor,
+                 max_interval: float = default_wait_max_interval,
+                 deadline: float = default_wait_deadline):
+        self.initial_interval = initial_interval
+        self.backoff_factor = backoff_factor
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self.phases: dict = dict()
+        self._started = monotonic()
+
+    @classmethod
+    def from_settings(cls, get_setting: Callable) -> "SessionWaiter":
+        """
+        Creates waiter from context settings
+        @param get_setting: Callable(key, default) resolving setting value
+        """
+        return cls(float(get_setting("wait-initial-interval", default_wait_initial_interval)),
+                   float(get_setting("wait-backoff-factor", default_wait_backoff_factor)),
+                   float(get_setting("wait-max-interval", default_wait_max_interval)),
+                   float(get_setting("wait-deadline", default_wait_deadline)))
+
+    def intervals(self) -> Iterator[float]:
+        interval = self.initial_interval
+        while True:
+            yield interval
+            interval = min(interval * self.backoff_factor, self.max_interval)
+
+    def remaining(self) -> float:
+        return self.deadline - (monotonic() - self._started)
+
+    def wait_for(self, phase: str, predicate: Callable[[], Optional[bool]]) -> bool:
+        """
+        Polls predicate until it returns True or deadline is reached
+        @param phase: Name of the phase used in phases timings
+        @param predicate: Callable returning True once phase is done
+        @return: True if phase finished before deadline
+        """
+        phase_start = monotonic()
+        intervals = self.intervals()
+        try:
+            while True:
+                if predicate():
+                    return True
+                remaining = self.remaining()
+                if remaining <= 0:
+                    logging.info(f"Phase '{phase}' did not finish before deadline {self.deadline}s")
+                    return False
+                sleep(min(next(intervals), remaining))
+        finally:
+            self.phases[phase] = round(monotonic() - phase_start, 3)
+
+    async def wait_for_async(self, phase: str, predicate: Callable[[], Awaitable[Optional[bool]]]) -> bool:
+        """
+        Same as wait_for but for event loop, predicate is coroutine function
+        """
+        phase_start = monotonic()
+        intervals = self.intervals()
+        try:
+            while True:
+                if await predicate():
+                    return True
+                remaining = self.remaining()
+                if remaining <= 0:
+                    logging.info(f"Phase '{phase}' did not finish before deadline {self.deadline}s")
+                    return False
+                await asyncio.sleep(min(next(intervals), remaining))
+        finally:
+            self.phases[phase] = round(monotonic() - phase_start, 3)
+
+    def total(self) -> float:
+        return round(sum(self.phases.values()), 3)
@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import os
+from collections import deque
+from pathlib import Path
+from threading import Condition, Thread
+from time import monotonic, time
+from typing import Iterator, Optional
+
+from abst.config import default_spans_path, default_spans_max_size, default_spans_flush_timeout
+from abst.utils.stats import percentile
+
+
+class SpanRecorder:
+    """
+    Records how long context spent in every lifecycle phase, spans are appended
+    as JSON lines when phase changes
+
+    Phase changes happen on event loop too, so spans are only queued there and
+    background thread writes them to file
+    """
+    path: Path = default_spans_path
+    max_size: int = default_spans_max_size
+    _pending: deque = deque()
+    _writing = False
+    _condition = Condition()
+    _writer: Optional[Thread] = None
+
+    def __init__(self, context: str):
+        self.context = context
+        self.phase: Optional[str] = None
+        self._started_wall = 0.0
+        self._started = 0.0
+
+    @classmethod
+    def phase_name(cls, status: str) -> str:
+        # Details after comma change during phase, e.g. reconnect countdown
+        return status.split(",")[0].strip().lower()
+
+    def transition(self, status: Optional[str]):
+        """
+        Ends span of current phase if status starts different phase
+        @param status: New status of context, None ends current phase
+        """
+        phase = None if status is None else self.phase_name(status)
+        if phase == self.phase:
+            return
+        now = monotonic()
+        if self.phase is not None:
+            self.write({"context": self.context, "phase": self.phase,
+                        "start": round(self._started_wall, 3),
+                        "duration": round(now - self._started, 3), "next": phase,
+                        "pid": os.getpid()})
+        self.phase = phase
+        self._started, self._started_wall = now, time()
+
+    @classmethod
+    def write(cls, record: dict):
+        """
+        Queues span for writing, does not block on file
+        """
+        with cls._condition:
+            cls._pending.append(json.dumps(record) + "\n")
+            if cls._writer is None:
+                cls._writer = Thread(name="span-writer", target=cls._write_loop, daemon=True)
+                cls._writer.start()
+                atexit.register(cls.flush)
+            cls._condition.notify_all()
+
+    @classmethod
+    def flush(cls, timeout: float = default_spans_flush_timeout) -> bool:
+        """
+        Waits until queued spans are written
+        @return: False if timeout passed first
+        """
+        with cls._condition:
+            return cls._condition.wait_for(lambda: not cls._pending and not cls._writing, timeout)
+
+    @classmethod
+    def _write_loop(cls):
+        while True:
+            with cls._condition:
+                cls._condition.wait_for(lambda: cls._pending)
+                lines = "".join(cls._pending)
+                cls._pending.clear()
+                cls._writing = True
+            try:
+                cls._append(lines)
+            finally:
+                with cls._condition:
+                    cls._writing = False
+                    cls._condition.notify_all()
+
+    @classmethod
+    def _append(cls, lines: str):
+        try:
+            cls.path.parent.mkdir(parents=True, exist_ok=True)
+            if cls.path.exists() and cls.path.stat().st_size > cls.max_size:
+                os.replace(cls.path, cls.path.with_name(cls.path.name + ".1"))
+            # Single write of short lines in append mode is not interleaved with other processes
+            with cls.path.open("a", encoding="utf-8") as file:
+                file.write(lines)
+        except OSError as ex:
+            logging.debug(f"Failed to write span {ex}")
+
+    @classmethod
+    def read(cls, path: Optional[Path] = None) -> Iterator[dict]:
+        """
+        Reads spans, rotated file first
+        """
+        path = path or cls.path
+        for file_path in (path.with_name(path.name + ".1"), path):
+            if not file_path.exists():
+                continue
+            with file_path.open("r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # Line cut by crash
+                        continue
+
+    @classmethod
+    def summarize(cls, spans, context: Optional[str] = None) -> dict:
+        """
+        @return: Phase -> count, p50, p95 and max of durations, phases in order of appearance
+        """
+        durations: dict = dict()
+        for span in spans:
+            if context is not None and span.get("context") != context:
+                continue
+            durations.setdefault(span["phase"], []).append(span["duration"])
+        return {phase: {"count": len(values), "p50": percentile(values, 50),
+                        "p95": percentile(values, 95), "max": max(values)}
+                for phase, values in durations.items()}
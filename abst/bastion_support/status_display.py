@@ -0,0 +1,102 @@
+from typing import Callable, Optional
+
+from rich.align import Align
+from rich.console import Console
+from rich.live import Live
+from rich.table import Table
+
+
+def format_uptime(seconds: Optional[float]) -> str:
+    """
+    Uptime in coarse units, so rows do not change every second
+    """
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 60 * 60:
+        return f"{seconds // 60}m"
+    if seconds < 24 * 60 * 60:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 86400}d{seconds % 86400 // 3600:02d}h"
+
+
+class StatusDisplay:
+    """
+    Status table of parallel run, rows are built from state of bastions in memory and
+    table is redrawn only when some row changed
+    """
+    columns = (("Name", "left", "cyan"), ("Local Port", "left", "magenta"),
+               ("Active", "right", "green"), ("Status", "right", "green"),
+               ("Uptime", "right", "green"), ("Reconnects", "right", "yellow"),
+               ("Probe p50/p95", "right", "blue"), ("Probes failed", "right", "red"),
+               ("Last error", "left", "red"))
+    max_error_length = 60
+
+    def __init__(self, get_bastions: Callable[[], list], console: Optional[Console] = None):
+        """
+        @param get_bastions: Callable returning bastions of scheduler
+        """
+        self.get_bastions = get_bastions
+        self.console = console or Console()
+        self._ports: dict = dict()
+        self._last: Optional[tuple] = None
+        self._live: Optional[Live] = None
+
+    def local_port(self, bastion) -> str:
+        # Context config is read once per bastion, not on every redraw
+        if bastion not in self._ports:
+            self._ports[bastion] = str(bastion.load_self_creds().get("local-port", "Not Specified"))
+        return self._ports[bastion]
+
+    def row(self, bastion) -> tuple:
+        tunnel = bastion.active_tunnel
+        # active_tunnel is placeholder without poll until first tunnel is started
+        active = bastion.connected and hasattr(tunnel, "poll") and tunnel.poll() is None and \
+            bastion.health.consecutive_failures == 0
+        return (bastion.get_print_name(), self.local_port(bastion), str(active),
+                str(bastion.current_status), format_uptime(bastion.reconnect.uptime if active else None),
+                str(bastion.reconnect.reconnects), bastion.health.summary(),
+                f"{bastion.health.failures}/{bastion.health.probes}",
+                (bastion.reconnect.last_error or "")[:self.max_error_length])
+
+    def snapshot(self) -> tuple:
+        from abst.bastion_support.oci_clients import BastionClientRegistry
+        stats = BastionClientRegistry.stats
+        caption = f"OCI calls {stats.total('calls')} | throttled {stats.total('throttled')} | " \
+                  f"errors {stats.total('errors')}"
+        return caption, tuple(sorted(self.row(bastion) for bastion in list(self.get_bastions())))
+
+    def render(self, snapshot: tuple) -> Align:
+        caption, rows = snapshot
+        table = Table(title="Bastion Sessions", highlight=True, caption=caption)
+        for name, justify, style in self.columns:
+            table.add_column(name, justify=justify, style=style, no_wrap=True)
+        for row in rows:
+            table.add_row(*row)
+        return Align.center(table)
+
+    def refresh(self) -> bool:
+        """
+        Redraws table if something changed since last redraw
+        @return: True if table was redrawn
+        """
+        snapshot = self.snapshot()
+        if snapshot == self._last:
+            return False
+        self._last = snapshot
+        if self._live is not None:
+            self._live.update(self.render(snapshot), refresh=True)
+        return True
+
+    def start(self):
+        self._live = Live(console=self.console, auto_refresh=False)
+        self._live.start()
+        self._last = None
+        self.refresh()
+
+    def stop(self):
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
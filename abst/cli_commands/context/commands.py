@@ -4,13 +4,10 @@ from json import JSONDecodeError
 from pathlib import Path
 
 import click
-import pyperclip
 import rich
-from InquirerPy import inquirer
 from rich.tree import Tree
 
 from abst.bastion_support.oci_bastion import Bastion
-from abst.cfg_func import __upgrade
 from abst.config import default_contexts_location, share_excluded_keys
 from abst.tools import get_context_path
 from abst.utils.misc_funcs import get_context_data, setup_calls, get_context_set_data
@@ -63,6 +60,7 @@ def display(name, debug=False):
 @click.option("--raw", is_flag=True, default=False)
 @click.argument("name")
 def share(name: str, debug=False, raw=False):
+    import pyperclip
     setup_calls(debug)
 
     if "/" in name:
@@ -88,6 +86,8 @@ def share(name: str, debug=False, raw=False):
 @click.option("--debug", is_flag=True, default=False)
 @click.argument("name")
 def paste(name, debug=False):
+    import pyperclip
+    from InquirerPy import inquirer
     setup_calls(debug)
 
     data = pyperclip.paste()
@@ -142,6 +142,7 @@ def generate(debug, context_name):
 @click.option("--debug", is_flag=True, default=False)
 @click.argument("context-name", default=None, required=False)
 def fill(debug, context_name):
+    from InquirerPy import inquirer
     setup_calls(debug)
 
     path = get_context_path(context_name)
@@ -201,6 +202,7 @@ def locate(debug, context_name):
 @click.option("--all", is_flag=True, default=False)
 @click.argument("context-name", default=None, required=False)
 def upgrade(debug, context_name, all):
+    from abst.cfg_func import __upgrade
     setup_calls(debug)
 
     path = get_context_path(context_name)
@@ -23,8 +23,10 @@ def _do():
 )
 @click.option("--shell", is_flag=True, default=False)
 @click.option("--debug", is_flag=True, default=False)
+@click.option("--reuse", is_flag=True, default=False,
+              help="Will reuse matching active session and keep it alive on exit")
 @click.argument("context-name", default=None, required=False)
-def forward(shell, debug, context_name):
+def forward(shell, debug, reuse, context_name):
     """Creates and connects to bastion sessions
     automatically until terminated"""
 
@@ -42,12 +44,13 @@ def forward(shell, debug, context_name):
 
     bastion = None
     try:
-        while True:
-            creds = Bastion.get_creds_path_resolve(context_name)
-            bastion = Bastion(used_name, region=Bastion.load_json(creds).get("region", None))
-            link_bastion_signals(bastion)
+        creds = Bastion.get_creds_path_resolve(context_name)
+        bastion = Bastion(used_name, region=Bastion.load_json(creds).get("region", None),
+                          reuse_session=reuse)
+        link_bastion_signals(bastion)
+        # Same bastion keeps reconnect backoff state between sessions
+        while not bastion.reconnect.gave_up and not Bastion.stopped:
             bastion.create_forward_loop(shell=shell)
-            sleep(0.1)
     except FileNotFoundError:
         rich.print("[red]No such context found[/red]")
     except KeyboardInterrupt:
@@ -1,6 +1,5 @@
 import click
 import rich
-from InquirerPy import inquirer
 from rich.tree import Tree
 
 from abst.bastion_support.bastion_scheduler import BastionScheduler
@@ -112,8 +111,15 @@ def remove(debug, context_name):
 @click.option("-y", is_flag=True, default=False, help="Automatically confirm")
 @click.option("-f", "--force", is_flag=True, default=False,
               help="Will force connections ignoring security policies")
+@click.option("--reuse", is_flag=True, default=False,
+              help="Will reuse matching active sessions and keep them alive on exit")
+@click.option("--threads", is_flag=True, default=False,
+              help="Will use thread per context scheduler instead of asyncio")
+@click.option("--metrics-port", default=None, type=int,
+              help="Will serve OpenMetrics on http://127.0.0.1:<port>/metrics")
 @click.argument("set_name", default=None, required=False, type=str)
-def run(debug, y, force, set_name=None):
+def run(debug, y, force, reuse, threads, metrics_port, set_name=None):
+    from InquirerPy import inquirer
     setup_calls(debug)
     if force:
         rich.print(
@@ -136,7 +142,7 @@ def run(debug, y, force, set_name=None):
         if not confirm:
             rich.print("[green]Cancelling, nothing started[/green]")
             exit(0)
-    BastionScheduler.run(force, set_dir)
+    BastionScheduler.run(force, set_dir, reuse, threads, metrics_port)
 
 
 def get_set_dir(set_name):
@@ -162,9 +168,47 @@ def display(debug, set_name):
     display_scheduled(set_dir)
 
 
+@parallel.command("logs", help="Dump recent ssh output of running context")
+@click.option("--debug", is_flag=True, default=False)
+@click.option("-t", "--timeout", default=3.0, show_default=True,
+              help="Seconds to wait for running abst to write output")
+@click.argument("context-name", default="default")
+def logs(debug, timeout, context_name):
+    import os
+    import signal
+    from time import monotonic, sleep
+    from abst.config import broadcast_shm_name
+    from abst.sharing.local_broadcast import LocalBroadcast
+    setup_calls(debug)
+
+    name = None if context_name == "default" else context_name
+    path = Bastion.get_ssh_output_path(name)
+    before = path.stat().st_mtime if path.exists() else None
+    pid = LocalBroadcast(broadcast_shm_name).retrieve_json(name).get("pid", None)
+
+    dumped = False
+    if pid and hasattr(signal, "SIGUSR1"):
+        try:
+            os.kill(pid, signal.SIGUSR1)
+            deadline = monotonic() + timeout
+            while monotonic() < deadline and not dumped:
+                dumped = path.exists() and path.stat().st_mtime != before
+                sleep(0.05)
+        except ProcessLookupError:
+            rich.print(f"[yellow]abst running {context_name} is not alive anymore[/yellow]")
+
+    if not path.exists():
+        rich.print(f"[yellow]No ssh output of {context_name} available[/yellow]")
+        return
+    if not dumped:
+        rich.print(f"[yellow]Showing last saved output from {path}[/yellow]")
+    click.echo(path.read_text())
+
+
 pl.add_command(add)
 pl.add_command(create)
 pl.add_command(_list, name="list")
 pl.add_command(remove)
 pl.add_command(run)
 pl.add_command(display)
+pl.add_command(logs)
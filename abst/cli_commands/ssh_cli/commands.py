@@ -1,8 +1,8 @@
 import click
 import rich
-from InquirerPy import inquirer
 
-from abst.cli_commands.ssh_cli.utils import filter_keys_by_substring, filter_keys_by_port, do_ssh
+from abst.cli_commands.ssh_cli.utils import filter_keys_by_substring, filter_keys_by_port, do_ssh, \
+    find_connected
 from abst.config import broadcast_shm_name
 from abst.sharing.local_broadcast import LocalBroadcast
 from abst.utils.misc_funcs import setup_calls
@@ -11,11 +11,27 @@ from abst.utils.misc_funcs import setup_calls
 @click.command("ssh", help="Will SSH into pod with containing string name")
 @click.argument("port", required=False, default=None)
 @click.option("-n", "--name", default=None, help="Name of context running, it can be just part of the name")
+@click.option("-w", "--wait", is_flag=True, default=False,
+              help="Wait until context matching name or port is connected")
+@click.option("--timeout", type=float, default=None, help="Seconds to wait, forever if not set")
 @click.option("--debug", is_flag=True, default=False)
-def ssh_lin(port, name, debug):
+def ssh_lin(port, name, wait, timeout, debug):
     setup_calls(debug)
 
     lb = LocalBroadcast(broadcast_shm_name)
+    if wait:
+        if not name and port is None:
+            rich.print("[red]Waiting requires name or port of context[/red]")
+            return
+        rich.print(f"[yellow]Waiting for {name or port} to connect[/yellow]")
+        if not lb.wait_for(lambda contents: len(find_connected(contents, name, port)) == 1, timeout):
+            rich.print(f"[red]{name or port} did not connect in {timeout}s[/red]")
+            return
+        data = lb.list_contents()
+        key = find_connected(data, name, port)[0]
+        do_ssh(key, data[key]["username"], data[key]["port"])
+        return
+
     data = lb.list_contents()
 
     if len(data.keys()) == 0:
@@ -44,6 +60,7 @@ def ssh_lin(port, name, debug):
         key, data
         in data.items()]
 
+    from InquirerPy import inquirer
     context_name, context = inquirer.select("Select context to ssh to:", questions).execute()
 
     if "username" not in context:
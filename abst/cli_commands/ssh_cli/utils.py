@@ -16,6 +16,16 @@ def filter_keys_by_port(data: dict, port: int):
     return [key for key, data in data.items() if port in str(data.get('port', None))]
 
 
+def find_connected(data: dict, name=None, port=None) -> list:
+    """Keys of contexts matching name or port whose tunnel is connected and which have ssh details"""
+    if name:
+        keys = filter_keys_by_substring(data, name)
+    else:
+        keys = filter_keys_by_port(data, port)
+    return [key for key in keys if data[key].get("status", None) == "connected"
+            and len({"username", "port"} - set(data[key].keys())) == 0]
+
+
 def do_ssh(context_name: str, username, port):
     rich.print(f"[green]Running SSH to {context_name}[/green] "
                f"[yellow]{username}@localhost:{port}[/yellow]")
@@ -0,0 +1,35 @@
+import json
+
+import click
+import rich
+from rich.table import Table
+
+from abst.bastion_support.spans import SpanRecorder
+from abst.utils.misc_funcs import setup_calls
+
+
+@click.command("stats", help="Shows how long lifecycle phases of sessions take across runs")
+@click.option("-c", "--context", "context_name", default=None, help="Only spans of this context")
+@click.option("--json", "as_json", is_flag=True, default=False, help="Print raw summary as JSON")
+@click.option("--debug", is_flag=True, default=False)
+def stats(context_name, as_json, debug):
+    setup_calls(debug)
+    summary = SpanRecorder.summarize(SpanRecorder.read(), context_name)
+
+    if as_json:
+        click.echo(json.dumps(summary, indent=4))
+        return
+    if not summary:
+        rich.print(f"[yellow]No spans recorded yet in {SpanRecorder.path}[/yellow]")
+        return
+
+    table = Table(title=f"Phase durations{f' of {context_name}' if context_name else ''} in seconds")
+    table.add_column("Phase", justify="left", style="cyan", no_wrap=True)
+    table.add_column("Count", justify="right")
+    table.add_column("p50", justify="right", style="green")
+    table.add_column("p95", justify="right", style="yellow")
+    table.add_column("Max", justify="right", style="red")
+    for phase, values in summary.items():
+        table.add_row(phase, str(values["count"]), f"{values['p50']:.3f}", f"{values['p95']:.3f}",
+                      f"{values['max']:.3f}")
+    rich.print(table)
@@ -7,6 +7,12 @@ default_conf_path: Path = (Path().home().resolve() / ".abst" / "config.json")
 default_creds_path: Path = (Path().home().resolve() / ".abst" / "creds.json")
 default_contexts_location: Path = (Path().home().resolve() / ".abst" / "contexts")
 default_parallel_sets_location: Path = (Path().home().resolve() / ".abst" / "sets")
+default_session_cache_path: Path = (Path().home().resolve() / ".abst" / "sessions.json")
+default_pending_deletions_path: Path = (Path().home().resolve() / ".abst" / "pending_deletions.json")
+default_version_cache_path: Path = (Path().home().resolve() / ".abst" / "version_check.json")
+default_control_master_path: Path = (Path().home().resolve() / ".abst" / "cm")
+default_ssh_logs_path: Path = (Path().home().resolve() / ".abst" / "logs")
+default_spans_path: Path = (Path().home().resolve() / ".abst" / "spans.jsonl")
 
 default_context_keys: tuple = (
     "host", "bastion-id", "default-name", "ssh-pub-path", "private-key-path", "target-ip",
@@ -23,6 +29,95 @@ share_excluded_keys: tuple = ("private-key-path", "ssh-pub-path", "last-time-use
 # Max Shared JSON size
 max_json_shared = 1048576  # Bytes
 broadcast_shm_name = "abst_shared_memory"
+default_broadcast_flush_interval = 0.2  # Seconds published updates are collected before write
+default_broadcast_poll_interval = 0.5  # Seconds, change detection where inotify is not available
+default_broadcast_safety_interval = 1  # Seconds contents are compared even without change event
+default_broadcast_lease_ttl = 30  # Seconds context stays visible without renewal by its process
+default_broadcast_lease_grace = 60 * 60  # Seconds expired context of alive process is kept
+default_broadcast_sweep_interval = 60  # Seconds between removals of stale contexts
+
+# Version check
+default_pypi_json_url = "https://pypi.org/pypi/abst/json"
+default_version_check_interval = 60 * 60 * 8  # Seconds
+default_version_check_timeout = 5  # Seconds, hard limit of background check
+
+# Session readiness waiter
+default_wait_initial_interval = 0.2  # Seconds
+default_wait_backoff_factor = 1.5
+default_wait_max_interval = 3.0  # Seconds
+default_wait_deadline = 300  # Seconds
+default_key_probe_timeout = 10  # Seconds
+
+# Asyncio scheduler
+default_async_executor_workers = 8  # Threads for blocking OCI SDK calls
+
+# OCI SDK, same as oci.config defaults
+default_oci_config_location = "~/.oci/config"
+default_oci_profile = "DEFAULT"
+
+# OCI API rate limiting per tenancy and region
+default_oci_rate_limit = 10  # Calls per second
+default_oci_rate_burst = 20  # Calls
+default_oci_max_attempts = 8
+default_oci_backoff_base = 0.5  # Seconds
+default_oci_backoff_cap = 30  # Seconds
+
+# Shutdown
+default_shutdown_deadline = 15  # Seconds for deleting all sessions
+default_shutdown_workers = 8
+default_delete_deadline = 10  # Seconds for deleting single session
+default_delete_call_timeout = (3, 5)  # Connect and read timeout of delete calls in seconds
+
+# Session reuse
+default_reuse_min_remaining_ttl = 600  # Seconds
+
+# SSH tunnel engine, openssh spawns ssh process per tunnel, asyncssh forwards in process
+default_ssh_engine = "openssh"
+default_ssh_keepalive_interval = 20  # Seconds
+default_control_master_timeout = 15  # Seconds to wait for control master and its commands
+default_control_master_stop_timeout = 1  # Seconds for exit command and for master to end once stopped
+
+# Tunnel readiness, tcp probes local port, ssh-banner also waits for SSH banner of target,
+# log parses ssh debug output
+default_tunnel_readiness = "tcp"
+default_tunnel_probe_timeout = 1  # Seconds
+default_tunnel_ready_deadline = 30  # Seconds
+default_ssh_output_buffer = 64 * 1024  # Characters of last ssh output kept per tunnel
+
+# Health probing of forwarded ports
+# tcp probe only reaches local ssh listener, which stalled ssh still accepts, so it cannot detect
+# stalls, ssh-banner probe waits for SSH banner of target, auto uses ssh-banner for SSH targets
+default_health_probe = "auto"
+default_health_probe_interval = 30  # Seconds, 0 disables probing
+default_health_probe_timeout = 2  # Seconds
+default_health_probe_failures = 3  # Failed probes in row forcing reconnect
+default_health_probe_window = 100  # Latencies kept for percentiles
+
+# Reconnecting of tunnels
+default_reconnect_initial_delay = 1  # Seconds
+default_reconnect_max_delay = 60  # Seconds
+default_reconnect_backoff_factor = 2
+default_reconnect_max_attempts = 0  # Failed attempts in row before context gives up, 0 never
+default_network_watch_interval = 2  # Seconds
+default_resume_jump_threshold = 5  # Seconds wall clock jumped ahead of monotonic clock
+
+# Accounting relay in front of forwarded ports
+default_relay_chunk = 64 * 1024  # Bytes moved at once, default pipe capacity on Linux
+default_relay_publish_interval = 1  # Seconds
+
+# OpenMetrics endpoint of parallel scheduler
+default_metrics_address = "127.0.0.1"
+default_metrics_buckets = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # Seconds
+
+# Admission of session creation in parallel run
+default_admission_max_creations = 5  # Creations in flight at once, 0 is unlimited
+default_admission_max_sessions = 0  # Sessions held at once per bastion-id, 0 is unlimited
+default_admission_stagger = 0.5  # Seconds between starts of two creations
+default_admission_check_interval = 0.5  # Seconds queued context rechecks admission
+
+# Phase spans of session lifecycle
+default_spans_max_size = 5 * 1024 * 1024  # Bytes, older spans are moved to .1 file
+default_spans_flush_timeout = 2  # Seconds waited for queued spans on exit
 
 
 def get_public_key(ssh_path):
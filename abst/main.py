@@ -4,26 +4,27 @@ import threading
 
 import click
 import rich
-import semantic_version
-from InquirerPy import inquirer
-from requests import ConnectTimeout
 
 from abst.__version__ import __version_name__, __version__, __change_log__, __author__, __ascii_art__
-from abst.bastion_support.bastion_scheduler import BastionScheduler
 from abst.bastion_support.oci_bastion import Bastion
-from abst.cli_commands.context.commands import context, ctx
-from abst.cli_commands.cp_cli.commands import cp
-from abst.cli_commands.create_cli.commands import create, _do
-from abst.cli_commands.helm_cli.commands import helm
-from abst.cli_commands.kubectl_cli.commands import pod
-from abst.cli_commands.parallel.commands import parallel, pl
-from abst.cli_commands.ssh_cli.commands import ssh_lin
 from abst.config import default_creds_path, default_contexts_location, default_conf_path
-from abst.notifier.version_notifier import Notifier
+from abst.utils.lazy_group import LazyGroup
 from abst.utils.misc_funcs import setup_calls, link_signals
 
 
-@click.group()
+@click.group(cls=LazyGroup, lazy_subcommands={
+    "parallel": "abst.cli_commands.parallel.commands:parallel",
+    "pl": "abst.cli_commands.parallel.commands:pl",
+    "context": "abst.cli_commands.context.commands:context",
+    "ctx": "abst.cli_commands.context.commands:ctx",
+    "helm": "abst.cli_commands.helm_cli.commands:helm",
+    "cp": "abst.cli_commands.cp_cli.commands:cp",
+    "pod": "abst.cli_commands.kubectl_cli.commands:pod",
+    "create": "abst.cli_commands.create_cli.commands:create",
+    "do": "abst.cli_commands.create_cli.commands:_do",
+    "ssh": "abst.cli_commands.ssh_cli.commands:ssh_lin",
+    "stats": "abst.cli_commands.stats_cli.commands:stats",
+})
 @click.version_option(f"\n{__ascii_art__}\n{__version__} {__version_name__} @ {__author__}")
 def cli():
     pass
@@ -38,6 +39,8 @@ def cli():
 @click.option("--debug", is_flag=True, default=False)
 @click.argument("context-name", default="")
 def use(debug, context_name):
+    from InquirerPy import inquirer
+    from abst.bastion_support.bastion_scheduler import BastionScheduler
     setup_calls(debug)
 
     used_context = context_name
@@ -65,6 +68,7 @@ def use(debug, context_name):
 @cli.command("clean", help="Cleans all credentials created by abst")
 def clean():
     """ """
+    from InquirerPy import inquirer
     file = "not specified"
     files = [*default_contexts_location.iterdir()]
     if default_creds_path.exists():
@@ -87,6 +91,9 @@ def clean():
 
 
 def main():
+    import semantic_version
+    from abst.notifier.version_notifier import Notifier
+
     sys.setrecursionlimit(2097152)
     threading.stack_size(134217728)
 
@@ -100,10 +107,7 @@ def main():
         Bastion.write_creds_json(_config, default_conf_path)
         print_changelog(_config)
 
-    try:
-        Notifier.notify()
-    except (ConnectionError, ConnectTimeout):
-        return False
+    Notifier.notify()
     Bastion.create_default_locations()
     cli()
 
@@ -116,16 +120,5 @@ def print_changelog(_config):
 
 link_signals()
 
-cli.add_command(parallel)
-cli.add_command(pl)
-cli.add_command(context)
-cli.add_command(ctx)
-cli.add_command(helm)
-cli.add_command(cp)
-cli.add_command(pod)
-cli.add_command(create)
-cli.add_command(_do)
-cli.add_command(ssh_lin)
-
 if __name__ == "__main__":
     main()
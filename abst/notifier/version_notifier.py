@@ -1,51 +1,109 @@
+import json
+import os
+import signal
+import subprocess
+import sys
 from datetime import datetime
+from json import JSONDecodeError
 
-import lastversion
-import requests
 import rich
 import semantic_version
-from requests import ConnectTimeout
 
 from abst import __version__
-from abst.config import default_conf_path
+from abst.config import default_version_cache_path, default_version_check_interval, \
+    default_version_check_timeout, default_pypi_json_url
 
 
 class Notifier:
+    """
+    Version check is done by detached background worker which writes result into cache
+    file, CLI only reads the cache so it never waits for network
+    """
+    disable_env = "ABST_NO_VERSION_CHECK"
+
     @classmethod
-    def check_pypi_available(cls):
+    def load_cache(cls) -> dict:
         try:
-            req = requests.get("https://pypi.org/", timeout=0.2)
-            return req.status_code == 200
-        except (ConnectionError, ConnectTimeout):
-            return False
+            with open(default_version_cache_path, "r") as f:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+        except (OSError, JSONDecodeError):
+            return {}
+
+    @classmethod
+    def write_cache(cls, data: dict):
+        default_version_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = default_version_cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, default_version_cache_path)
 
     @classmethod
     def get_last_version(cls):
-        return lastversion.latest(__version__.__pypi_repo__)
+        import requests
+        req = requests.get(default_pypi_json_url, timeout=(default_version_check_timeout / 2,
+                                                           default_version_check_timeout / 2))
+        req.raise_for_status()
+        return req.json()["info"]["version"]
 
     @classmethod
-    def is_last_version(cls):
-        last = cls.get_last_version()
+    def is_last_version(cls, last) -> bool:
         return semantic_version.Version(
             __version__.__version__) >= semantic_version.Version(str(last))
 
+    @classmethod
+    def refresh_cache(cls):
+        """
+        Fetches last version from PyPI and stores it in cache, runs in background worker
+        """
+        if hasattr(signal, "alarm"):
+            signal.alarm(default_version_check_timeout)
+        try:
+            last = cls.get_last_version()
+        except Exception:
+            last = cls.load_cache().get("last-version", None)
+        cls.write_cache({"last-check": datetime.timestamp(datetime.now()), "last-version": last})
+
+    @classmethod
+    def spawn_refresh(cls):
+        # Mark check as done before worker runs, so parallel invocations do not spawn more
+        cache = cls.load_cache()
+        cache["last-check"] = datetime.timestamp(datetime.now())
+        cls.write_cache(cache)
+
+        detach = {"creationflags": subprocess.DETACHED_PROCESS} if os.name == "nt" \
+            else {"start_new_session": True}
+        subprocess.Popen([sys.executable, "-m", "abst.notifier.version_notifier"],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, **detach)
+
     @classmethod
     def notify(cls):
-        from abst.bastion_support.oci_bastion import Bastion
-        cfg = Bastion.load_config()
-        dt = datetime.now()
-        if (dt - datetime.fromtimestamp(
-                cfg.get("last-check", 1677884000))).seconds < 60 * 60 * 8:
+        if os.environ.get(cls.disable_env, ""):
             return
 
-        cfg["last-check"] = datetime.timestamp(dt)
-        Bastion.write_creds_json(cfg, default_conf_path)
+        cache = cls.load_cache()
+        if datetime.timestamp(datetime.now()) - cache.get("last-check", 0) >= \
+                default_version_check_interval:
+            try:
+                cls.spawn_refresh()
+            except OSError:
+                pass
 
-        if cls.check_pypi_available() and not cls.is_last_version():
-            last = cls.get_last_version()
-            rich.print(
-                f"[yellow]WARNING: You are using abst version {__version__.__version__}; however,"
-                f" version {last} is available.[/yellow]")
-            rich.print(
-                f"[yellow]You should consider upgrading via the `[green]pip3 install abst --upgrade[/green]`"
-                f" command.[/yellow]")
+        last = cache.get("last-version", None)
+        try:
+            if last is None or cls.is_last_version(last):
+                return
+        except ValueError:
+            return
+
+        rich.print(
+            f"[yellow]WARNING: You are using abst version {__version__.__version__}; however,"
+            f" version {last} is available.[/yellow]")
+        rich.print(
+            f"[yellow]You should consider upgrading via the `[green]pip3 install abst --upgrade[/green]`"
+            f" command.[/yellow]")
+
+
+if __name__ == "__main__":
+    Notifier.refresh_cache()
@@ -1,21 +1,65 @@
+import atexit
+import copy
 import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from threading import Lock, Event, Thread
+from time import sleep, monotonic, time
+from typing import Callable, Optional, Union
 
 from deepmerge import always_merger
 
-from abst.config import default_shared_mem_path
+from abst.config import default_shared_mem_path, max_json_shared, default_broadcast_flush_interval, \
+    default_broadcast_safety_interval, default_broadcast_lease_ttl, default_broadcast_lease_grace, \
+    default_broadcast_sweep_interval
+from abst.sharing.watchers import InotifyWatcher, PollingWatcher, Subscription, IN_ATTRIB, \
+    IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_DELETE
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
-class LocalBroadcast:
-    _instance = None
-    _base_dir = default_shared_mem_path
 
-    def __new__(cls, name: str):
-        if cls._instance is None:
-            cls._instance = super(LocalBroadcast, cls).__new__(cls)
-            cls._instance.__init_files(name)
-        return cls._instance
+def merge_json(data_before: dict, data: dict) -> dict:
+    """
+    Merges data into data_before, dictionaries are merged recursively, other values
+    of same type are replaced
+    """
+    for s_key in list(data_before.keys()):
+        if data_before.get(s_key, None) is not None and type(data_before[s_key]) == type(
+                data.get(s_key, None)) and not isinstance(data_before[s_key], dict):
+            data_before.pop(s_key)
+    return always_merger.merge(data_before, data)
+
+
+def owner_alive(pid: int) -> bool:
+    """
+    True if process with pid is running, unknown state counts as running
+    """
+    if os.name == "nt":
+        # os.kill terminates process on Windows, lease expiry is used alone
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError, ValueError):
+        pass
+    return True
+
 
-    def __init_files(self, name: str):
+class FileBackend:
+    """
+    One JSON file per context, used where shared memory is not available
+    """
+
+    def __init__(self, base_dir: Path, name: str):
+        self._base_dir = base_dir
         self._base_name = name
         # Ensure base directory exists
         self._base_dir.mkdir(parents=True, exist_ok=True)
@@ -24,37 +68,31 @@ class LocalBroadcast:
         # Generates a file path for a given context using a Path object
         return self._base_dir / f"{self._base_name}_{context}.json"
 
-    def store_json(self, context: str, data: dict) -> int:
-        """
-        Serialize and store JSON data in a file named by context.
-        @return: Size of the serialized data in bytes
-        """
+    def store(self, context: str, data) -> int:
         file_path = self._get_file_path(context)
-        data_before = self.retrieve_json(context)
-
-        # Merge new data with existing data
-        for s_key in list(data_before.keys()):
-            if data_before.get(s_key, None) is not None and type(
-                    data_before[s_key]) == type(data.get(s_key, None)):
-                data_before.pop(s_key)
-        data_merged = always_merger.merge(data_before, data)
+        data_before = self.retrieve(context)
+        if isinstance(data, dict) and isinstance(data_before, dict):
+            data = merge_json(data_before, data)
 
-        with file_path.open('w', encoding='utf-8') as file:
-            json.dump(data_merged, file)
+        # Readers see either old or new file, never partially written one
+        fd, tmp_path = tempfile.mkstemp(dir=self._base_dir, prefix=f".{file_path.name}.")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
 
-        return file_path.stat().st_size
+        return self.used_space()
 
-    def delete_context(self, context: str):
-        file_path = self._get_file_path(context)
-        try:
-            file_path.unlink()
-        except FileNotFoundError:
-            pass  # Context file already deleted or never existed
+    def store_many(self, contexts: dict) -> int:
+        size = 0
+        for context, data in contexts.items():
+            size = self.store(context, data)
+        return size
 
-    def retrieve_json(self, context: str) -> dict:
-        """
-        Retrieve and deserialize JSON data from a file named by context.
-        """
+    def retrieve(self, context: str):
         file_path = self._get_file_path(context)
         if not file_path.exists():
             return {}
@@ -66,15 +104,554 @@ class LocalBroadcast:
                 print(f"Failed to load JSON from {file_path}: {e}")
                 return {}
 
+    def delete(self, context: str):
+        try:
+            self._get_file_path(context).unlink()
+        except FileNotFoundError:
+            pass  # Context file already deleted or never existed
+
+    def list(self) -> dict:
+        content_dict = {}
+        for file_path in self._base_dir.glob(f"{self._base_name}_*.json"):
+            # Extract the context from the file name
+            context = file_path.stem[len(self._base_name) + 1:]
+            content_dict[context] = self.retrieve(context)
+        return content_dict
+
+    def clear(self):
+        for context in self.list().keys():
+            self.delete(context)
+
+    def remove_if(self, predicate) -> list:
+        removed = [context for context, data in self.list().items() if predicate(data)]
+        for context in removed:
+            self.delete(context)
+        return removed
+
+    def used_space(self) -> int:
+        size = 0
+        for file_path in self._base_dir.glob(f"{self._base_name}_*.json"):
+            try:
+                size += file_path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return size
+
+    def version(self) -> int:
+        state = []
+        for file_path in self._base_dir.glob(f"{self._base_name}_*.json"):
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            state.append((file_path.name, stat.st_mtime_ns, stat.st_size))
+        return hash(tuple(sorted(state)))
+
+    def watch_target(self) -> tuple:
+        # Files are replaced by rename, so directory is watched instead of files
+        return self._base_dir, IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+
+    def close(self):
+        pass
+
+
+class SharedMemoryBackend:
+    """
+    All contexts in one JSON document inside memory mapped file with fixed capacity
+
+    Layout is header (magic, layout version, capacity, sequence, length) followed by
+    JSON payload. Writers serialize by flock, readers do not lock, they retry when
+    sequence was odd or changed while reading (seqlock)
+
+    Data lives as long as some process holds the memory, every open instance keeps
+    shared flock on holders file. Instance opening memory nobody holds starts from
+    empty document with capacity it asked for, otherwise capacity of the memory is kept
+    """
+    MAGIC = b"ABSTSHM\0"
+    LAYOUT_VERSION = 1
+    HEADER = struct.Struct("<8sIIQI4x")
+    SEQ_OFFSET = 16
+    READ_ATTEMPTS = 100
+
+    def __init__(self, base_dir: Path, name: str, size: int):
+        self.path = base_dir / f"{name}.shm"
+        base_dir.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+        self._holder_fd = os.open(str(self.path.with_suffix(".holders")), os.O_RDWR | os.O_CREAT,
+                                  0o600)
+        try:
+            with self._locked():
+                if self._only_holder() or os.fstat(self._fd).st_size < self.HEADER.size or \
+                        not self._valid_header():
+                    os.ftruncate(self._fd, self.HEADER.size + size)
+                    self._mm = mmap.mmap(self._fd, self.HEADER.size + size)
+                    self.HEADER.pack_into(self._mm, 0, self.MAGIC, self.LAYOUT_VERSION, size, 0, 2)
+                    self._mm[self.HEADER.size:self.HEADER.size + 2] = b"{}"
+                else:
+                    # Memory held by other instance keeps its capacity
+                    self._mm = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+                fcntl.flock(self._holder_fd, fcntl.LOCK_SH)
+        except Exception:
+            os.close(self._fd)
+            os.close(self._holder_fd)
+            raise
+        self.capacity = self.HEADER.unpack_from(self._mm, 0)[2]
+
+    def _only_holder(self) -> bool:
+        """
+        True if no other instance holds memory, checked under lock so holders can not
+        come or go meanwhile
+        """
+        try:
+            fcntl.flock(self._holder_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def _valid_header(self) -> bool:
+        header = os.pread(self._fd, self.HEADER.size, 0)
+        magic, layout, capacity, _, _ = self.HEADER.unpack(header)
+        return magic == self.MAGIC and layout == self.LAYOUT_VERSION and \
+            os.fstat(self._fd).st_size >= self.HEADER.size + capacity
+
+    # flock is held per open file, threads of one process need their own lock per path
+    _thread_locks: dict = dict()
+    _thread_locks_guard = Lock()
+
+    class _Lock:
+        def __init__(self, fd: int, thread_lock: Lock):
+            self.fd = fd
+            self.thread_lock = thread_lock
+
+        def __enter__(self):
+            self.thread_lock.acquire()
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            except BaseException:
+                self.thread_lock.release()
+                raise
+
+        def __exit__(self, *args):
+            try:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            finally:
+                self.thread_lock.release()
+
+    def _locked(self) -> "_Lock":
+        with self._thread_locks_guard:
+            thread_lock = self._thread_locks.setdefault(str(self.path), Lock())
+        return self._Lock(self._fd, thread_lock)
+
+    def _read_unlocked(self) -> bytes:
+        _, _, _, _, length = self.HEADER.unpack_from(self._mm, 0)
+        return self._mm[self.HEADER.size:self.HEADER.size + length]
+
+    def read_document(self) -> dict:
+        for _ in range(self.READ_ATTEMPTS):
+            seq = struct.unpack_from("<Q", self._mm, self.SEQ_OFFSET)[0]
+            if seq % 2:
+                # Writer is in the middle of update
+                sleep(0)
+                continue
+            payload = self._read_unlocked()
+            if struct.unpack_from("<Q", self._mm, self.SEQ_OFFSET)[0] == seq:
+                try:
+                    return json.loads(payload)
+                except ValueError:
+                    break
+        # Writer keeps sequence odd or document is broken, lock tells which
+        with self._locked():
+            return self._load_locked()
+
+    def _load_locked(self) -> dict:
+        """
+        Reads document while holding lock, document left by writer killed in the middle
+        of update is reset to empty one
+        """
+        seq, length = struct.unpack_from("<QI", self._mm, self.SEQ_OFFSET)
+        try:
+            if seq % 2 or length > self.capacity:
+                raise ValueError(f"sequence {seq}, length {length}")
+            document = json.loads(self._read_unlocked())
+            if not isinstance(document, dict):
+                raise ValueError(f"document is {type(document).__name__}")
+            return document
+        except ValueError as ex:
+            logging.error(f"Shared memory {self.path} was left corrupt, resetting it {ex}")
+            if seq % 2:
+                struct.pack_into("<Q", self._mm, self.SEQ_OFFSET, seq + 1)
+            self._write_document({})
+            return {}
+
+    def _write_document(self, document: dict) -> int:
+        payload = json.dumps(document).encode()
+        if len(payload) > self.capacity:
+            raise ValueError(f"Shared data of {len(payload)} bytes exceeds capacity "
+                             f"of {self.capacity} bytes")
+        seq = struct.unpack_from("<Q", self._mm, self.SEQ_OFFSET)[0]
+        struct.pack_into("<Q", self._mm, self.SEQ_OFFSET, seq + 1)
+        self._mm[self.HEADER.size:self.HEADER.size + len(payload)] = payload
+        struct.pack_into("<I", self._mm, self.SEQ_OFFSET + 8, len(payload))
+        struct.pack_into("<Q", self._mm, self.SEQ_OFFSET, seq + 2)
+        # Writes to mapped memory do not generate inotify events, touching file does
+        os.utime(self._fd)
+        return len(payload)
+
+    def update(self, change) -> int:
+        """
+        Read, modify and write of document under lock
+        @param change: Callable modifying document in place
+        @return: Used space in bytes
+        """
+        with self._locked():
+            document = self._load_locked()
+            change(document)
+            return self._write_document(document)
+
+    def store(self, context: str, data) -> int:
+        return self.store_many({context: data})
+
+    def store_many(self, contexts: dict) -> int:
+        """
+        Merges data of several contexts by single write
+        """
+        def change(document: dict):
+            for context, data in contexts.items():
+                before = document.get(context, None)
+                if isinstance(data, dict) and isinstance(before, dict):
+                    document[context] = merge_json(before, data)
+                else:
+                    document[context] = data
+
+        return self.update(change)
+
+    def retrieve(self, context: str):
+        return self.read_document().get(context, {})
+
+    def delete(self, context: str):
+        self.update(lambda document: document.pop(context, None))
+
+    def list(self) -> dict:
+        return self.read_document()
+
+    def clear(self):
+        self.update(lambda document: document.clear())
+
+    def remove_if(self, predicate) -> list:
+        """
+        Removes contexts whose data matches predicate, nothing is written if none matches
+        @return: Removed contexts
+        """
+        with self._locked():
+            document = self._load_locked()
+            removed = [context for context, data in document.items() if predicate(data)]
+            if removed:
+                for context in removed:
+                    document.pop(context)
+                self._write_document(document)
+        return removed
+
+    def used_space(self) -> int:
+        return self.HEADER.unpack_from(self._mm, 0)[4]
+
+    def version(self) -> int:
+        return struct.unpack_from("<Q", self._mm, self.SEQ_OFFSET)[0]
+
+    def watch_target(self) -> tuple:
+        return self.path, IN_ATTRIB | IN_MODIFY
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+            os.close(self._fd)
+            # Releases holder flock
+            os.close(self._holder_fd)
+
+
+# Default context is stored as None, so missing argument needs its own marker
+_ALL_CONTEXTS = object()
+
+
+class LocalBroadcast:
+    """
+    State of running contexts shared between abst processes, one instance per name
+
+    store_json writes immediately, publish only merges update into pending updates
+    which are written by background thread once per flush interval, so rapid
+    status changes of context end up as single write
+
+    Context held by hold_lease carries pid of its owner and lease-until timestamp,
+    which the same background thread renews. Readers skip contexts whose lease expired
+    or whose owner is not running, background thread of process holding leases removes
+    them once per sweep interval
+    """
+    _instances: dict = dict()
+    _base_dir = default_shared_mem_path
+    flush_interval: float = default_broadcast_flush_interval
+    lease_ttl: float = default_broadcast_lease_ttl
+    lease_grace: float = default_broadcast_lease_grace
+    sweep_interval: float = default_broadcast_sweep_interval
+
+    def __new__(cls, name: str, size: int = max_json_shared):
+        instance = cls._instances.get(name, None)
+        if instance is None:
+            instance = cls._instances[name] = super(LocalBroadcast, cls).__new__(cls)
+            instance.__init_backend(name, size)
+        return instance
+
+    def __init_backend(self, name: str, size: int):
+        self._base_name = name
+        self._pending: dict = dict()
+        self._pending_lock = Lock()
+        self._flush_lock = Lock()
+        self._pending_event = Event()
+        self._flusher: Optional[Thread] = None
+        self._closed = Event()
+        # Context -> lease-until of held leases and all data published for them, so
+        # context removed while machine slept is written again in full
+        self._leases: dict = dict()
+        self._owned: dict = dict()
+        self._last_sweep: Optional[float] = None
+        self.backend: Union[SharedMemoryBackend, FileBackend]
+        if fcntl is not None and os.environ.get("ABST_SHARED_BACKEND", "memory") == "memory":
+            try:
+                self.backend = SharedMemoryBackend(self._base_dir, name, size)
+                return
+            except (OSError, ValueError) as ex:
+                print(f"Shared memory not available, using files {ex}")
+        self.backend = FileBackend(self._base_dir, name)
+
+    def store_json(self, context: Union[str, dict, None], data: Optional[dict] = None) -> int:
+        """
+        Merges data into data stored under context
+        store_json(data) merges top level keys of data as contexts
+        @return: Size of all the serialized data in bytes
+        """
+        if data is None and isinstance(context, dict):
+            return self.backend.store_many(context)
+        return self.backend.store(str(context), data)
+
+    def publish(self, context: Optional[str], data: dict):
+        """
+        Same as store_json but returns immediately, update is written by background thread
+        together with other updates of the flush interval
+        """
+        key = str(context)
+        data = copy.deepcopy(data)
+        with self._pending_lock:
+            if key in self._leases:
+                self._owned[key] = merge_json(self._owned[key], copy.deepcopy(data))
+            before = self._pending.get(key, None)
+            self._pending[key] = data if before is None else merge_json(before, data)
+            self._start_flusher()
+        self._pending_event.set()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = Thread(name="broadcast-flush", target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            if self._pending_event.wait(self.lease_ttl / 3 if self._leases else None):
+                # Updates arriving during interval are written together
+                sleep(self.flush_interval)
+            if self._closed.is_set():
+                return
+            self.renew_leases()
+            self.flush()
+            if self._last_sweep is None or monotonic() - self._last_sweep >= self.sweep_interval:
+                self.sweep()
+
+    def hold_lease(self, context: Optional[str], data: Optional[dict] = None):
+        """
+        Publishes context owned by this process, it stays visible to readers only while
+        this process runs and renews it
+        """
+        key = str(context)
+        with self._pending_lock:
+            self._leases[key] = 0
+            self._owned[key] = dict()
+            self._start_flusher()
+        self.publish(key, {**(data or {}), "pid": os.getpid(), "lease-until": time() + self.lease_ttl})
+        with self._pending_lock:
+            self._leases[key] = time() + self.lease_ttl
+
+    def renew_leases(self, force: bool = False):
+        """
+        Extends leases of held contexts which used up third of their ttl
+        """
+        now = time()
+        with self._pending_lock:
+            due = {key: until for key, until in self._leases.items()
+                   if force or until - now < self.lease_ttl * 2 / 3}
+        for key, until in due.items():
+            lease = {"lease-until": now + self.lease_ttl}
+            with self._pending_lock:
+                if key not in self._leases:
+                    continue
+                self._leases[key] = lease["lease-until"]
+                if until < now:
+                    # Context could have been swept meanwhile
+                    lease = {**copy.deepcopy(self._owned[key]), **lease}
+            self.publish(key, lease)
+
+    def is_live(self, data) -> bool:
+        """
+        False if data belongs to context whose lease expired or whose owner is not running
+        """
+        if not isinstance(data, dict) or "lease-until" not in data:
+            return True
+        if data["lease-until"] < time():
+            return False
+        pid = data.get("pid", None)
+        return pid is None or pid == os.getpid() or owner_alive(pid)
+
+    def is_stale(self, data) -> bool:
+        """
+        True if context should be removed, its owner is gone or it was not renewed
+        for longer than grace period
+        """
+        if not isinstance(data, dict) or "lease-until" not in data:
+            return False
+        pid = data.get("pid", None)
+        if pid is not None and pid != os.getpid() and not owner_alive(pid):
+            return True
+        return data["lease-until"] + self.lease_grace < time()
+
+    def sweep(self) -> list:
+        """
+        Removes stale contexts
+        @return: Removed contexts
+        """
+        # Runs on flusher thread, lock keeps sweep and writes of this process apart
+        with self._flush_lock:
+            self._last_sweep = monotonic()
+            try:
+                removed = self.backend.remove_if(self.is_stale)
+            except (OSError, ValueError) as ex:
+                logging.error(f"Failed to remove stale contexts {ex}")
+                return []
+        if removed:
+            logging.debug(f"Removed stale contexts {', '.join(removed)}")
+        return removed
+
+    def flush(self):
+        """
+        Writes pending published updates
+        """
+        with self._flush_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, dict()
+                self._pending_event.clear()
+            if not pending:
+                return
+            try:
+                self.backend.store_many(pending)
+            except (OSError, ValueError) as ex:
+                logging.error(f"Failed to publish state of {', '.join(pending.keys())} {ex}")
+
+    def _with_pending(self, context: str, data):
+        with self._pending_lock:
+            pending = copy.deepcopy(self._pending.get(context, None))
+        if pending is None:
+            return data
+        if isinstance(data, dict) and isinstance(pending, dict):
+            return merge_json(data, pending)
+        return pending
+
+    def delete_context(self, context: Optional[str]):
+        # Pending update written after delete would bring context back
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending.pop(str(context), None)
+                self._leases.pop(str(context), None)
+                self._owned.pop(str(context), None)
+            self.backend.delete(str(context))
+
+    def retrieve_json(self, context: Optional[str] = _ALL_CONTEXTS):
+        """
+        Retrieve data stored under context, without context all contexts are returned
+        """
+        if context is _ALL_CONTEXTS:
+            return self.list_contents()
+        data = self._with_pending(str(context), self.backend.retrieve(str(context)))
+        return data if self.is_live(data) else {}
+
     def list_contents(self) -> dict:
         """
-        List files in the base directory and return a dictionary where file names
-        are keys and the values are the contents of the files.
+        Returns dictionary where contexts are keys and values are their data, contexts
+        with expired lease are left out
         """
-        content_dict = {}
-        for file_path in self._base_dir.iterdir():
-            if file_path.is_file() and file_path.suffix == '.json':
-                # Extract the context from the file name
-                context = file_path.stem.replace(f"{self._base_name}_", "")
-                content_dict[context] = self.retrieve_json(context)
-        return content_dict
+        contents = self.backend.list()
+        with self._pending_lock:
+            pending_contexts = list(self._pending.keys())
+        for context in pending_contexts:
+            contents[context] = self._with_pending(context, contents.get(context, {}))
+        return {context: data for context, data in contents.items() if self.is_live(data)}
+
+    def get_used_space(self) -> int:
+        return self.backend.used_space()
+
+    def create_watcher(self) -> Union[InotifyWatcher, PollingWatcher]:
+        """
+        Watcher waking up on changes made by any process, inotify on Linux, polling
+        of backend version elsewhere
+        """
+        if os.environ.get("ABST_SHARED_WATCH", "inotify") == "inotify":
+            try:
+                return InotifyWatcher(*self.backend.watch_target())
+            except OSError as ex:
+                logging.debug(f"Inotify not available, polling shared data {ex}")
+        return PollingWatcher(self.backend.version)
+
+    def subscribe(self, callback: Callable[[str, Optional[dict]], None],
+                  context: Optional[str] = _ALL_CONTEXTS,
+                  safety_interval: float = default_broadcast_safety_interval) -> Subscription:
+        """
+        Calls callback(context, data) from background thread whenever data of context
+        changes, data is None when context was deleted
+        @param context: Only this context is watched, all contexts if not set
+        @return: Subscription, close it to stop receiving changes
+        """
+        return Subscription(self, callback, None if context is _ALL_CONTEXTS else str(context),
+                            safety_interval)
+
+    def wait_for(self, predicate: Callable[[dict], bool], timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until predicate called with all contexts returns True
+        @param timeout: Seconds, None waits forever
+        @return: False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        watcher = self.create_watcher()
+        try:
+            while not predicate(self.list_contents()):
+                remaining = default_broadcast_safety_interval if deadline is None \
+                    else deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                watcher.wait(min(remaining, default_broadcast_safety_interval))
+            return True
+        finally:
+            watcher.close()
+
+    def clear(self):
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending.clear()
+                self._leases.clear()
+                self._owned.clear()
+            self.backend.clear()
+
+    def close(self):
+        self.flush()
+        with self._pending_lock:
+            self._leases.clear()
+        self._closed.set()
+        # Wakes up flusher so it ends
+        self._pending_event.set()
+        with self._flush_lock:
+            self.backend.close()
+        LocalBroadcast._instances.pop(self._base_name, None)
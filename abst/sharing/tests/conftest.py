@@ -0,0 +1,25 @@
+from unittest import mock
+
+import pytest
+
+from abst.sharing.local_broadcast import LocalBroadcast
+
+
+@pytest.fixture(autouse=True, scope="session")
+def shared_mem_dir(tmp_path_factory):
+    """
+    Keeps memory of tests out of ~/.abst/shared_mem
+    """
+    with mock.patch.object(LocalBroadcast, "_base_dir", tmp_path_factory.mktemp("shared_mem")):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def empty_memory_after_test():
+    """
+    Memory keeps its data while any instance holds it and instances of one name are
+    shared within process, so every test leaves memory empty for the next one
+    """
+    yield
+    for lb in list(LocalBroadcast._instances.values()):
+        lb.clear()
@@ -0,0 +1,163 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+from pathlib import Path
+from threading import Event, Lock, Thread
+from time import monotonic
+from typing import Callable, Optional
+
+from abst.config import default_broadcast_poll_interval
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """
+    Wakes up when watched path changes, Linux only
+    """
+    _libc = None
+
+    def __init__(self, path: Path, mask: int):
+        libc = self.load_libc()
+        if libc is None:
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, str(path).encode(), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch of {path} failed")
+        # Pipe wakes up select when watcher is interrupted
+        self._wake_read, self._wake_write = os.pipe()
+
+    @classmethod
+    def load_libc(cls):
+        if cls._libc is None and hasattr(os, "uname") and os.uname().sysname == "Linux":
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+                libc.inotify_init1, libc.inotify_add_watch
+                cls._libc = libc
+            except (OSError, AttributeError):
+                cls._libc = False
+        return cls._libc or None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        @return: True if path changed before timeout
+        """
+        readable, _, _ = select.select([self.fd, self._wake_read], [], [], timeout)
+        if self.fd not in readable:
+            return False
+        try:
+            # Events only wake us up, content is compared by subscriber
+            while os.read(self.fd, 64 * EVENT_HEADER.size):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def interrupt(self):
+        os.write(self._wake_write, b"\0")
+
+    def close(self):
+        for fd in (self.fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+
+class PollingWatcher:
+    """
+    Wakes up when version returned by callable changes
+    """
+
+    def __init__(self, get_version: Callable[[], object],
+                 interval: float = default_broadcast_poll_interval):
+        self.get_version = get_version
+        self.interval = interval
+        self._version = get_version()
+        self._interrupted = Event()
+
+    def wait(self, timeout: float) -> bool:
+        deadline = monotonic() + timeout
+        while not self._interrupted.is_set():
+            version = self.get_version()
+            if version != self._version:
+                self._version = version
+                return True
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return False
+            self._interrupted.wait(min(self.interval, remaining))
+        return False
+
+    def interrupt(self):
+        self._interrupted.set()
+
+    def close(self):
+        pass
+
+
+class Subscription:
+    """
+    Calls callback with (context, data) for every context that changed, data is None
+    when context was deleted. Callback runs in background thread
+    """
+
+    def __init__(self, broadcast, callback: Callable[[str, Optional[dict]], None],
+                 context: Optional[str] = None, safety_interval: float = 1):
+        """
+        @param broadcast: LocalBroadcast to watch
+        @param context: Only changes of this context are delivered
+        @param safety_interval: Seconds after which contents are compared even without event
+        """
+        self.broadcast = broadcast
+        self.callback = callback
+        self.context = None if context is None else str(context)
+        self.safety_interval = safety_interval
+        self._closed = Event()
+        # Watcher must not be interrupted after thread closed it
+        self._watcher_lock = Lock()
+        self.watcher = broadcast.create_watcher()
+        self._last = broadcast.list_contents()
+        self._thread = Thread(name="broadcast-subscription", target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        try:
+            while not self._closed.is_set():
+                self.watcher.wait(self.safety_interval)
+                if self._closed.is_set():
+                    return
+                self.dispatch()
+        finally:
+            with self._watcher_lock:
+                self._closed.set()
+                self.watcher.close()
+
+    def dispatch(self):
+        current = self.broadcast.list_contents()
+        contexts = [self.context] if self.context is not None else \
+            sorted(set(current.keys()) | set(self._last.keys()))
+        for context in contexts:
+            if current.get(context, None) != self._last.get(context, None):
+                try:
+                    self.callback(context, current.get(context, None))
+                except Exception as ex:
+                    logging.debug(f"Subscriber of {context} failed {ex}")
+        self._last = current
+
+    def close(self):
+        with self._watcher_lock:
+            if not self._closed.is_set():
+                self._closed.set()
+                self.watcher.interrupt()
@@ -0,0 +1,32 @@
+import importlib
+from typing import Optional
+
+import click
+
+
+class LazyGroup(click.Group):
+    """
+    Click group importing subcommand modules only when subcommand is invoked
+
+    lazy_subcommands maps command name to 'module.path:attribute'
+    """
+
+    def __init__(self, *args, lazy_subcommands: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(super().list_commands(ctx) + list(self.lazy_subcommands.keys()))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands:
+            return self._lazy_load(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def _lazy_load(self, cmd_name):
+        module_name, attribute = self.lazy_subcommands[cmd_name].split(":")
+        command = getattr(importlib.import_module(module_name), attribute)
+        if not isinstance(command, click.Command):
+            raise ValueError(f"Lazy loading of {self.lazy_subcommands[cmd_name]} failed, "
+                             f"it is not click Command")
+        return command
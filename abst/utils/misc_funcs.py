@@ -166,6 +166,17 @@ def link_bastion_signals(bastion):
     signal.signal(signal.SIGINT, lambda signum, frame: exit_gracefully(bastion, signum, frame))
     signal.signal(signal.SIGTERM, lambda signum, frame: exit_gracefully(bastion, signum, frame))
     signal.signal(signal.SIGABRT, lambda signum, frame: exit_gracefully(bastion, signum, frame))
+    link_dump_signal()
+
+
+def link_dump_signal():
+    """
+    SIGUSR1 dumps buffered ssh output of tunnels running in this process, used by abst pl logs
+    """
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    from abst.bastion_support.oci_bastion import Bastion
+    signal.signal(signal.SIGUSR1, Bastion.dump_all_ssh_outputs)
 
 
 def exit_gracefully(bastion, signum, frame):
@@ -0,0 +1,51 @@
+import asyncio
+import socket
+from time import perf_counter
+from typing import Optional
+
+from abst.config import default_tunnel_probe_timeout
+
+
+def probe_port(host: str, port: int, handshake: bool = False,
+               timeout: float = default_tunnel_probe_timeout) -> bool:
+    """
+    Checks if port accepts connections
+    @param handshake: Also require SSH banner from the other side of tunnel
+    @param timeout: Timeout of connect and banner read in seconds
+    """
+    return measure_port(host, port, handshake, timeout) is not None
+
+
+def measure_port(host: str, port: int, handshake: bool = False,
+                 timeout: float = default_tunnel_probe_timeout) -> Optional[float]:
+    """
+    Same as probe_port
+    @return: Seconds until connection was accepted (or banner received), None on failure
+    """
+    started = perf_counter()
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout) as sock:
+            if handshake and not sock.recv(255).startswith(b"SSH-"):
+                return None
+            return perf_counter() - started
+    except OSError:
+        return None
+
+
+async def probe_port_async(host: str, port: int, handshake: bool = False,
+                           timeout: float = default_tunnel_probe_timeout) -> bool:
+    """
+    Same as probe_port but for event loop
+    """
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    try:
+        if not handshake:
+            return True
+        return (await asyncio.wait_for(reader.read(255), timeout)).startswith(b"SSH-")
+    except (OSError, asyncio.TimeoutError):
+        return False
+    finally:
+        writer.close()
@@ -0,0 +1,36 @@
+from collections import deque
+from threading import Lock
+
+
+class RingBuffer:
+    """
+    Thread safe buffer of last lines with bounded size, oldest lines are dropped
+    once capacity in characters is exceeded
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._lines: deque = deque()
+        self._size = 0
+        self._lock = Lock()
+
+    def append(self, line: str):
+        if len(line) >= self.capacity:
+            line = line[-(self.capacity - 1):]
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line) + 1
+            while self._size > self.capacity:
+                self._size -= len(self._lines.popleft()) + 1
+
+    def getvalue(self) -> str:
+        with self._lock:
+            return "".join(f"{line}\n" for line in self._lines)
+
+    def clear(self):
+        with self._lock:
+            self._lines.clear()
+            self._size = 0
+
+    def __len__(self):
+        return self._size
@@ -0,0 +1,14 @@
+from typing import Optional, Sequence
+
+
+def percentile(values: Sequence[float], percent: float) -> Optional[float]:
+    """
+    Nearest rank percentile
+    @param values: Values, do not have to be sorted
+    @param percent: Percentile in range 0-100
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered))) - 1))
+    return ordered[index]
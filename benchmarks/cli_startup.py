@@ -0,0 +1,378 @@
+"""
+Cold start benchmark of abst CLI entry points
+
+Every entry point is executed in fresh interpreter with temporary HOME holding
+contexts directory of given size, external tools (kubectl, ssh) and OCI Bastion
+client are replaced by stubs so nothing leaves the machine.
+
+Measured per command and contexts directory size:
+  wall time     - process start to exit, for `do forward` start to tunnel process spawn
+  peak RSS      - ru_maxrss of the process (KiB)
+  import time   - `-X importtime` total and self time grouped by top level package
+
+Results are printed as JSON (or written to --output) so runs of different
+releases can be compared. POSIX only, os.wait4 is used for resource usage.
+
+Usage:
+  python benchmarks/cli_startup.py [--runs 5] [--sizes 10,100,1000] [--output out.json]
+"""
+import argparse
+import json
+import os
+import platform
+import pty
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from threading import Thread
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+FORWARD_CONTEXT = "bench-forward"
+PROCESS_TIMEOUT = 60
+
+COMMANDS = {
+    "use": ["use", "default"],
+    "ssh": ["ssh"],
+    "ctx list": ["ctx", "list"],
+    "pl display": ["pl", "display", "bench"],
+    "pod logs": ["pod", "logs", "bench-api"],
+    "do forward": ["do", "forward", FORWARD_CONTEXT],
+}
+
+FAKE_KUBECTL = """#!/bin/sh
+case "$1 $2" in
+  "get pods")
+    echo "NAMESPACE   NAME          READY   STATUS    RESTARTS   AGE"
+    echo "bench       bench-api-0   1/1     Running   0          1d"
+    ;;
+  *)
+    echo "bench log line"
+    ;;
+esac
+"""
+
+FAKE_SSH = """#!/bin/sh
+echo "debug1: Authenticated to bench" >&2
+case "$*" in
+  *BatchMode=yes*) exit 0 ;;
+esac
+date +%s > "$ABST_BENCH_TUNNEL_MARKER"
+echo "debug1: pledge: network" >&2
+exec sleep 3600
+"""
+
+# Loaded through PYTHONPATH only for `do forward`, replaces OCI Bastion client
+FAKE_OCI_SITECUSTOMIZE = '''
+import datetime
+import itertools
+
+from abst.bastion_support.oci_clients import BastionClientRegistry
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+        self.status = 200
+        self.headers = {}
+
+
+class FakeBastionClient:
+    sessions = {}
+    counter = itertools.count()
+
+    def create_session(self, details, **kwargs):
+        import oci
+        session_id = f"ocid1.bastionsession.bench.{next(self.counter)}"
+        self.sessions[session_id] = oci.bastion.models.Session(
+            id=session_id, bastion_id=details.bastion_id, display_name=details.display_name,
+            lifecycle_state="ACTIVE", session_ttl_in_seconds=details.session_ttl_in_seconds,
+            time_created=datetime.datetime.now(datetime.timezone.utc),
+            target_resource_details=details.target_resource_details,
+            key_details=details.key_details)
+        return _Response(self.sessions[session_id])
+
+    def get_session(self, session_id, **kwargs):
+        return _Response(self.sessions[session_id])
+
+    def delete_session(self, session_id, **kwargs):
+        self.sessions.pop(session_id, None)
+        return _Response(None)
+
+    def list_sessions(self, bastion_id, **kwargs):
+        return _Response([])
+
+
+_client = FakeBastionClient()
+BastionClientRegistry.get_client = classmethod(lambda cls, region=None, profile=None, timeout=None: _client)
+BastionClientRegistry.get_config = classmethod(
+    lambda cls, region=None, profile=None: {"region": region or "us-phoenix-1", "tenancy": "bench"})
+'''
+
+
+def context_dict(index: int, pub_key_path: Path) -> dict:
+    return {"host": "host.bastion.us-phoenix-1.oci.oraclecloud.com",
+            "bastion-id": f"ocid1.bastion.bench.{index}",
+            "default-name": "bench",
+            "ssh-pub-path": str(pub_key_path),
+            "private-key-path": str(pub_key_path.with_suffix("")),
+            "target-ip": f"10.0.{index // 250}.{index % 250 + 1}",
+            "local-port": str(20000 + index),
+            "target-port": "22",
+            "ttl": "10800",
+            "region": "us-phoenix-1",
+            "resource-id": "ocid1.instance.bench",
+            "resource-os-username": "opc"}
+
+
+def prepare_home(root: Path, size: int) -> dict:
+    """
+    Creates temporary HOME with contexts and parallel set of given size and stub binaries
+    @return: Environment for benchmarked processes
+    """
+    home = root / f"home-{size}"
+    abst_dir = home / ".abst"
+    contexts = abst_dir / "contexts"
+    set_dir = abst_dir / "sets" / "bench"
+    bin_dir = root / "bin"
+    stubs_dir = root / "stubs"
+    for directory in (contexts, set_dir, bin_dir, stubs_dir, home / ".ssh"):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    pub_key_path = home / ".ssh" / "id_rsa.pub"
+    pub_key_path.write_text("ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQbench bench@abst\n")
+    pub_key_path.with_suffix("").write_text("bench\n")
+
+    for index in range(size):
+        data = json.dumps(context_dict(index, pub_key_path), indent=4)
+        (contexts / f"bench-{index}.json").write_text(data)
+        (set_dir / f"bench-{index}.json").write_text(data)
+    (contexts / f"{FORWARD_CONTEXT}.json").write_text(
+        json.dumps(context_dict(size, pub_key_path), indent=4))
+
+    for name, content in (("kubectl", FAKE_KUBECTL), ("ssh", FAKE_SSH)):
+        path = bin_dir / name
+        path.write_text(content)
+        path.chmod(0o755)
+    (stubs_dir / "sitecustomize.py").write_text(FAKE_OCI_SITECUSTOMIZE)
+
+    env = dict(os.environ)
+    env.update({"HOME": str(home),
+                "PATH": f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+                "PYTHONPATH": str(REPO_ROOT),
+                "ABST_NO_VERSION_CHECK": "1",
+                "ABST_BENCH_TUNNEL_MARKER": str(root / "tunnel-marker"),
+                "COLUMNS": "200"})
+    env["_ABST_BENCH_STUBS"] = str(stubs_dir)
+    return env
+
+
+def command_env(env: dict, name: str) -> dict:
+    env = dict(env)
+    if name == "do forward":
+        env["PYTHONPATH"] = f"{env.pop('_ABST_BENCH_STUBS')}{os.pathsep}{env['PYTHONPATH']}"
+    else:
+        env.pop("_ABST_BENCH_STUBS")
+    return env
+
+
+def wait_process(pid: int, deadline: float):
+    """
+    Reaps process collecting its resource usage
+    @return: Exit status and resource usage, None if deadline passed
+    """
+    while True:
+        waited, status, rusage = os.wait4(pid, os.WNOHANG)
+        if waited == pid:
+            return status, rusage
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(0.002)
+
+
+def exit_code(status):
+    if status is None:
+        return None
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def drain(fd: int):
+    try:
+        while os.read(fd, 65536):
+            pass
+    except OSError:
+        pass
+
+
+def kill_group(process: subprocess.Popen):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_once(name: str, env: dict, import_time: bool = False) -> dict:
+    """
+    Runs command once in fresh interpreter
+    @param import_time: Runs with -X importtime and returns its stderr
+    """
+    marker = Path(env["ABST_BENCH_TUNNEL_MARKER"])
+    if marker.exists():
+        marker.unlink()
+
+    args = [sys.executable] + (["-X", "importtime"] if import_time else []) + \
+           ["-c", "from abst.main import main; main()"] + COMMANDS[name]
+    # Terminal is attached to stdout as abst sets terminal title and draws tables
+    terminal, terminal_slave = pty.openpty()
+    started = time.perf_counter()
+    process = subprocess.Popen(args, env=env, stdin=subprocess.DEVNULL,
+                               stdout=terminal_slave, stderr=subprocess.PIPE,
+                               start_new_session=True)
+    os.close(terminal_slave)
+    deadline = time.monotonic() + PROCESS_TIMEOUT
+    result = {}
+
+    stderr_chunks = []
+    # Outputs are drained by threads so -X importtime output can not fill pipe
+    readers = [Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True),
+               Thread(target=drain, args=[terminal], daemon=True)]
+    for reader in readers:
+        reader.start()
+
+    if name == "do forward":
+        waited = None
+        while not marker.exists() and time.monotonic() < deadline:
+            if waited := wait_process(process.pid, 0):
+                break
+            time.sleep(0.002)
+        result["wall_ms"] = (time.perf_counter() - started) * 1000
+        result["connected"] = marker.exists()
+        if waited is None:
+            process.send_signal(signal.SIGINT)
+            shutdown_started = time.perf_counter()
+            waited = wait_process(process.pid, time.monotonic() + 15)
+            result["shutdown_ms"] = (time.perf_counter() - shutdown_started) * 1000
+    else:
+        waited = wait_process(process.pid, deadline)
+        result["wall_ms"] = (time.perf_counter() - started) * 1000
+
+    # Tunnel stubs and anything left in session are not part of measurement
+    kill_group(process)
+    if waited is None:
+        result["timed_out"] = True
+        waited = wait_process(process.pid, time.monotonic() + 5) or (None, None)
+    status, rusage = waited
+    process.returncode = exit_code(status)
+    for reader in readers:
+        reader.join(5)
+    os.close(terminal)
+
+    result["exit_code"] = process.returncode
+    if rusage is not None:
+        # Linux reports KiB, macOS bytes
+        result["peak_rss_kib"] = rusage.ru_maxrss // 1024 if sys.platform == "darwin" \
+            else rusage.ru_maxrss
+    if import_time:
+        result["stderr"] = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+    return result
+
+
+def parse_import_time(stderr: str, top: int = 15) -> dict:
+    """
+    Parses -X importtime output
+    @return: Total import time and self time grouped by top level package in ms
+    """
+    total_us = 0
+    by_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len("import time:"):].split("|", 2)
+        name = raw_name.strip()
+        by_package[name.split(".")[0]] += int(self_us)
+        # Only top level imports are counted to total, nested ones are in their cumulative
+        if len(raw_name) - len(raw_name.lstrip()) == 1:
+            total_us += int(cumulative_us)
+
+    ordered = sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {"total_ms": round(total_us / 1000, 2),
+            "self_ms_by_package": {package: round(us / 1000, 2) for package, us in ordered}}
+
+
+def summarize(values: list) -> dict:
+    return {"min": round(min(values), 2), "median": round(statistics.median(values), 2),
+            "mean": round(statistics.mean(values), 2), "max": round(max(values), 2)}
+
+
+def bench_command(name: str, env: dict, runs: int) -> dict:
+    env = command_env(env, name)
+    # Warm up creates abst config files and bytecode cache
+    run_once(name, env)
+
+    samples = [run_once(name, env) for _ in range(runs)]
+    imports = run_once(name, env, import_time=True)
+
+    result = {"runs": runs,
+              "wall_ms": summarize([sample["wall_ms"] for sample in samples]),
+              "peak_rss_kib": max(sample.get("peak_rss_kib", 0) for sample in samples),
+              "exit_codes": sorted({sample["exit_code"] for sample in samples},
+                                   key=lambda code: (code is None, code)),
+              "imports": parse_import_time(imports["stderr"])}
+    if name == "do forward":
+        result["connected"] = all(sample["connected"] for sample in samples)
+        result["shutdown_ms"] = summarize([sample.get("shutdown_ms", 0) for sample in samples])
+    if any(sample.get("timed_out", False) for sample in samples):
+        result["timed_out"] = True
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark of abst CLI entry points")
+    parser.add_argument("--runs", type=int, default=5, help="Measured runs per command and size")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated contexts counts")
+    parser.add_argument("--commands", default=",".join(COMMANDS.keys()),
+                        help="Comma separated commands to run")
+    parser.add_argument("--output", default=None, help="Write JSON results to file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    commands = [command.strip() for command in args.commands.split(",")]
+    for command in commands:
+        if command not in COMMANDS:
+            parser.error(f"Unknown command '{command}', available {list(COMMANDS.keys())}")
+
+    from abst.__version__ import __version__
+    report = {"abst_version": __version__,
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "timestamp": datetime.now().isoformat(),
+              "results": []}
+
+    with tempfile.TemporaryDirectory(prefix="abst-bench-") as tmp:
+        for size in sizes:
+            env = prepare_home(Path(tmp), size)
+            for command in commands:
+                print(f"Benchmarking '{command}' with {size} contexts", file=sys.stderr)
+                result = bench_command(command, env, args.runs)
+                report["results"].append({"command": command, "contexts": size, **result})
+                print(f"  median {result['wall_ms']['median']} ms, "
+                      f"peak RSS {result['peak_rss_kib']} KiB, "
+                      f"imports {result['imports']['total_ms']} ms", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(REPO_ROOT))
+    main()
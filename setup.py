@@ -26,11 +26,12 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     python_requires=">=3.7,<4",
-    install_requires=["click", "rich", "inquirerpy", "oci==2.150.0", "lastversion",
+    install_requires=["click", "rich", "inquirerpy", "oci==2.150.0", "requests",
                       "semantic_version", "pyperclip",
                       "bext", "deepmerge~=2.0"],
     extras_require={
         "dev": ["black==22.*"],
+        "asyncssh": ["asyncssh>=2.13"],
     },
     license=about["__license__"],
     zip_safe=True,
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+from threading import Event
+from typing import Optional
+from unittest import mock
+
+BASTION_SESSION_ID = "ocid1.bastionsession.test"
+
+
+def free_port() -> int:
+    """
+    Port nothing listens on, for tunnels to bind or for probes that should fail
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_bastion_server(client_key, connections: Optional[list] = None) -> tuple:
+    """
+    Starts local asyncssh server standing in for bastion and echo server standing in
+    for target, server accepts client_key of BASTION_SESSION_ID and allows forwarding
+    @param connections: Server connections are appended to it
+    @return: (ssh server, echo server)
+    """
+    import asyncssh
+    authorized = asyncssh.import_authorized_keys(client_key.export_public_key().decode())
+
+    class BastionServer(asyncssh.SSHServer):
+        def connection_made(self, conn):
+            if connections is not None:
+                connections.append(conn)
+
+        def begin_auth(self, username):
+            return True
+
+        def public_key_auth_supported(self):
+            return True
+
+        def validate_public_key(self, username, key):
+            return username == BASTION_SESSION_ID and \
+                authorized.validate(key, "127.0.0.1", "127.0.0.1") is not None
+
+        def connection_requested(self, dest_host, dest_port, orig_host, orig_port):
+            return True
+
+    async def echo(reader, writer):
+        writer.write(await reader.read(100))
+        await writer.drain()
+        writer.close()
+
+    echo_server = await asyncio.start_server(echo, "127.0.0.1", 0)
+    ssh_server = await asyncssh.create_server(
+        BastionServer, "127.0.0.1", 0, server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")])
+    return ssh_server, echo_server
+
+
+def server_port(server) -> int:
+    return server.sockets[0].getsockname()[1]
+
+
+def mock_bastion(name: str = "default", connected: bool = False,
+                 returncode: Optional[int] = None, **attributes) -> mock.Mock:
+    """
+    Mock of Bastion with real health and reconnect state
+    @param returncode: What poll of active tunnel returns
+    """
+    from abst.bastion_support.health_prober import LatencyStats
+    from abst.bastion_support.reconnect import Reconnector
+    bastion = mock.Mock(**{"connected": connected, "ssh_engine": "openssh", "control_master": False,
+                           "relay": None, "forward_target": None, "health": LatencyStats(),
+                           "reconnect": Reconnector(), **attributes})
+    bastion.get_print_name.return_value = name
+    bastion.active_tunnel.poll.return_value = returncode
+    return bastion
+
+
+def patch_temp_path(case: unittest.TestCase, target, attribute: str,
+                    name: Optional[str] = None) -> Path:
+    """
+    Points path attribute of target into temporary directory for duration of test
+    @param name: File name inside temporary directory, directory itself if None
+    @return: Patched path
+    """
+    tmp = tempfile.TemporaryDirectory()
+    case.addCleanup(tmp.cleanup)
+    path = Path(tmp.name) if name is None else Path(tmp.name) / name
+    patcher = mock.patch.object(target, attribute, path)
+    patcher.start()
+    case.addCleanup(patcher.stop)
+    return path
+
+
+def bare_bastion(name: str = "ctx", **attributes):
+    """
+    Real Bastion without side effects of __init__, config file, broadcast and spans are mocks
+    """
+    from abst.bastion_support.health_prober import LatencyStats
+    from abst.bastion_support.oci_bastion import Bastion
+    from abst.bastion_support.reconnect import Reconnector
+    from abst.utils.ring_buffer import RingBuffer
+    bastion = Bastion.__new__(Bastion)
+    defaults = {"context_name": name, "region": None, "bid": None, "response": None,
+                "connected": False, "active_tunnel": None, "_current_status": None,
+                "reconnect": Reconnector(), "health": LatencyStats(), "ssh_output": RingBuffer(1024),
+                "ssh_engine": "openssh", "control_master": False, "relay": None,
+                "forward_target": None, "ssh_tunnel_arg_str": "ssh", "rotating": Event(),
+                "rotated_bastion_id": None, "admitted_bastion_id": None, "creating": False,
+                "create_started": None, "phase_timings": dict(), "spans": mock.Mock(), "lb": mock.Mock()}
+    bastion.__dict__.update({**defaults, **attributes})
+    return bastion
@@ -0,0 +1,136 @@
+import asyncio
+import unittest
+from threading import Thread
+from time import monotonic
+from unittest import mock
+
+from abst.bastion_support.admission import AdmissionController
+from abst.bastion_support.bastion_scheduler import BastionScheduler
+from abst.bastion_support.oci_bastion import Bastion
+from helpers import bare_bastion
+
+
+class AdmissionControllerCase(unittest.TestCase):
+    def test_global_creation_limit(self):
+        admission = AdmissionController(max_creations=2, stagger=0)
+        self.assertIsNone(admission.try_admit("bastion-a"))
+        self.assertIsNone(admission.try_admit("bastion-b"))
+        self.assertIsNotNone(admission.try_admit("bastion-c"))
+        admission.created()
+        self.assertIsNone(admission.try_admit("bastion-c"))
+        self.assertEqual(admission.creating, 2)
+
+    def test_per_bastion_session_cap(self):
+        admission = AdmissionController(max_creations=0, max_sessions=1, stagger=0)
+        self.assertIsNone(admission.try_admit("bastion-a"))
+        admission.created()
+        # Session is still used after its creation finished
+        self.assertIsNotNone(admission.try_admit("bastion-a"))
+        self.assertIsNone(admission.try_admit("bastion-b"))
+        admission.released("bastion-a")
+        self.assertIsNone(admission.try_admit("bastion-a"))
+        self.assertEqual(admission.sessions, {"bastion-a": 1, "bastion-b": 1})
+
+    def test_stagger(self):
+        admission = AdmissionController(max_creations=0, stagger=0.2)
+        start = monotonic()
+        for _ in range(3):
+            self.assertTrue(admission.admit("bastion-a"))
+        self.assertGreaterEqual(monotonic() - start, 0.35)
+
+    def test_queued_context_is_admitted_on_release(self):
+        admission = AdmissionController(max_creations=1, stagger=0)
+        admission.admit("bastion-a")
+        queued = []
+        waiter = Thread(target=admission.admit, args=["bastion-b", lambda: queued.append(True)])
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        admission.created()
+        waiter.join(2)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(queued, [True])
+
+    def test_stopped_while_queued(self):
+        admission = AdmissionController(max_creations=1, stagger=0)
+        admission.admit("bastion-a")
+        self.assertFalse(admission.admit("bastion-b", stopped=lambda: True))
+        self.assertEqual(admission.creating, 1)
+
+    def test_admit_async(self):
+        admission = AdmissionController(max_creations=1, stagger=0)
+
+        async def run():
+            await admission.admit_async("bastion-a")
+            waiting = asyncio.ensure_future(admission.admit_async("bastion-b"))
+            await asyncio.sleep(0.1)
+            self.assertFalse(waiting.done())
+            admission.created()
+            return await asyncio.wait_for(waiting, 2)
+
+        self.assertTrue(asyncio.run(run()))
+
+    def test_from_config(self):
+        admission = AdmissionController.from_config({"max-concurrent-creations": "3",
+                                                     "max-sessions-per-bastion": 10,
+                                                     "startup-stagger": "1.5"})
+        self.assertEqual((admission.max_creations, admission.max_sessions, admission.stagger),
+                         (3, 10, 1.5))
+
+
+class BastionAdmissionCase(unittest.TestCase):
+    """
+    Slots taken by admit_session are returned on every failed creation of forward loop
+    """
+
+    def setUp(self):
+        self.admission = AdmissionController(max_creations=1, max_sessions=1, stagger=0)
+        for target, attribute, value in ((Bastion, "admission", self.admission),
+                                         (Bastion, "stopped", False),
+                                         (BastionScheduler, "stopped", False)):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Terminal title needs real terminal
+        patcher = mock.patch("bext.title")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bastion = bastion = bare_bastion()
+        bastion.load_self_creds = mock.Mock(return_value={"bastion-id": "bastion-a",
+                                                          "resource-os-username": "opc"})
+        bastion.configure_reconnect = mock.Mock()
+        bastion.create_bastion_forward_port_session = mock.Mock(
+            return_value=("host", "10.0.0.1", 22, "key.pub", "{}"))
+        bastion.load_response = mock.Mock(return_value=("ocid1.bastionsession.a", {}))
+        bastion.wait_for_prepared = mock.Mock(return_value=True)
+        bastion.discard_session = mock.Mock()
+        # Every failure ends the context, so forward loop runs only once
+        bastion.schedule_reconnect = mock.Mock(side_effect=bastion.reconnect.give_up)
+
+    def run_forward_loop(self):
+        BastionScheduler._run_indefinitely(self.bastion)
+        self.bastion.create_bastion_forward_port_session.assert_called_once()
+        self.assertEqual(self.admission.creating, 0)
+        self.assertEqual(self.admission.sessions, {})
+        self.assertIsNone(self.admission.try_admit("bastion-a"))
+
+    def test_session_not_created(self):
+        self.bastion.load_response.return_value = (None, "error")
+        self.run_forward_loop()
+        self.bastion.schedule_reconnect.assert_called_once()
+
+    def test_creation_raised(self):
+        self.bastion.create_bastion_forward_port_session.side_effect = RuntimeError("boom")
+        self.run_forward_loop()
+        self.bastion.schedule_reconnect.assert_called_once()
+
+    def test_session_not_prepared(self):
+        self.bastion.wait_for_prepared.return_value = False
+        self.bastion.discard_session.side_effect = lambda bid: self.bastion.reconnect.give_up(bid)
+        self.run_forward_loop()
+        self.bastion.discard_session.assert_called_once_with("ocid1.bastionsession.a")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import asyncio
+import unittest
+
+from abst.bastion_support.async_scheduler import AsyncBastionScheduler
+from helpers import mock_bastion
+
+
+class AsyncSchedulerCase(unittest.TestCase):
+    def make_bastion(self, command: str):
+        bastion = mock_bastion()
+        bastion.process_args.return_value = ["sh", "-c", command]
+        bastion.process_ssh_line.side_effect = lambda line: "Permission denied" not in line
+        return bastion
+
+    def test_run_ssh_tunnel_reads_output(self):
+        bastion = self.make_bastion("echo first; echo 'debug1: pledge: network'; exit 3")
+        scheduler = AsyncBastionScheduler([bastion])
+
+        self.assertTrue(asyncio.run(scheduler.run_ssh_tunnel(bastion)))
+        lines = [call.args[0] for call in bastion.process_ssh_line.call_args_list]
+        self.assertEqual(lines, ["first", "debug1: pledge: network"])
+        bastion.process_ssh_exit.assert_called_once_with(3)
+        self.assertEqual(bastion.active_tunnel.poll(), 3)
+
+    def test_run_ssh_tunnel_auth_failure(self):
+        bastion = self.make_bastion("echo 'Permission denied (publickey)'; exec sleep 10")
+        scheduler = AsyncBastionScheduler([bastion])
+
+        self.assertFalse(asyncio.run(asyncio.wait_for(scheduler.run_ssh_tunnel(bastion), 5)))
+        bastion.process_ssh_exit.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+
+from abst.bastion_support.asyncssh_forwarder import AsyncSSHForwarder, is_asyncssh_available
+from helpers import BASTION_SESSION_ID, free_port, server_port, start_bastion_server
+
+
+@unittest.skipUnless(is_asyncssh_available(), "asyncssh is not installed")
+class AsyncSSHForwarderCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Forwards through local asyncssh server standing in for bastion
+    """
+
+    async def asyncSetUp(self):
+        import asyncssh
+        self.tmp = tempfile.TemporaryDirectory()
+        client_key = asyncssh.generate_private_key("ssh-ed25519")
+        self.key_path = Path(self.tmp.name) / "id_ed25519"
+        client_key.write_private_key(str(self.key_path))
+        self.other_key_path = Path(self.tmp.name) / "other"
+        asyncssh.generate_private_key("ssh-ed25519").write_private_key(str(self.other_key_path))
+        self.ssh_server, self.echo_server = await start_bastion_server(client_key)
+        self.echo_port = server_port(self.echo_server)
+        self.ssh_port = server_port(self.ssh_server)
+
+    async def asyncTearDown(self):
+        self.ssh_server.close()
+        self.echo_server.close()
+        self.tmp.cleanup()
+
+    def forwarder(self, key_path: Path, events: list) -> AsyncSSHForwarder:
+        return AsyncSSHForwarder("127.0.0.1", BASTION_SESSION_ID, str(key_path),
+                                 free_port(), "127.0.0.1", self.echo_port, port=self.ssh_port,
+                                 verify_host_key=False,
+                                 on_event=lambda event, detail: events.append(event))
+
+    async def test_forwards_local_port(self):
+        events = []
+        forwarder = self.forwarder(self.key_path, events)
+        task = asyncio.create_task(forwarder.run())
+        while "listening" not in events:
+            self.assertFalse(task.done())
+            await asyncio.sleep(0.01)
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", forwarder.local_port)
+        writer.write(b"ping")
+        self.assertEqual(await reader.read(100), b"ping")
+        writer.close()
+        self.assertIsNone(forwarder.poll())
+
+        forwarder.close()
+        self.assertTrue(await asyncio.wait_for(task, 5))
+        self.assertEqual(events, ["connecting", "authenticated", "listening", "closed"])
+        self.assertEqual(forwarder.poll(), 0)
+
+    async def test_rejected_key(self):
+        events = []
+        forwarder = self.forwarder(self.other_key_path, events)
+        self.assertFalse(await asyncio.wait_for(forwarder.run(), 5))
+        self.assertEqual(events, ["connecting", "auth_failed"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import subprocess
+import sys
+import unittest
+from queue import Queue, Empty
+from threading import Timer
+from unittest import mock
+
+from abst.cli_commands.ssh_cli.utils import find_connected
+from abst.sharing.local_broadcast import LocalBroadcast
+from abst.sharing.watchers import InotifyWatcher, PollingWatcher
+from helpers import patch_temp_path
+
+WRITER_SCRIPT = """
+import sys
+from pathlib import Path
+from abst.sharing.local_broadcast import LocalBroadcast
+LocalBroadcast._base_dir = Path(sys.argv[1])
+LocalBroadcast("lb_sub").store_json("db", {"status": "connected", "port": 2222})
+"""
+
+
+class BroadcastSubscriptionCase(unittest.TestCase):
+    backend = "memory"
+    watch = "inotify"
+
+    def setUp(self):
+        self.base_dir = patch_temp_path(self, LocalBroadcast, "_base_dir")
+        patcher = mock.patch.dict(os.environ, {"ABST_SHARED_BACKEND": self.backend,
+                                               "ABST_SHARED_WATCH": self.watch})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lb = LocalBroadcast("lb_sub")
+        self.addCleanup(self.lb.close)
+        self.events = Queue()
+
+    def subscribe(self, context=None):
+        kwargs = {} if context is None else {"context": context}
+        subscription = self.lb.subscribe(lambda *event: self.events.put(event), safety_interval=5,
+                                         **kwargs)
+        self.addCleanup(subscription.close)
+        return subscription
+
+    def next_event(self):
+        # Well below safety interval, so event had to wake subscription up
+        return self.events.get(timeout=2)
+
+    def test_delivers_changes_of_context(self):
+        self.subscribe()
+        self.lb.store_json("db", {"status": "digging tunnel"})
+        self.assertEqual(("db", {"status": "digging tunnel"}), self.next_event())
+        self.lb.store_json("db", {"status": "connected"})
+        self.assertEqual(("db", {"status": "connected"}), self.next_event())
+        self.lb.delete_context("db")
+        self.assertEqual(("db", None), self.next_event())
+
+    def test_filters_context(self):
+        self.subscribe("db")
+        self.lb.store_json("web", {"status": "connected"})
+        self.lb.store_json("db", {"status": "connected"})
+        self.assertEqual(("db", {"status": "connected"}), self.next_event())
+        with self.assertRaises(Empty):
+            self.events.get(timeout=0.3)
+
+    def test_unchanged_write_is_not_delivered(self):
+        self.lb.store_json("db", {"status": "connected"})
+        self.subscribe()
+        self.lb.store_json("db", {"status": "connected"})
+        with self.assertRaises(Empty):
+            self.events.get(timeout=0.3)
+
+    def test_change_of_other_process(self):
+        self.subscribe()
+        subprocess.run([sys.executable, "-c", WRITER_SCRIPT, str(self.base_dir)], check=True,
+                       env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)})
+        self.assertEqual(("db", {"status": "connected", "port": 2222}), self.next_event())
+
+    def test_wait_for(self):
+        Timer(0.2, self.lb.store_json, args=["db", {"status": "connected", "username": "opc",
+                                                    "port": 2222}]).start()
+        self.assertTrue(self.lb.wait_for(lambda data: find_connected(data, name="d") == ["db"], 3))
+        self.assertFalse(self.lb.wait_for(lambda data: "web" in data, 0.2))
+
+
+class FileBackendSubscriptionCase(BroadcastSubscriptionCase):
+    backend = "file"
+
+
+class PollingSubscriptionCase(BroadcastSubscriptionCase):
+    watch = "poll"
+
+    def test_watcher_type(self):
+        self.assertIsInstance(self.lb.create_watcher(), PollingWatcher)
+
+
+@unittest.skipUnless(InotifyWatcher.load_libc(), "inotify is Linux only")
+class InotifyWatcherCase(unittest.TestCase):
+    def test_watcher_type(self):
+        patch_temp_path(self, LocalBroadcast, "_base_dir")
+        lb = LocalBroadcast("lb_sub")
+        try:
+            watcher = lb.create_watcher()
+            self.assertIsInstance(watcher, InotifyWatcher)
+            self.assertFalse(watcher.wait(0.05))
+            lb.store_json("db", {"status": "connected"})
+            self.assertTrue(watcher.wait(1))
+            watcher.close()
+        finally:
+            lb.close()
+
+
+class FindConnectedCase(unittest.TestCase):
+    def test_requires_connected_status_and_ssh_details(self):
+        data = {"db-prod": {"status": "connected", "username": "opc", "port": 2222},
+                "db-test": {"status": "digging tunnel", "username": "opc", "port": 2223},
+                "web": {"status": "connected", "port": 8080}}
+        self.assertEqual(["db-prod"], find_connected(data, name="db"))
+        self.assertEqual([], find_connected(data, port="8080"))
+        self.assertEqual(["db-prod"], find_connected(data, port="2222"))
+
+
+if __name__ == '__main__':
+    unittest.main()
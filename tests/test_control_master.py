@@ -0,0 +1,115 @@
+import asyncio
+import shutil
+import socket
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from threading import Thread
+from time import monotonic, sleep
+from unittest import mock
+
+from abst.bastion_support.asyncssh_forwarder import is_asyncssh_available
+from abst.bastion_support.control_master import ControlMaster, ControlMasterTunnel
+from abst.config import default_control_master_stop_timeout
+from helpers import BASTION_SESSION_ID, free_port, server_port, start_bastion_server
+
+
+@unittest.skipUnless(is_asyncssh_available() and shutil.which("ssh"),
+                     "asyncssh or ssh client is not installed")
+class ControlMasterCase(unittest.TestCase):
+    """
+    Runs OpenSSH control master against local asyncssh server standing in for bastion
+    """
+    ssh_options = "-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o LogLevel=ERROR"
+
+    def setUp(self):
+        import asyncssh
+        self.tmp = tempfile.TemporaryDirectory()
+        self.key_path = Path(self.tmp.name) / "id_ed25519"
+        client_key = asyncssh.generate_private_key("ssh-ed25519")
+        client_key.write_private_key(str(self.key_path))
+        self.key_path.chmod(0o600)
+        self.connections = []
+
+        async def start():
+            self.ssh_server, self.echo_server = await start_bastion_server(client_key,
+                                                                           self.connections)
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(start())
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        self.echo_port = server_port(self.echo_server)
+        self.ssh_port = server_port(self.ssh_server)
+
+        patcher = mock.patch.object(ControlMaster, "socket_dir", Path(self.tmp.name) / "cm")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.ssh_server.close)
+        self.loop.call_soon_threadsafe(self.echo_server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.tmp.cleanup()
+
+    def make_master(self, key_path: Path) -> ControlMaster:
+        master = ControlMaster(BASTION_SESSION_ID, "127.0.0.1", str(key_path),
+                               self.ssh_options, port=self.ssh_port)
+        self.addCleanup(master.stop)
+        return master
+
+    def test_forwards_share_master_connection(self):
+        master = self.make_master(self.key_path)
+        self.assertTrue(master.start())
+
+        for _ in range(2):
+            local_port = free_port()
+            spec = f"{local_port}:127.0.0.1:{self.echo_port}"
+            self.assertTrue(master.forward(spec))
+            with socket.create_connection(("127.0.0.1", local_port), timeout=5) as sock:
+                sock.sendall(b"ping")
+                self.assertEqual(sock.recv(100), b"ping")
+
+            tunnel = ControlMasterTunnel(master, spec)
+            self.assertIsNone(tunnel.poll())
+            tunnel.send_signal(None)
+            self.assertEqual(tunnel.wait(), 0)
+
+        # Reconnected forward did not need another handshake
+        self.assertEqual(len(self.connections), 1)
+
+        master.stop()
+        self.assertFalse(master.is_alive())
+        self.assertFalse(master.socket_path.exists())
+
+    def test_rejected_key(self):
+        import asyncssh
+        other_key = Path(self.tmp.name) / "other"
+        asyncssh.generate_private_key("ssh-ed25519").write_private_key(str(other_key))
+        other_key.chmod(0o600)
+
+        master = self.make_master(other_key)
+        self.assertFalse(master.start())
+        self.assertTrue(master.auth_failed)
+        self.assertIn("Permission denied", master.output.getvalue())
+
+
+class ControlMasterStopCase(unittest.TestCase):
+    def test_stalled_master_is_stopped_quickly(self):
+        master = ControlMaster(BASTION_SESSION_ID, "127.0.0.1", "key")
+        # Master which neither answers control commands nor ends on SIGTERM
+        master.process = subprocess.Popen(["sh", "-c", 'trap "" TERM; exec sleep 30'])
+        self.addCleanup(master.process.kill)
+        timeouts = []
+        master.control = lambda command, timeout: timeouts.append(timeout) or sleep(timeout) or False
+
+        started = monotonic()
+        master.stop()
+
+        self.assertLess(monotonic() - started, 3 * default_control_master_stop_timeout + 1)
+        self.assertEqual(timeouts, [default_control_master_stop_timeout])
+        self.assertFalse(master.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import socket
+import time
+import unittest
+from threading import Event
+from unittest import mock
+
+from abst.bastion_support.health_prober import HealthProber, LatencyStats
+from helpers import free_port, mock_bastion
+
+
+class LatencyStatsCase(unittest.TestCase):
+    def test_percentiles(self):
+        stats = LatencyStats(window=100)
+        self.assertIsNone(stats.percentile(50))
+        self.assertEqual(stats.summary(), "-")
+        for latency in range(1, 101):
+            stats.record(latency / 1000)
+        self.assertEqual(stats.percentile(50), 0.05)
+        self.assertEqual(stats.percentile(95), 0.095)
+        self.assertEqual(stats.percentile(100), 0.1)
+        self.assertEqual(stats.summary(), "50.0/95.0 ms")
+
+    def test_failures(self):
+        stats = LatencyStats(window=2)
+        stats.record(None)
+        stats.record(None)
+        self.assertEqual(stats.consecutive_failures, 2)
+        stats.record(0.3)
+        stats.record(0.1)
+        stats.record(0.2)
+        self.assertEqual((stats.probes, stats.failures, stats.consecutive_failures), (5, 2, 0))
+        # Only last window latencies are kept
+        self.assertEqual(stats.percentile(100), 0.2)
+
+
+class HealthProberCase(unittest.TestCase):
+    def bastion(self, port: int):
+        return mock_bastion(connected=True, forward_target={"local_port": port},
+                            tunnel_readiness="tcp")
+
+    def test_records_latency(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            sock.listen()
+            bastion = self.bastion(sock.getsockname()[1])
+            HealthProber(lambda: [bastion], timeout=1).probe(bastion)
+        self.assertEqual(bastion.health.probes, 1)
+        self.assertIsNotNone(bastion.health.percentile(50))
+        bastion.force_reconnect.assert_not_called()
+
+    def test_reconnects_after_failures(self):
+        bastion = self.bastion(free_port())
+        prober = HealthProber(lambda: [bastion], timeout=1, failure_threshold=3)
+        for _ in range(2):
+            prober.probe(bastion)
+        bastion.force_reconnect.assert_not_called()
+        prober.probe(bastion)
+        bastion.force_reconnect.assert_called_once()
+        self.assertEqual(bastion.health.consecutive_failures, 0)
+        self.assertEqual(bastion.health.failures, 3)
+
+    def test_skips_disconnected(self):
+        bastion = self.bastion(1)
+        bastion.connected = False
+        HealthProber(lambda: [bastion]).probe(bastion)
+        self.assertEqual(bastion.health.probes, 0)
+
+    def test_auto_probe_waits_for_banner_of_ssh_target(self):
+        bastion = self.bastion(1)
+        self.assertFalse(HealthProber(lambda: [], mode="auto").uses_handshake(bastion))
+        self.assertFalse(HealthProber(lambda: [], mode="tcp").uses_handshake(bastion))
+        self.assertTrue(HealthProber(lambda: [], mode="ssh-banner").uses_handshake(bastion))
+        bastion.forward_target["target_port"] = 22
+        self.assertTrue(HealthProber(lambda: [], mode="auto").uses_handshake(bastion))
+
+    def test_silent_listener_fails_banner_probe(self):
+        # Stalled ssh still accepts on local port but target never answers
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            sock.listen()
+            bastion = self.bastion(sock.getsockname()[1])
+            bastion.forward_target["target_port"] = 22
+            HealthProber(lambda: [bastion], timeout=0.2).probe(bastion)
+        self.assertEqual(bastion.health.failures, 1)
+
+    def test_slow_probe_does_not_delay_others(self):
+        slow, fast = self.bastion(1), self.bastion(2)
+        release = Event()
+        self.addCleanup(release.set)
+        prober = HealthProber(lambda: [slow, fast], timeout=0.2)
+        probed = []
+
+        def probe(bastion):
+            if bastion is slow:
+                release.wait(5)
+            probed.append(bastion)
+
+        with mock.patch.object(prober, "probe", side_effect=probe) as probe_mock:
+            started = time.monotonic()
+            prober.probe_round()
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertEqual(probed, [fast])
+
+            # Slow probe still running is not started again
+            prober.probe_round()
+            self.assertEqual(probed, [fast, fast])
+            self.assertEqual(probe_mock.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
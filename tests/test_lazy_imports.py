@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+CHECK_SCRIPT = """
+import sys
+from click.testing import CliRunner
+from abst.bastion_support.oci_bastion import Bastion
+from abst.main import cli
+
+Bastion.create_default_locations()
+for args in (["ssh"], ["ctx", "list"], ["ctx", "display", "missing"], ["ctx", "locate"],
+             ["pl", "display"], ["stats"]):
+    result = CliRunner().invoke(cli, args)
+    assert result.exception is None, (args, result.exception)
+    heavy = [module for module in ("oci", "InquirerPy", "lastversion", "pyperclip", "bext")
+             if module in sys.modules]
+    assert not heavy, (args, heavy)
+"""
+
+
+class LazyImportsCase(unittest.TestCase):
+    def test_light_commands_do_not_import_sdk(self):
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home)
+            result = subprocess.run([sys.executable, "-c", CHECK_SCRIPT], env=env,
+                                    capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,301 @@
+import os
+import struct
+import subprocess
+import sys
+import unittest
+from threading import Thread, Event
+from time import monotonic, sleep, time
+from unittest import mock
+
+from abst.sharing.local_broadcast import LocalBroadcast, FileBackend, SharedMemoryBackend
+from helpers import patch_temp_path
+
+WRITER_SCRIPT = """
+import sys
+from pathlib import Path
+from abst.sharing.local_broadcast import LocalBroadcast
+LocalBroadcast._base_dir = Path(sys.argv[1])
+lb = LocalBroadcast("lb_test", 64 * 1024)
+for i in range(200):
+    lb.store_json(sys.argv[2], {"status": f"status {i}", "counter": i})
+"""
+
+
+class LocalBroadcastCase(unittest.TestCase):
+    def setUp(self):
+        self.base_dir = patch_temp_path(self, LocalBroadcast, "_base_dir")
+
+    def broadcast(self, name: str = "lb_test", size: int = 64 * 1024) -> LocalBroadcast:
+        lb = LocalBroadcast(name, size)
+        self.addCleanup(lb.close)
+        return lb
+
+    def check_contexts(self, lb: LocalBroadcast):
+        lb.store_json(None, {"status": "creating", "port": 2222, "timings": {"active": 1}})
+        lb.store_json(None, {"status": "connected", "timings": {"tunnel": 2}})
+        lb.store_json("db", {"status": "connected"})
+        self.assertEqual(lb.retrieve_json(None), {"status": "connected", "port": 2222,
+                                                  "timings": {"active": 1, "tunnel": 2}})
+        self.assertEqual(set(lb.list_contents().keys()), {"None", "db"})
+        lb.delete_context("db")
+        self.assertEqual(lb.retrieve_json("db"), {})
+        self.assertEqual(list(lb.retrieve_json().keys()), ["None"])
+
+    def test_shared_memory_backend(self):
+        lb = self.broadcast()
+        self.assertIsInstance(lb.backend, SharedMemoryBackend)
+        self.check_contexts(lb)
+
+    def test_file_backend(self):
+        with mock.patch.dict(os.environ, {"ABST_SHARED_BACKEND": "file"}):
+            lb = self.broadcast()
+        self.assertIsInstance(lb.backend, FileBackend)
+        self.check_contexts(lb)
+
+    def test_capacity_of_held_memory_is_kept(self):
+        lb = self.broadcast("lb_small", 1024)
+        lb.store_json("db", {"status": "connected"})
+        # Instance of other process
+        other = SharedMemoryBackend(self.base_dir, "lb_small", 64 * 1024)
+        self.addCleanup(other.close)
+        self.assertEqual(other.capacity, 1024)
+        self.assertEqual(other.retrieve("db"), {"status": "connected"})
+        with self.assertRaises(ValueError):
+            other.store("db", {"key": "x" * 2000})
+
+    def test_memory_nobody_holds_starts_empty(self):
+        lb = self.broadcast("lb_small", 1024)
+        lb.store_json("db", {"status": "connected"})
+        lb.close()
+
+        lb = self.broadcast("lb_small", 64 * 1024)
+        self.assertEqual(lb.backend.capacity, 64 * 1024)
+        self.assertEqual(lb.list_contents(), {})
+
+    def test_corrupted_memory_is_reinitialized(self):
+        (self.base_dir / "lb_broken.shm").write_bytes(b"garbage")
+        lb = self.broadcast("lb_broken", 1024)
+        self.assertEqual(lb.list_contents(), {})
+
+    def tear_document(self, backend: SharedMemoryBackend):
+        # Writer killed after it made sequence odd and wrote part of payload
+        seq = backend.version()
+        struct.pack_into("<Q", backend._mm, backend.SEQ_OFFSET, seq + 1)
+        backend._mm[backend.HEADER.size:backend.HEADER.size + 8] = b'{"db": ['
+
+    def test_torn_document_recovers_on_read(self):
+        lb = self.broadcast()
+        lb.store_json("db", {"status": "connected"})
+        self.tear_document(lb.backend)
+
+        self.assertEqual(lb.list_contents(), {})
+        self.assertEqual(lb.backend.version() % 2, 0)
+        lb.store_json("web", {"status": "connected"})
+        self.assertEqual(lb.list_contents(), {"web": {"status": "connected"}})
+
+    def test_torn_document_recovers_on_update(self):
+        lb = self.broadcast()
+        lb.store_json("db", {"status": "connected"})
+        self.tear_document(lb.backend)
+        # Sequence made even again, payload stays broken
+        struct.pack_into("<Q", lb.backend._mm, lb.backend.SEQ_OFFSET, lb.backend.version() + 1)
+
+        lb.store_json("web", {"status": "connected"})
+        self.assertEqual(lb.backend.version() % 2, 0)
+        self.assertEqual(lb.list_contents(), {"web": {"status": "connected"}})
+        self.assertEqual(lb.backend.remove_if(lambda data: True), ["web"])
+
+    def test_publish_coalesces_updates(self):
+        lb = self.broadcast()
+        # Only explicit flush writes
+        lb.flush_interval = 60
+        with mock.patch.object(lb.backend, "store_many", wraps=lb.backend.store_many) as store:
+            for i in range(50):
+                lb.publish("db", {"status": f"reconnecting {i}", "timings": {f"phase{i % 2}": i}})
+            lb.publish(None, {"status": "connected"})
+            # Own updates are visible before they are written
+            self.assertEqual(lb.retrieve_json("db")["status"], "reconnecting 49")
+            self.assertEqual(lb.backend.retrieve("db"), {})
+            lb.flush()
+        store.assert_called_once()
+        self.assertEqual(lb.backend.list(), {
+            "db": {"status": "reconnecting 49", "timings": {"phase0": 48, "phase1": 49}},
+            "None": {"status": "connected"}})
+
+    def test_publish_is_written_by_background_thread(self):
+        lb = self.broadcast()
+        lb.flush_interval = 0.01
+        lb.publish("db", {"status": "connected"})
+        deadline = monotonic() + 5
+        while lb.backend.retrieve("db") == {} and monotonic() < deadline:
+            sleep(0.01)
+        self.assertEqual(lb.backend.retrieve("db"), {"status": "connected"})
+
+    def test_delete_drops_pending_update(self):
+        lb = self.broadcast()
+        lb.publish("db", {"status": "connected"})
+        lb.delete_context("db")
+        lb.flush()
+        self.assertEqual(lb.list_contents(), {})
+
+    def test_file_backend_replaces_files_atomically(self):
+        backend = FileBackend(self.base_dir, "lb_files")
+        with mock.patch("abst.sharing.local_broadcast.os.replace",
+                        side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                backend.store("db", {"status": "connected"})
+        self.assertEqual(list(self.base_dir.iterdir()), [])
+        backend.store("db", {"status": "connected"})
+        self.assertEqual([path.name for path in self.base_dir.iterdir()], ["lb_files_db.json"])
+
+    def test_concurrent_threads(self):
+        lb = self.broadcast("lb_threads", 256 * 1024)
+        stop = Event()
+        errors = []
+
+        def read():
+            while not stop.is_set():
+                try:
+                    lb.list_contents()
+                except Exception as ex:
+                    errors.append(ex)
+
+        def write(writer: int):
+            for i in range(500):
+                lb.store_json("shared", {f"key{writer}_{i}": i})
+
+        # Frequent thread switches make writers interleave inside read-modify-write
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        reader = Thread(target=read, daemon=True)
+        reader.start()
+        writers = [Thread(target=write, args=[writer]) for writer in range(4)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        stop.set()
+        reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(lb.retrieve_json("shared")), 2000)
+
+    def test_concurrent_processes(self):
+        lb = self.broadcast()
+        stop = Event()
+        errors = []
+
+        def read():
+            while not stop.is_set():
+                try:
+                    lb.list_contents()
+                except Exception as ex:
+                    errors.append(ex)
+
+        reader = Thread(target=read, daemon=True)
+        reader.start()
+        env = dict(os.environ, PYTHONPATH=os.getcwd())
+        writers = [subprocess.Popen([sys.executable, "-c", WRITER_SCRIPT, str(self.base_dir),
+                                     f"ctx{i}"], env=env) for i in range(4)]
+        for writer in writers:
+            self.assertEqual(writer.wait(60), 0)
+        stop.set()
+        reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(lb.list_contents(), {f"ctx{i}": {"status": "status 199", "counter": 199}
+                                              for i in range(4)})
+
+
+class LeaseCase(unittest.TestCase):
+    def setUp(self):
+        patch_temp_path(self, LocalBroadcast, "_base_dir")
+        self.lb = LocalBroadcast("lb_lease", 64 * 1024)
+        self.addCleanup(self.lb.close)
+        # Only explicit flush writes
+        self.lb.flush_interval = 60
+
+    def dead_pid(self) -> int:
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        return process.pid
+
+    def test_held_context_carries_owner_and_lease(self):
+        self.lb.hold_lease("db", {"region": "eu-frankfurt-1"})
+        self.lb.flush()
+        data = self.lb.backend.retrieve("db")
+        self.assertEqual(data["pid"], os.getpid())
+        self.assertAlmostEqual(data["lease-until"], time() + self.lb.lease_ttl, delta=5)
+        self.assertEqual(self.lb.list_contents()["db"]["region"], "eu-frankfurt-1")
+
+    def test_expired_and_orphaned_contexts_are_skipped(self):
+        self.lb.store_json({"expired": {"pid": os.getpid(), "lease-until": time() - 1},
+                            "orphaned": {"pid": self.dead_pid(), "lease-until": time() + 60},
+                            "live": {"pid": os.getpid(), "lease-until": time() + 60},
+                            "plain": {"status": "connected"}})
+        self.assertEqual(sorted(self.lb.list_contents().keys()), ["live", "plain"])
+        self.assertEqual(self.lb.retrieve_json("expired"), {})
+        self.assertEqual(self.lb.retrieve_json("orphaned"), {})
+
+    def test_sweep_removes_stale_contexts(self):
+        self.lb.store_json({"orphaned": {"pid": self.dead_pid(), "lease-until": time() + 60},
+                            "asleep": {"pid": os.getpid(), "lease-until": time() - 1},
+                            "abandoned": {"pid": os.getpid(),
+                                          "lease-until": time() - self.lb.lease_grace - 1},
+                            "plain": {"status": "connected"}})
+        self.assertEqual(sorted(self.lb.sweep()), ["abandoned", "orphaned"])
+        self.assertEqual(sorted(self.lb.backend.list().keys()), ["asleep", "plain"])
+        with mock.patch.object(self.lb.backend, "store_many") as store:
+            self.assertEqual(self.lb.sweep(), [])
+        store.assert_not_called()
+
+    def test_listing_does_not_write(self):
+        self.lb.store_json("orphaned", {"pid": self.dead_pid(), "lease-until": time() + 60})
+        with mock.patch.object(self.lb.backend, "remove_if") as remove_if:
+            self.assertEqual(self.lb.list_contents(), {})
+        remove_if.assert_not_called()
+        self.assertIn("orphaned", self.lb.backend.list())
+
+    def test_background_thread_sweeps(self):
+        self.lb.store_json("orphaned", {"pid": self.dead_pid(), "lease-until": time() + 60})
+        self.lb.lease_ttl = 0.3
+        self.lb.flush_interval = 0.01
+        self.lb.hold_lease("db")
+        deadline = monotonic() + 5
+        while "orphaned" in self.lb.backend.list() and monotonic() < deadline:
+            sleep(0.01)
+        self.assertEqual(list(self.lb.backend.list().keys()), ["db"])
+
+    def test_renewal_restores_swept_context(self):
+        self.lb.hold_lease("db", {"region": "eu-frankfurt-1"})
+        self.lb.publish("db", {"port": 2222, "status": "connected"})
+        self.lb.flush()
+        # Machine slept past lease and other process swept context
+        self.lb._leases["db"] = time() - 1
+        self.lb.backend.delete("db")
+        self.lb.renew_leases()
+        self.lb.flush()
+        data = self.lb.retrieve_json("db")
+        self.assertEqual((data["region"], data["port"], data["status"]),
+                         ("eu-frankfurt-1", 2222, "connected"))
+        self.assertGreater(data["lease-until"], time())
+
+    def test_leases_are_renewed_by_background_thread(self):
+        self.lb.lease_ttl = 0.3
+        self.lb.flush_interval = 0.01
+        self.lb.hold_lease("db")
+        sleep(1)
+        self.assertIn("db", self.lb.list_contents())
+        self.assertGreater(self.lb.backend.retrieve("db")["lease-until"], time())
+
+    def test_deleted_context_is_not_renewed(self):
+        self.lb.hold_lease("db")
+        self.lb.delete_context("db")
+        self.lb.renew_leases(force=True)
+        self.lb.flush()
+        self.assertEqual(self.lb.backend.list(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
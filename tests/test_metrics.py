@@ -0,0 +1,79 @@
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+from abst.bastion_support.metrics import Histogram, Metrics, MetricsExporter, \
+    OPENMETRICS_CONTENT_TYPE
+from abst.bastion_support.oci_clients import BastionClientRegistry
+from abst.bastion_support.rate_limit import ApiCallStats
+from helpers import mock_bastion
+
+
+def make_bastion(name: str, connected: bool):
+    return mock_bastion(name, connected, returncode=None if connected else 255)
+
+
+class HistogramCase(unittest.TestCase):
+    def test_cumulative_buckets(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        buckets, total, count = histogram.snapshot()
+        self.assertEqual(buckets, [(1, 2), (5, 3), (float("inf"), 4)])
+        self.assertEqual((total, count), (14.5, 4))
+
+
+class MetricsCase(unittest.TestCase):
+    def setUp(self):
+        Metrics.reset()
+        self.addCleanup(Metrics.reset)
+        stats = ApiCallStats()
+        stats.record("create_session", "calls")
+        stats.record("create_session", "errors")
+        patcher = mock.patch.object(BastionClientRegistry, "stats", stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render(self):
+        Metrics.observe("abst_session_create_seconds", "db", 0.7)
+        up, down = make_bastion("db", True), make_bastion('we"ird', False)
+        up.health.record(0.002)
+        up.reconnect.failed("tunnel closed")
+        text = Metrics.render([up, down], task_count=4)
+        lines = text.splitlines()
+
+        self.assertEqual(lines[-1], "# EOF")
+        self.assertIn('abst_session_create_seconds_bucket{context="db",le="0.5"} 0', lines)
+        self.assertIn('abst_session_create_seconds_bucket{context="db",le="1.0"} 1', lines)
+        self.assertIn('abst_session_create_seconds_bucket{context="db",le="+Inf"} 1', lines)
+        self.assertIn('abst_session_create_seconds_count{context="db"} 1', lines)
+        self.assertIn("# TYPE abst_connect_seconds histogram", lines)
+        self.assertIn('abst_tunnel_connected{context="db"} 1', lines)
+        self.assertIn('abst_tunnel_connected{context="we\\"ird"} 0', lines)
+        self.assertIn('abst_reconnects_total{context="db"} 1', lines)
+        self.assertIn('abst_probe_latency_seconds{context="db",quantile="0.5"} 0.002', lines)
+        self.assertIn('abst_oci_api_calls_total{operation="create_session",result="errors"} 1',
+                      lines)
+        self.assertIn("abst_ssh_processes 1", lines)
+        self.assertIn("abst_scheduler_tasks 4", lines)
+
+    def test_endpoint(self):
+        exporter = MetricsExporter(lambda: [make_bastion("db", True)], "127.0.0.1", 0)
+        self.assertTrue(exporter.start())
+        self.addCleanup(exporter.stop)
+
+        url = f"http://127.0.0.1:{exporter.port}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            self.assertEqual(response.headers["Content-Type"], OPENMETRICS_CONTENT_TYPE)
+            body = response.read().decode()
+        self.assertIn('abst_tunnel_connected{context="db"} 1', body)
+        self.assertNotIn("abst_scheduler_tasks", body)
+
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        self.assertEqual(raised.exception.code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from abst.bastion_support.oci_clients import BastionClientRegistry
+
+
+class ClientRegistryCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_path = Path(self.tmp.name) / "config"
+        self.config_path.write_text("[DEFAULT]\nregion=us-phoenix-1\n")
+        BastionClientRegistry.clear()
+        self.location = BastionClientRegistry.config_location
+        BastionClientRegistry.config_location = str(self.config_path)
+
+    def tearDown(self):
+        BastionClientRegistry.config_location = self.location
+        BastionClientRegistry.clear()
+        self.tmp.cleanup()
+
+    @mock.patch("oci.bastion.BastionClient")
+    @mock.patch("oci.config.from_file", return_value={"region": "us-phoenix-1"})
+    def test_client_reused_per_region(self, from_file, client_cls):
+        client_cls.side_effect = lambda config, **kwargs: mock.Mock(region=config["region"])
+
+        first = BastionClientRegistry.get_client()
+        self.assertIs(first, BastionClientRegistry.get_client())
+        other = BastionClientRegistry.get_client("eu-frankfurt-1")
+        self.assertIsNot(first, other)
+        self.assertEqual(other.region, "eu-frankfurt-1")
+        self.assertEqual(from_file.call_count, 1)
+        self.assertEqual(client_cls.call_count, 2)
+
+    @mock.patch("oci.bastion.BastionClient")
+    @mock.patch("oci.config.from_file", return_value={"region": "us-phoenix-1"})
+    def test_reload_on_config_change(self, from_file, client_cls):
+        client_cls.side_effect = lambda config, **kwargs: mock.Mock()
+
+        first = BastionClientRegistry.get_client()
+        stat = self.config_path.stat()
+        os.utime(self.config_path, (stat.st_atime, stat.st_mtime + 10))
+
+        self.assertIsNot(first, BastionClientRegistry.get_client())
+        self.assertEqual(from_file.call_count, 2)
+
+    @mock.patch("abst.bastion_support.oci_clients.sleep")
+    @mock.patch("oci.config.from_file", return_value={"region": "us-phoenix-1", "tenancy": "t"})
+    def test_call_retries_throttled(self, from_file, sleep):
+        from oci.exceptions import ServiceError
+        client = mock.Mock()
+        client.get_session.side_effect = [ServiceError(429, "TooManyRequests", {"Retry-After": "3"}, ""),
+                                          "session"]
+        with mock.patch.object(BastionClientRegistry, "get_client", return_value=client):
+            self.assertEqual(BastionClientRegistry.call("get_session", "sess"), "session")
+
+        self.assertGreaterEqual(sleep.call_args.args[0], 3)
+        counters = BastionClientRegistry.stats.snapshot()["get_session"]
+        self.assertGreaterEqual(counters["throttled"], 1)
+        self.assertGreaterEqual(counters["retries"], 1)
+
+    @mock.patch("abst.bastion_support.oci_clients.sleep")
+    @mock.patch("oci.config.from_file", return_value={"region": "us-phoenix-1"})
+    def test_call_does_not_retry_client_errors(self, from_file, sleep):
+        from oci.exceptions import ServiceError
+        client = mock.Mock()
+        client.get_session.side_effect = ServiceError(404, "NotFound", {}, "")
+        with mock.patch.object(BastionClientRegistry, "get_client", return_value=client):
+            with self.assertRaises(ServiceError):
+                BastionClientRegistry.call("get_session", "sess")
+        sleep.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
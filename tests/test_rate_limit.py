@@ -0,0 +1,29 @@
+import unittest
+from time import monotonic
+
+from abst.bastion_support.rate_limit import TokenBucket, backoff_delay, parse_retry_after
+
+
+class RateLimitCase(unittest.TestCase):
+    def test_bucket_burst_then_rate(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        self.assertEqual([bucket.reserve() for _ in range(5)], [0] * 5)
+        self.assertAlmostEqual(bucket.reserve(), 0.01, delta=0.005)
+
+        start = monotonic()
+        bucket.acquire()
+        self.assertGreater(monotonic() - start, 0.01)
+
+    def test_backoff_bounds(self):
+        for attempt in range(10):
+            self.assertLessEqual(backoff_delay(attempt, 0.5, 4), 4)
+        self.assertGreaterEqual(backoff_delay(0, 0.5, 4, retry_after=2), 2)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after({"retry-after": "7"}), 7)
+        self.assertIsNone(parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+        self.assertIsNone(parse_retry_after(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
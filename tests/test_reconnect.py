@@ -0,0 +1,93 @@
+import asyncio
+import gc
+import unittest
+from threading import Timer
+from time import monotonic
+
+from abst.bastion_support.reconnect import Reconnector, NetworkWatcher
+
+
+class ReconnectorCase(unittest.TestCase):
+    def test_backoff_grows_with_jitter_and_cap(self):
+        reconnector = Reconnector(initial_delay=1, max_delay=8, backoff_factor=2)
+        for attempt, base in enumerate([1, 2, 4, 8, 8], start=1):
+            delay = reconnector.failed("tunnel closed")
+            self.assertEqual(reconnector.attempts, attempt)
+            self.assertEqual(reconnector.state, Reconnector.BACKOFF)
+            self.assertTrue(base / 2 <= delay <= base, (attempt, delay))
+
+    def test_connected_resets_attempts(self):
+        reconnector = Reconnector(initial_delay=1, max_delay=60)
+        for _ in range(5):
+            reconnector.failed("tunnel closed")
+        reconnector.connecting()
+        reconnector.connected()
+        self.assertEqual(reconnector.state, Reconnector.CONNECTED)
+        self.assertLessEqual(reconnector.failed("tunnel closed"), 1)
+        self.assertEqual(reconnector.reconnects, 6)
+
+    def test_uptime_is_counted_while_connected(self):
+        reconnect = Reconnector()
+        self.assertIsNone(reconnect.uptime)
+        reconnect.connected()
+        self.assertGreaterEqual(reconnect.uptime, 0)
+        reconnect.failed("tunnel closed")
+        self.assertIsNone(reconnect.uptime)
+
+    def test_gives_up_after_max_attempts(self):
+        reconnector = Reconnector(max_attempts=2)
+        self.assertIsNotNone(reconnector.failed("a"))
+        self.assertIsNotNone(reconnector.failed("b"))
+        self.assertIsNone(reconnector.failed("c"))
+        self.assertTrue(reconnector.gave_up)
+        self.assertEqual(reconnector.last_error, "c")
+        reconnector.connecting()
+        self.assertEqual(reconnector.state, Reconnector.FAILED)
+
+    def test_network_change_ends_backoff(self):
+        reconnector = Reconnector(initial_delay=30, max_delay=60)
+        for _ in range(3):
+            delay = reconnector.failed("tunnel closed")
+        Timer(0.05, reconnector.network_changed, args=["test"]).start()
+        started = monotonic()
+        self.assertTrue(reconnector.wait(delay))
+        self.assertLess(monotonic() - started, 5)
+        # Counting starts from the beginning after network change
+        self.assertLessEqual(reconnector.failed("tunnel closed"), 30)
+        self.assertEqual(reconnector.attempts, 1)
+
+    def test_network_change_ends_async_backoff(self):
+        reconnector = Reconnector(initial_delay=30)
+        delay = reconnector.failed("tunnel closed")
+
+        async def wait():
+            asyncio.get_running_loop().call_later(0.05, reconnector.network_changed, "test")
+            return await asyncio.wait_for(reconnector.wait_async(delay), 5)
+
+        self.assertTrue(asyncio.run(wait()))
+
+
+class NetworkWatcherCase(unittest.TestCase):
+    def test_notify_weak_subscribers(self):
+        reconnector = Reconnector()
+        NetworkWatcher._subscribers.clear()
+        NetworkWatcher._thread = object()  # Do not start real watcher
+        self.addCleanup(setattr, NetworkWatcher, "_thread", None)
+        NetworkWatcher.subscribe(reconnector.network_changed)
+        NetworkWatcher.subscribe(reconnector.network_changed)
+        self.assertEqual(len(NetworkWatcher._subscribers), 1)
+
+        NetworkWatcher.notify("test")
+        self.assertTrue(reconnector._wake.is_set())
+
+        del reconnector
+        gc.collect()
+        NetworkWatcher.notify("test")
+        self.assertEqual(NetworkWatcher._subscribers, {})
+
+    def test_signature_is_stable(self):
+        self.assertEqual(NetworkWatcher.signature(), NetworkWatcher.signature())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import socket
+import unittest
+from threading import Thread
+from time import monotonic, sleep
+from unittest import mock
+
+from abst.bastion_support.oci_bastion import Bastion
+from abst.bastion_support.relay import TunnelRelay
+from helpers import bare_bastion
+
+
+class EchoServer:
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            Thread(target=self.echo, args=[conn], daemon=True).start()
+
+    @staticmethod
+    def echo(conn):
+        with conn:
+            while data := conn.recv(65536):
+                conn.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+
+class TunnelRelayCase(unittest.TestCase):
+    def setUp(self):
+        self.echo = EchoServer()
+        self.addCleanup(self.echo.close)
+
+    def relay(self, **kwargs) -> TunnelRelay:
+        published = []
+        relay = TunnelRelay(TunnelRelay.pick_free_port(), upstream_port=self.echo.port,
+                            on_stats=published.append, **kwargs)
+        self.assertTrue(relay.start())
+        self.addCleanup(relay.stop)
+        relay.published = published
+        return relay
+
+    def roundtrip(self, relay: TunnelRelay, payload: bytes) -> bytes:
+        with socket.create_connection(("127.0.0.1", relay.listen_port)) as sock:
+            Thread(target=sock.sendall, args=[payload], daemon=True).start()
+            received = b""
+            while len(received) < len(payload):
+                received += sock.recv(65536)
+        return received
+
+    def wait_idle(self, relay: TunnelRelay) -> dict:
+        deadline = monotonic() + 5
+        while relay.stats.snapshot()["active_connections"] and monotonic() < deadline:
+            sleep(0.01)
+        return relay.stats.snapshot()
+
+    def check_relays(self, relay: TunnelRelay):
+        payload = bytes(range(256)) * 1024
+        self.assertEqual(self.roundtrip(relay, payload), payload)
+        self.assertEqual(self.roundtrip(relay, b"ping"), b"ping")
+        stats = self.wait_idle(relay)
+        self.assertEqual(stats, {"bytes_sent": len(payload) + 4,
+                                 "bytes_received": len(payload) + 4,
+                                 "connections": 2, "active_connections": 0})
+
+    @unittest.skipUnless(TunnelRelay.can_splice(), "splice is not available")
+    def test_relays_with_splice(self):
+        self.check_relays(self.relay())
+
+    def test_relays_with_copy(self):
+        relay = self.relay()
+        relay.use_splice = False
+        self.check_relays(relay)
+
+    def test_bandwidth_limit(self):
+        relay = self.relay(bandwidth_limit=200 * 1024)
+        started = monotonic()
+        # Bucket starts full, rest of 300 KB in both directions is paid for by waiting
+        self.roundtrip(relay, b"x" * 150 * 1024)
+        self.assertGreater(monotonic() - started, 0.3)
+
+    def test_unreachable_tunnel_closes_client(self):
+        relay = TunnelRelay(TunnelRelay.pick_free_port(), upstream_port=TunnelRelay.pick_free_port())
+        self.assertTrue(relay.start())
+        self.addCleanup(relay.stop)
+        with socket.create_connection(("127.0.0.1", relay.listen_port)) as sock:
+            sock.settimeout(5)
+            self.assertEqual(sock.recv(10), b"")
+        self.assertEqual(relay.stats.snapshot()["connections"], 0)
+
+    def test_port_in_use(self):
+        relay = self.relay()
+        self.assertFalse(TunnelRelay(relay.listen_port).start())
+
+    @unittest.skipUnless(socket.has_ipv6, "IPv6 is not available")
+    def test_listens_on_ipv6_loopback(self):
+        relay = self.relay()
+        try:
+            sock = socket.create_connection(("::1", relay.listen_port), timeout=5)
+        except OSError:
+            self.skipTest("::1 is not configured")
+        with sock:
+            sock.sendall(b"ping")
+            self.assertEqual(sock.recv(100), b"ping")
+
+    def test_stop_closes_listener(self):
+        relay = self.relay()
+        relay.stop()
+        with self.assertRaises(OSError):
+            socket.create_connection(("127.0.0.1", relay.listen_port), timeout=1).close()
+
+    def test_bastion_kill_stops_relay(self):
+        relay = self.relay()
+        bastion = bare_bastion(relay=relay)
+        bastion.terminate_tunnel = lambda: None
+        with mock.patch.object(Bastion, "stopped", False):
+            bastion.kill()
+
+        self.assertIsNone(bastion.relay)
+        with self.assertRaises(OSError):
+            socket.create_connection(("127.0.0.1", relay.listen_port), timeout=1).close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import signal
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from abst.bastion_support import oci_bastion
+from abst.bastion_support.oci_bastion import Bastion
+from abst.utils.misc_funcs import link_dump_signal
+from abst.utils.ring_buffer import RingBuffer
+
+
+class RingBufferCase(unittest.TestCase):
+    def test_keeps_last_lines_within_capacity(self):
+        buffer = RingBuffer(100)
+        for i in range(1000):
+            buffer.append(f"debug3: line {i}")
+            self.assertLessEqual(len(buffer), 100)
+
+        lines = buffer.getvalue().splitlines()
+        self.assertEqual(lines[-1], "debug3: line 999")
+        self.assertEqual(lines, [f"debug3: line {i}" for i in range(1000 - len(lines), 1000)])
+
+    def test_long_line_is_truncated(self):
+        buffer = RingBuffer(10)
+        buffer.append("a" * 50 + "tail")
+        self.assertLessEqual(len(buffer), 10)
+        self.assertTrue(buffer.getvalue().rstrip("\n").endswith("tail"))
+
+
+class SSHOutputDumpCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(oci_bastion, "default_ssh_logs_path", Path(self.tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bastion = Bastion.__new__(Bastion)
+        self.bastion.context_name = "ctx"
+        self.bastion._current_status = "connected"
+        self.bastion.ssh_output = RingBuffer(1024)
+        self.bastion.ssh_output.append("debug1: pledge: network")
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 is not available")
+    def test_dump_on_signal(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        self.addCleanup(signal.signal, signal.SIGUSR1, previous)
+        Bastion.live_bastions.add(self.bastion)
+        self.addCleanup(Bastion.live_bastions.discard, self.bastion)
+
+        link_dump_signal()
+        os.kill(os.getpid(), signal.SIGUSR1)
+
+        content = Bastion.get_ssh_output_path("ctx").read_text()
+        self.assertIn("ctx requested", content)
+        self.assertIn("debug1: pledge: network", content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import signal
+import unittest
+from threading import Event, Timer
+from unittest import mock
+
+from abst.bastion_support.admission import AdmissionController
+from abst.bastion_support.async_scheduler import AsyncBastionScheduler
+from abst.bastion_support.bastion_scheduler import BastionScheduler
+from abst.bastion_support.oci_bastion import Bastion
+from helpers import bare_bastion
+
+
+class RotateBeforeExpiryCase(unittest.TestCase):
+    def make_bastion(self, stop: Event, prepared: bool = True):
+        tunnel = mock.Mock()
+        tunnel.poll.return_value = None
+        bastion = bare_bastion(bid="old", active_tunnel=tunnel)
+        bastion.get_bastion_state = mock.Mock(return_value={"session_ttl_in_seconds": 1000})
+        bastion.create_bastion_forward_port_session = mock.Mock(
+            return_value=("host", "10.0.0.1", 22, "key.pub", '{"id": "new"}'))
+        bastion.wait_for_prepared = mock.Mock(return_value=prepared)
+        bastion.set_port_forward = mock.Mock()
+        bastion.load_response = mock.Mock()
+        bastion.discard_session = mock.Mock(side_effect=lambda bid: stop.set())
+        return bastion, tunnel
+
+    def rotate(self, bastion, stop: Event):
+        with mock.patch.object(Bastion, "get_remaining_ttl", return_value=50):
+            bastion.rotate_before_expiry({"bastion-id": "b1"}, 0.1, False, stop)
+
+    def test_tunnel_is_ended_as_rotation(self):
+        stop = Event()
+        bastion, tunnel = self.make_bastion(stop)
+        self.rotate(bastion, stop)
+
+        self.assertTrue(bastion.rotating.is_set())
+        tunnel.send_signal.assert_called_once_with(signal.SIGTERM)
+        bastion.discard_session.assert_called_once_with("old")
+        self.assertEqual(bastion.bid, "new")
+
+    def test_rotated_session_is_admitted(self):
+        stop = Event()
+        bastion, _ = self.make_bastion(stop)
+        admission = AdmissionController(max_creations=1, max_sessions=1, stagger=0)
+        self.assertIsNone(admission.try_admit("b1"))
+        admission.created()
+        bastion.mark_admitted("b1")
+        bastion.creating = False
+        with mock.patch.object(Bastion, "admission", admission):
+            # Bastion is full, rotation waits for slot until it is stopped
+            stopper = Timer(0.2, stop.set)
+            stopper.start()
+            self.rotate(bastion, stop)
+            stopper.join()
+            bastion.create_bastion_forward_port_session.assert_not_called()
+
+            # Replacement session holds second slot until tunnel switches over
+            stop.clear()
+            admission.max_sessions = 2
+            self.rotate(bastion, stop)
+            self.assertEqual((admission.creating, admission.sessions), (0, {"b1": 2}))
+            self.assertTrue(bastion.take_rotation())
+            self.assertEqual(admission.sessions, {"b1": 1})
+            bastion.release_admission()
+            self.assertEqual(admission.sessions, {})
+
+    def test_failed_rotation_returns_slots(self):
+        stop = Event()
+        bastion, _ = self.make_bastion(stop, prepared=False)
+        admission = AdmissionController(max_creations=1, max_sessions=2, stagger=0)
+        self.assertIsNone(admission.try_admit("b1"))
+        admission.created()
+        bastion.mark_admitted("b1")
+        bastion.creating = False
+        with mock.patch.object(Bastion, "admission", admission):
+            self.rotate(bastion, stop)
+        bastion.discard_session.assert_called_once_with("new")
+        self.assertEqual((admission.creating, admission.sessions), (0, {"b1": 1}))
+
+    def test_rotated_exit_is_not_authorization_failure(self):
+        bastion = bare_bastion()
+        bastion.dump_ssh_output = mock.Mock()
+        bastion.rotating.set()
+        bastion.process_ssh_exit(255)
+        bastion.dump_ssh_output.assert_not_called()
+
+        bastion.rotating.clear()
+        bastion.process_ssh_exit(255)
+        bastion.dump_ssh_output.assert_called_once()
+
+
+class ReconnectAfterRotationCase(unittest.TestCase):
+    def make_bastion(self, stop_second_run):
+        bastion = bare_bastion()
+        bastion.get_bastion_state = mock.Mock()
+        bastion.schedule_reconnect = mock.Mock()
+        runs = []
+
+        def run(*_):
+            runs.append(bastion.ssh_tunnel_arg_str)
+            if len(runs) == 1:
+                bastion.rotating.set()
+            else:
+                stop_second_run()
+            return True
+
+        return bastion, runs, run
+
+    def test_threaded_loop_reconnects_without_backoff(self):
+        with mock.patch.object(Bastion, "stopped", False):
+            bastion, runs, run = self.make_bastion(lambda: setattr(Bastion, "stopped", True))
+            bastion._Bastion__run_ssh_tunnel = mock.Mock(side_effect=run)
+            self.assertFalse(bastion.connect_till_deleted(False))
+
+        self.assertEqual(len(runs), 2)
+        bastion.get_bastion_state.assert_not_called()
+        bastion.schedule_reconnect.assert_not_called()
+        self.assertFalse(bastion.rotating.is_set())
+
+    def test_async_loop_reconnects_without_backoff(self):
+        # Session is found deleted after second run
+        bastion, runs, run = self.make_bastion(lambda: None)
+        bastion.get_bastion_state.return_value = {"lifecycle_state": "DELETED"}
+        scheduler = AsyncBastionScheduler([bastion])
+        self.addCleanup(scheduler.executor.shutdown)
+
+        async def run_ssh_tunnel(_):
+            return run()
+
+        scheduler.run_ssh_tunnel = run_ssh_tunnel
+        with mock.patch.object(BastionScheduler, "stopped", False):
+            asyncio.run(scheduler.connect_till_deleted(bastion))
+
+        self.assertEqual(len(runs), 2)
+        bastion.get_bastion_state.assert_called_once()
+        bastion.schedule_reconnect.assert_not_called()
+        self.assertFalse(bastion.rotating.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import datetime
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from abst.bastion_support.oci_bastion import Bastion
+from abst.bastion_support.oci_clients import BastionClientRegistry
+from abst.bastion_support.session_cache import SessionCache
+from helpers import bare_bastion, patch_temp_path
+
+PUBLIC_KEY = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIabst abst"
+CREDS = {"bastion-id": "ocid1.bastion.test", "target-ip": "10.0.0.1", "target-port": 22,
+         "reuse-min-remaining-ttl": 600}
+
+
+def make_session(session_id: str = "ocid1.bastionsession.a", name: str = "abst-ctx",
+                 ip: str = "10.0.0.1", port: int = 22, public_key: str = PUBLIC_KEY,
+                 age: int = 0, ttl: int = 3600):
+    import oci
+    created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age)
+    return oci.bastion.models.Session(
+        id=session_id, display_name=name, lifecycle_state="ACTIVE", session_ttl_in_seconds=ttl,
+        time_created=created, key_details=oci.bastion.models.PublicKeyDetails(
+            public_key_content=f"{public_key}\n"),
+        target_resource_details=oci.bastion.models.PortForwardingSessionTargetResourceDetails(
+            target_resource_private_ip_address=ip, target_resource_port=port))
+
+
+class SessionReuseCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = SessionCache.path
+        SessionCache.path = Path(self.tmp.name) / "sessions.json"
+
+    def tearDown(self):
+        SessionCache.path = self.path
+        self.tmp.cleanup()
+
+    def test_cache_put_get_remove(self):
+        SessionCache.put("ctx", "ocid1.session.a")
+        self.assertEqual(SessionCache.get("ctx"), "ocid1.session.a")
+        SessionCache.remove("ctx", "ocid1.session.b")
+        self.assertEqual(SessionCache.get("ctx"), "ocid1.session.a")
+        SessionCache.remove("ctx", "ocid1.session.a")
+        self.assertIsNone(SessionCache.get("ctx"))
+
+    def test_remaining_ttl(self):
+        created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=600)
+        sdata = {"time_created": created.isoformat(), "session_ttl_in_seconds": 3600}
+        self.assertAlmostEqual(Bastion.get_remaining_ttl(sdata), 3000, delta=2)
+
+
+class IsReusableSessionCase(unittest.TestCase):
+    def is_reusable(self, session) -> bool:
+        return Bastion.is_reusable_session(session, CREDS, "abst-ctx", PUBLIC_KEY, 600)
+
+    def test_matching_session(self):
+        self.assertTrue(self.is_reusable(make_session()))
+
+    def test_name_must_match(self):
+        self.assertFalse(self.is_reusable(make_session(name="abst-other")))
+
+    def test_target_must_match(self):
+        self.assertFalse(self.is_reusable(make_session(ip="10.0.0.2")))
+        self.assertFalse(self.is_reusable(make_session(port=2222)))
+
+    def test_key_must_match(self):
+        self.assertFalse(self.is_reusable(make_session(public_key="ssh-ed25519 AAAAother")))
+
+    def test_min_remaining_ttl(self):
+        self.assertTrue(self.is_reusable(make_session(age=2900)))
+        self.assertFalse(self.is_reusable(make_session(age=3100)))
+
+
+class FindReusableSessionCase(unittest.TestCase):
+    def setUp(self):
+        self.key_path = patch_temp_path(self, SessionCache, "path", "sessions.json").parent / "id.pub"
+        self.key_path.write_text(PUBLIC_KEY)
+        self.bastion = bare_bastion()
+        self.bastion.direct_json_path = Path("ctx.json")
+
+    def find(self, call) -> object:
+        with mock.patch.object(BastionClientRegistry, "call", side_effect=call):
+            return self.bastion.find_reusable_session(CREDS, "abst-ctx", str(self.key_path))
+
+    def test_picks_session_with_most_ttl_left(self):
+        from oci.exceptions import ServiceError
+        sessions = {"old": make_session("old", age=1200), "new": make_session("new", age=60)}
+
+        def call(operation, *args, **kwargs):
+            if operation == "list_sessions":
+                return mock.Mock(data=[mock.Mock(id=sid) for sid in ("old", "gone", "new")])
+            if args[0] == "gone":
+                raise ServiceError(404, "NotAuthorizedOrNotFound", {}, "Session not found")
+            return mock.Mock(data=sessions[args[0]])
+
+        self.assertEqual(self.find(call).id, "new")
+
+    def test_listing_failure_falls_back_to_new_session(self):
+        from oci.exceptions import ServiceError
+
+        def call(operation, *args, **kwargs):
+            raise ServiceError(500, "InternalServerError", {}, "Listing failed")
+
+        self.assertIsNone(self.find(call))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from itertools import islice
+
+from abst.bastion_support.session_waiter import SessionWaiter
+
+
+class SessionWaiterCase(unittest.TestCase):
+    def test_intervals_backoff_capped(self):
+        waiter = SessionWaiter(initial_interval=0.5, backoff_factor=2, max_interval=3)
+        self.assertEqual(list(islice(waiter.intervals(), 5)), [0.5, 1, 2, 3, 3])
+
+    def test_wait_for_records_phase(self):
+        polls = iter([False, False, True])
+        waiter = SessionWaiter(initial_interval=0.01, max_interval=0.01, deadline=5)
+        self.assertTrue(waiter.wait_for("active", lambda: next(polls)))
+        self.assertIn("active", waiter.phases)
+
+    def test_wait_for_deadline(self):
+        waiter = SessionWaiter(initial_interval=0.01, max_interval=0.02, deadline=0.1)
+        self.assertFalse(waiter.wait_for("key", lambda: False))
+        self.assertGreaterEqual(waiter.phases["key"], 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import socket
+import subprocess
+import threading
+import time
+import unittest
+from unittest import mock
+
+from abst.bastion_support.bastion_scheduler import BastionScheduler
+from abst.bastion_support.control_master import ControlMaster
+from abst.bastion_support.oci_bastion import Bastion
+from abst.bastion_support.relay import TunnelRelay
+from helpers import bare_bastion, mock_bastion
+
+
+class ShutdownCase(unittest.TestCase):
+    def test_delete_sessions_deadline(self):
+        def delete(sess_id, region=None, deadline=None):
+            if sess_id == "stuck":
+                time.sleep(2)
+            return sess_id != "failing"
+
+        sessions = {"a": None, "b": "eu-frankfurt-1", "stuck": None, "failing": None}
+        with mock.patch.object(Bastion, "delete_bastion_session", side_effect=delete):
+            start = time.monotonic()
+            left = Bastion.delete_sessions(sessions, deadline=0.5)
+
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual(left, {"stuck": None, "failing": None})
+
+    def test_delete_sessions_do_not_hold_exit(self):
+        deadlines = []
+
+        def delete(sess_id, region=None, deadline=None):
+            deadlines.append(deadline)
+            time.sleep(0.3 if sess_id == "stuck" else 0.05)
+            return True
+
+        sessions = {f"sess-{i}": None for i in range(4)}
+        sessions["stuck"] = None
+        with mock.patch.object(Bastion, "delete_bastion_session", side_effect=delete):
+            left = Bastion.delete_sessions(sessions, deadline=0.2, workers=4)
+            workers = [thread for thread in threading.enumerate()
+                       if thread.name.startswith("abst-delete")]
+
+        self.assertIn("stuck", left)
+        # Interpreter exit does not join them
+        self.assertTrue(workers and all(thread.daemon for thread in workers))
+        # Calls started later get only what is left of overall deadline
+        self.assertTrue(all(deadline <= 0.2 for deadline in deadlines))
+        self.assertLess(deadlines[-1], 0.2)
+
+    def test_delete_session_gives_up(self):
+        from oci.exceptions import ServiceError
+        with mock.patch("abst.bastion_support.oci_bastion.BastionClientRegistry.call",
+                        side_effect=ServiceError(500, "InternalError", {}, "")):
+            self.assertFalse(Bastion.delete_bastion_session("sess", deadline=0.3))
+
+        with mock.patch("abst.bastion_support.oci_bastion.BastionClientRegistry.call",
+                        side_effect=ServiceError(404, "NotAuthorizedOrNotFound", {}, "")):
+            self.assertTrue(Bastion.delete_bastion_session("sess", deadline=0.3))
+
+
+class KillAllCase(unittest.TestCase):
+    def setUp(self):
+        self.sessions = [mock_bastion("db"), mock_bastion("web")]
+        for sess in self.sessions:
+            sess.release_session.return_value = None
+        for target, attribute, value in ((BastionScheduler, "session_list", self.sessions),
+                                         (BastionScheduler, "_BastionScheduler__shutting_down", False),
+                                         (BastionScheduler, "stopped", False),
+                                         (Bastion, "stopped", False),
+                                         (ControlMaster, "_masters", dict())):
+            patcher = mock.patch.object(target, attribute, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def kill_all(self):
+        with mock.patch.object(Bastion, "delete_sessions", return_value={}) as delete_sessions:
+            with self.assertRaises(SystemExit):
+                BastionScheduler.kill_all()
+        return delete_sessions
+
+    def test_control_masters_do_not_delay_deletion(self):
+        masters = []
+        for sess_id in ("sess-a", "sess-b"):
+            master = ControlMaster.get(sess_id, "host", "key")
+            master.process = subprocess.Popen(["sleep", "30"])
+            self.addCleanup(master.process.kill)
+            # Stalled master would block on every control command
+            master.control = mock.Mock(side_effect=lambda *args, **kwargs: time.sleep(30))
+            masters.append(master)
+
+        start = time.monotonic()
+        self.kill_all().assert_called_once()
+
+        self.assertLess(time.monotonic() - start, 1)
+        for master in masters:
+            self.assertEqual(master.process.wait(5), -15)
+        self.assertEqual(ControlMaster.count_alive(), 0)
+
+    def test_relays_are_stopped(self):
+        relay = TunnelRelay(TunnelRelay.pick_free_port())
+        self.assertTrue(relay.start())
+        self.addCleanup(relay.stop)
+        self.sessions[0] = bare_bastion("db", relay=relay)
+        self.sessions[0].terminate_tunnel = mock.Mock()
+        self.kill_all()
+
+        self.assertIsNone(self.sessions[0].relay)
+        # Clients are not accepted into tunnel which is going away
+        with self.assertRaises(OSError):
+            socket.create_connection(("127.0.0.1", relay.listen_port), timeout=1).close()
+        self.sessions[1].stop_relay.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import time
+import unittest
+from threading import Event
+from unittest import mock
+
+from click.testing import CliRunner
+
+from abst.bastion_support.spans import SpanRecorder
+from abst.cli_commands.stats_cli.commands import stats
+from helpers import patch_temp_path
+
+
+class SpanRecorderCase(unittest.TestCase):
+    def setUp(self):
+        self.path = patch_temp_path(self, SpanRecorder, "path", "spans.jsonl")
+
+    def test_records_phase_transitions(self):
+        recorder = SpanRecorder("db")
+        for status in ("creating bastion session", "waiting for session init",
+                       "tunnel closed, retry 1 in 0.6s", "tunnel closed, retry 2 in 1.5s",
+                       "connected"):
+            recorder.transition(status)
+        recorder.transition(None)
+        self.assertTrue(SpanRecorder.flush())
+
+        spans = list(SpanRecorder.read())
+        self.assertEqual([(span["phase"], span["next"]) for span in spans],
+                         [("creating bastion session", "waiting for session init"),
+                          ("waiting for session init", "tunnel closed"),
+                          ("tunnel closed", "connected"),
+                          ("connected", None)])
+        self.assertTrue(all(span["context"] == "db" and span["duration"] >= 0 for span in spans))
+
+    def test_read_skips_broken_lines_and_rotated_file(self):
+        self.path.with_name("spans.jsonl.1").write_text(
+            json.dumps({"context": "a", "phase": "digging tunnel", "duration": 3}) + "\n")
+        self.path.write_text(json.dumps({"context": "b", "phase": "digging tunnel", "duration": 1})
+                             + "\n{\"context\": \"b\", \"pha")
+        self.assertEqual([span["context"] for span in SpanRecorder.read()], ["a", "b"])
+
+    def test_rotation(self):
+        with mock.patch.object(SpanRecorder, "max_size", 10):
+            SpanRecorder.write({"phase": "first", "duration": 1})
+            SpanRecorder.flush()
+            SpanRecorder.write({"phase": "second", "duration": 1})
+            SpanRecorder.flush()
+        self.assertEqual([span["phase"] for span in SpanRecorder.read()], ["first", "second"])
+        self.assertTrue(self.path.with_name("spans.jsonl.1").exists())
+
+    def test_write_does_not_wait_for_file(self):
+        release = Event()
+        self.addCleanup(release.set)
+        append = SpanRecorder._append.__func__
+
+        def slow_append(cls, lines):
+            release.wait(5)
+            append(cls, lines)
+
+        with mock.patch.object(SpanRecorder, "_append", classmethod(slow_append)):
+            SpanRecorder.write({"phase": "first", "duration": 1})
+            started = time.monotonic()
+            SpanRecorder.write({"phase": "second", "duration": 1})
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertFalse(SpanRecorder.flush(0.1))
+            release.set()
+            self.assertTrue(SpanRecorder.flush())
+        self.assertEqual([span["phase"] for span in SpanRecorder.read()], ["first", "second"])
+
+    def test_summarize(self):
+        spans = [{"context": "a", "phase": "waiting for session init", "duration": value}
+                 for value in range(1, 21)]
+        spans.append({"context": "b", "phase": "digging tunnel", "duration": 2.5})
+        summary = SpanRecorder.summarize(spans)
+        self.assertEqual(summary["waiting for session init"],
+                         {"count": 20, "p50": 10, "p95": 19, "max": 20})
+        self.assertEqual(list(SpanRecorder.summarize(spans, "b")), ["digging tunnel"])
+
+    def test_stats_command(self):
+        runner = CliRunner()
+        result = runner.invoke(stats, [])
+        self.assertIsNone(result.exception)
+        self.assertIn("No spans recorded", result.output)
+
+        SpanRecorder.write({"context": "db", "phase": "digging tunnel", "duration": 1.5})
+        SpanRecorder.flush()
+        result = runner.invoke(stats, ["--json", "-c", "db"])
+        self.assertEqual(json.loads(result.output)["digging tunnel"]["max"], 1.5)
+        result = runner.invoke(stats, [])
+        self.assertIn("digging tunnel", result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
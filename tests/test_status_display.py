@@ -0,0 +1,68 @@
+import io
+import unittest
+from unittest import mock
+
+from rich.console import Console
+
+from abst.bastion_support.oci_clients import BastionClientRegistry
+from abst.bastion_support.rate_limit import ApiCallStats
+from abst.bastion_support.status_display import StatusDisplay, format_uptime
+from helpers import mock_bastion
+
+
+def make_bastion(name: str, port: int):
+    bastion = mock_bastion(name, current_status="creating bastion session")
+    bastion.load_self_creds.return_value = {"local-port": port}
+    return bastion
+
+
+class StatusDisplayCase(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(BastionClientRegistry, "stats", ApiCallStats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bastions = [make_bastion("web", 8080), make_bastion("db", 2222)]
+        self.output = io.StringIO()
+        self.display = StatusDisplay(lambda: self.bastions,
+                                     Console(file=self.output, width=200, force_terminal=False))
+
+    def test_redraws_only_on_change(self):
+        self.assertTrue(self.display.refresh())
+        self.assertFalse(self.display.refresh())
+        self.bastions[1].current_status = "digging tunnel"
+        self.assertTrue(self.display.refresh())
+
+    def test_config_is_loaded_once(self):
+        for _ in range(3):
+            self.display.snapshot()
+        self.bastions[0].load_self_creds.assert_called_once()
+
+    def test_rows(self):
+        db = self.bastions[1]
+        db.connected = True
+        db.reconnect.failed("tunnel closed")
+        db.reconnect.connected()
+        self.bastions[0].active_tunnel = None
+        _, rows = self.display.snapshot()
+        self.assertEqual([row[:6] for row in rows],
+                         [("db", "2222", "True", "creating bastion session", "0s", "1"),
+                          ("web", "8080", "False", "creating bastion session", "-", "0")])
+        self.assertEqual(rows[0][-1], "tunnel closed")
+
+    def test_live_table(self):
+        self.display.start()
+        self.display.stop()
+        output = self.output.getvalue()
+        self.assertIn("Bastion Sessions", output)
+        self.assertIn("Reconnects", output)
+        self.assertLess(output.index("db"), output.index("web"))
+
+
+class FormatUptimeCase(unittest.TestCase):
+    def test_units(self):
+        self.assertEqual([format_uptime(value) for value in (None, 5, 125, 3 * 3600 + 65, 90000)],
+                         ["-", "5s", "2m", "3h01m", "1d01h"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import socket
+import unittest
+from threading import Thread
+from unittest import mock
+
+from abst.bastion_support.async_scheduler import AsyncBastionScheduler
+from abst.bastion_support.session_waiter import SessionWaiter
+from abst.utils.net import probe_port, probe_port_async
+from helpers import free_port
+
+
+class BannerServer:
+    def __init__(self, banner: bytes):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.banner = banner
+        Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            conn.sendall(self.banner)
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+
+class ProbePortCase(unittest.TestCase):
+    def test_tcp_probe(self):
+        server = BannerServer(b"")
+        self.addCleanup(server.close)
+        self.assertTrue(probe_port("127.0.0.1", server.port))
+        self.assertFalse(probe_port("127.0.0.1", free_port()))
+
+    def test_ssh_banner_probe(self):
+        ssh = BannerServer(b"SSH-2.0-OpenSSH_9.2\r\n")
+        http = BannerServer(b"HTTP/1.1 400 Bad Request\r\n")
+        self.addCleanup(ssh.close)
+        self.addCleanup(http.close)
+        self.assertTrue(probe_port("127.0.0.1", ssh.port, handshake=True))
+        self.assertFalse(probe_port("127.0.0.1", http.port, handshake=True))
+        self.assertTrue(asyncio.run(probe_port_async("127.0.0.1", ssh.port, handshake=True)))
+        self.assertFalse(asyncio.run(probe_port_async("127.0.0.1", http.port, handshake=True)))
+
+    def test_async_watch_marks_ready(self):
+        server = BannerServer(b"")
+        self.addCleanup(server.close)
+        bastion = mock.Mock()
+        bastion.tunnel_readiness = "tcp"
+        bastion.forward_target = {"local_port": server.port}
+        bastion.tunnel_waiter.return_value = SessionWaiter(0.01, 1.5, 0.1, 5)
+        process = mock.Mock(returncode=None)
+
+        asyncio.run(AsyncBastionScheduler([bastion]).watch_tunnel_ready(bastion, process))
+        bastion.mark_tunnel_ready.assert_called_once()
+        self.assertLess(bastion.mark_tunnel_ready.call_args.args[0], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
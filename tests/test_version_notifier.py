@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from abst.notifier import version_notifier
+from abst.notifier.version_notifier import Notifier
+
+
+class VersionNotifierCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.tmp.name) / "version_check.json"
+        patcher = mock.patch.object(version_notifier, "default_version_cache_path", self.cache_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    @mock.patch.object(Notifier, "spawn_refresh")
+    def test_fresh_cache_does_not_spawn(self, spawn):
+        self.cache_path.write_text(json.dumps({"last-check": datetime.timestamp(datetime.now()),
+                                               "last-version": "9999.0.0"}))
+        with mock.patch("rich.print") as printer:
+            Notifier.notify()
+        spawn.assert_not_called()
+        self.assertIn("9999.0.0", printer.call_args_list[0].args[0])
+
+    @mock.patch.object(Notifier, "spawn_refresh")
+    def test_stale_cache_spawns_without_waiting(self, spawn):
+        with mock.patch("rich.print") as printer:
+            Notifier.notify()
+        spawn.assert_called_once()
+        printer.assert_not_called()
+
+    @mock.patch.object(Notifier, "spawn_refresh")
+    def test_disabled_by_env(self, spawn):
+        with mock.patch.dict(os.environ, {Notifier.disable_env: "1"}):
+            Notifier.notify()
+        spawn.assert_not_called()
+
+    def test_refresh_keeps_last_version_on_failure(self):
+        self.cache_path.write_text(json.dumps({"last-check": 0, "last-version": "1.0.0"}))
+        with mock.patch.object(Notifier, "get_last_version", side_effect=OSError), \
+                mock.patch("signal.alarm"):
+            Notifier.refresh_cache()
+        cache = Notifier.load_cache()
+        self.assertEqual(cache["last-version"], "1.0.0")
+        self.assertGreater(cache["last-check"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()